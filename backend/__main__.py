@@ -1,41 +1,26 @@
-from flask import Flask, jsonify
-from flask_cors import CORS
-from routes.assistant_routes import assistant_bp
-from config import config
+"""
+Punto de entrada del backend.
 
-def create_app():
-    """Crea y configura la aplicación Flask"""
-    app = Flask(__name__)
-    
-    # Configuración básica
-    app.config['SECRET_KEY'] = config.SECRET_KEY
-    app.config['DEBUG'] = config.DEBUG
-    
-    # Habilitar CORS
-    CORS(app)
-    
-    # Registrar rutas
-    app.register_blueprint(assistant_bp, url_prefix='/api/assistant')
-    
-    # Ruta de prueba
-    @app.route('/')
-    def index():
-        return jsonify({
-            "status": "success",
-            "message": "API de Karen funcionando correctamente"
-        })
-    
-    # Ruta de estado
-    @app.route('/health')
-    def health():
-        return jsonify({
-            "status": "healthy",
-            "version": "1.0.0"
-        })
-    
-    return app
+    python __main__.py               Servidor de desarrollo de Flask
+    python __main__.py --production  Gunicorn con workers preforkeados (gunicorn.conf.py)
+"""
+import os
+import sys
+from pathlib import Path
+from config import config
 
 if __name__ == '__main__':
+    if '--production' in sys.argv:
+        backend_dir = Path(__file__).parent.absolute()
+        os.chdir(backend_dir)
+        os.execvp('gunicorn', [
+            'gunicorn',
+            '--config', str(backend_dir / 'gunicorn.conf.py'),
+            'app:create_app(bootstrap=False)'
+        ])
+
+    from app import create_app
+
     app = create_app()
     app.run(
         host=config.HOST,
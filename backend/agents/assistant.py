@@ -1,68 +1,155 @@
 from openai import OpenAI
 from config import Config
 from db.supabase_utils import supabase
+from db.chat_store import DEFAULT_CHAT_TITLE, chat_store
+from db.session_cache import session_registry
+from services.single_flight import single_flight, normalize_text
+from services.resilience import (
+    CircuitBreaker,
+    Deadline,
+    LatencyTracker,
+    call_with_deadline,
+    hedged_call,
+    retry_with_deadline,
+)
+from services.openai_scheduler import (
+    openai_scheduler,
+    estimate_tokens,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_INGEST,
+)
 from .chat_summarizer import ChatSummarizer
+from .model_router import model_router
 from agents.prompts.main_prompt import orchestrator
 from typing import List, Dict
-import tenacity
 import logging
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores.supabase import SupabaseVectorStore
+from rag.context_builder import build_context, CONTEXT_FETCH_K
+from rag.embedding_cache import query_embedding_cache
+from rag.local_index import local_index
+from rag.outline import outline_store
+from rag.query_router import ROUTE_OVERVIEW, outline_documents, route_query
+from rag.query_decomposition import decompose_query
+from rag.retrieval_gate import retrieval_gate
+from rag.optimized_rag import CHUNK_OVERLAP_CHARS, embedding_model_kwargs
 
 logger = logging.getLogger(__name__)
 
 
-def initialize_vector_store():
-    """Inicializa el vector store de Supabase con la configuración correcta."""
-    embeddings = OpenAIEmbeddings(model="text-embedding-ada-002", chunk_size=100)
-    vector_store = SupabaseVectorStore(
-        client=supabase,
-        embedding=embeddings,
-        table_name="documents",
-        query_name="match_documents",
-    )
-    return vector_store
+SCORE_THRESHOLD = Config.RETRIEVAL_SCORE_THRESHOLD  # Similitud mínima para incluir un documento
+BATCH_SUMMARY_CHARS_PER_FILE = 3000  # Extracto por archivo en el resumen combinado
+SUMMARY_MAX_TOKENS = 500  # Estimación de tokens de salida de un resumen
+ANSWER_MAX_TOKENS = 1000  # Estimación de tokens de salida de una respuesta
+MIN_GENERATION_TIMEOUT = 5.0  # Segundos mínimos para generar aunque el plazo se agote
+PREVIOUS_EXCHANGE_MESSAGES = 2  # Mensajes previos incluidos cuando se salta la recuperación
 
 
-@tenacity.retry(
-    wait=tenacity.wait_exponential(multiplier=1, min=4, max=10),
-    stop=tenacity.stop_after_attempt(5),
-    retry=tenacity.retry_if_exception_type(Exception),
-)
-def search_similar_for_chat(query: str, chat_id: int, top_k: int = 5) -> List[Dict]:
-    """Búsqueda semántica optimizada para un chat específico usando SupabaseVectorStore."""
+def initialize_embeddings():
+    """Inicializa el modelo de embeddings usado para las consultas."""
+    return OpenAIEmbeddings(**embedding_model_kwargs(), chunk_size=100)
+
+
+def embed_queries(
+    queries: List[str],
+    chat_id: int = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    deadline: Deadline = None,
+) -> List[List[float]]:
+    """Embeddings de las consultas; solo las que no están en caché llaman a la API.
+
+    `deadline` acota la espera de turno en el planificador.
+    """
+
+    def embed_missing(texts: List[str]) -> List[List[float]]:
+        with openai_scheduler.slot(
+            priority,
+            sum(estimate_tokens(text) for text in texts),
+            chat_id=chat_id,
+            timeout=deadline.remaining() if deadline else None,
+        ):
+            return single_flight.do(
+                ("embeddings", tuple(texts)), initialize_embeddings().embed_documents, texts
+            )
+
+    return query_embedding_cache.embed(queries, embed_missing)
+
+
+def _parse_embedding(value) -> List[float]:
+    """PostgREST devuelve las columnas vector como texto '[x, y, ...]'."""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def _fetch_candidates(chat_id: int, query_embedding, fetch_k: int) -> List[Dict]:
+    """Candidatos de un chat para un embedding, desde el índice local o la RPC."""
+    if local_index.has(chat_id):
+        # Copia local precargada desde un snapshot: sin consulta remota
+        return local_index.search(chat_id, query_embedding, fetch_k, SCORE_THRESHOLD)
+
+    params = {
+        "query_embedding": query_embedding,
+        "chat_id": chat_id,
+        "match_threshold": SCORE_THRESHOLD,
+        "match_count": fetch_k,
+    }
+    if Config.VECTOR_SEARCH_COMPACT:
+        # Candidatos sobre el índice float16, similitud exacta sobre los vectores completos
+        params["rescore_count"] = fetch_k * Config.VECTOR_RESCORE_FACTOR
+        response = supabase.rpc("match_documents_for_chat_compact", params).execute()
+    else:
+        response = supabase.rpc("match_documents_for_chat", params).execute()
+
+    # Formatear candidatos
+    return [
+        {
+            "content": row["content"],
+            "metadata": row["metadata"] or {},
+            "similarity": float(row["similarity"]),
+            "embedding": _parse_embedding(row["embedding"]),
+        }
+        for row in response.data
+    ]
+
+
+def search_similar_for_chat(
+    query: str,
+    chat_id: int,
+    top_k: int = Config.RETRIEVAL_TOP_K,
+    fetch_k: int = CONTEXT_FETCH_K,
+    deadline: Deadline = None,
+) -> List[Dict]:
+    """Búsqueda semántica optimizada para un chat específico.
+
+    El filtro por chat y por umbral se aplica en el servidor
+    (`match_documents_for_chat`); los `fetch_k` candidatos se reducen con MMR,
+    fusión de chunks adyacentes y presupuesto de tokens antes de devolverlos.
+    """
     try:
         logger.info(f"Iniciando búsqueda semántica para chat {chat_id}")
-        vector_store = initialize_vector_store()
-
-        # Realizar búsqueda usando el vector store con el filtro correcto
-        # El chat_id está en el campo chat_id de la tabla documents, no en metadata
-        relevant_docs = vector_store.similarity_search_with_relevance_scores(
-            query,
-            k=top_k,
-            filter={"chat_id": chat_id},  # Filtro corregido
-        )
+        query_embedding = embed_queries([query], chat_id, deadline=deadline)[0]
+
+        candidates = _fetch_candidates(chat_id, query_embedding, fetch_k)
 
-        if not relevant_docs:
+        if not candidates:
             logger.info("No se encontraron documentos relevantes")
             return []
 
-        # Formatear resultados
-        results = []
-        for doc, score in relevant_docs:
-            if score > 0.7:  # Solo incluir documentos con alta relevancia
-                result = {
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
-                    "similarity": float(score),
-                }
-                results.append(result)
-                logger.info(
-                    f"Documento encontrado con score {score}: {doc.page_content[:100]}..."
-                )
+        results = build_context(
+            query_embedding, candidates, top_k=top_k, max_overlap=CHUNK_OVERLAP_CHARS
+        )
+        for result in results:
+            logger.info(
+                f"Documento encontrado con score {result['similarity']}: {result['content'][:100]}..."
+            )
 
         logger.info(f"Se encontraron {len(results)} documentos relevantes")
         return results
@@ -72,17 +159,123 @@ def search_similar_for_chat(query: str, chat_id: int, top_k: int = 5) -> List[Di
         raise
 
 
+def search_subqueries_for_chat(
+    queries: List[str],
+    chat_id: int,
+    top_k: int = Config.RETRIEVAL_TOP_K,
+    fetch_k: int = CONTEXT_FETCH_K,
+    deadline: Deadline = None,
+) -> List[Dict]:
+    """Búsqueda semántica de varias sub-consultas de un mismo mensaje.
+
+    Las sub-consultas se embeben en una sola llamada y se buscan en paralelo;
+    los candidatos se unen sin duplicados y se reducen con un único MMR y un
+    único presupuesto de tokens, de modo que el top_k se reparte entre temas.
+    """
+    logger.info(f"Búsqueda semántica de {len(queries)} sub-consultas para chat {chat_id}")
+    query_embeddings = embed_queries(queries, chat_id, deadline=deadline)
+
+    futures = [
+        _search_executor.submit(_fetch_candidates, chat_id, embedding, fetch_k)
+        for embedding in query_embeddings
+    ]
+
+    # Un mismo chunk puede aparecer en varias sub-consultas: quedarse con el mejor score
+    candidates: Dict[str, Dict] = {}
+    for future in futures:
+        for candidate in future.result():
+            previous = candidates.get(candidate["content"])
+            if previous is None or candidate["similarity"] > previous["similarity"]:
+                candidates[candidate["content"]] = candidate
+
+    if not candidates:
+        logger.info("No se encontraron documentos relevantes")
+        return []
+
+    results = build_context(
+        query_embeddings, list(candidates.values()), top_k=top_k, max_overlap=CHUNK_OVERLAP_CHARS
+    )
+    logger.info(
+        f"Se encontraron {len(results)} documentos relevantes "
+        f"({len(candidates)} candidatos únicos)"
+    )
+    return results
+
+
+def outline_context(message: str, chat_id: int) -> List[Dict]:
+    """Contexto desde los esquemas precalculados para preguntas de resumen.
+
+    Retorna una lista vacía si la pregunta no es de resumen o si los esquemas
+    de los archivos del chat aún no están listos.
+    """
+    route = route_query(message)
+    if route is None:
+        return []
+
+    try:
+        content_hashes = {
+            row["content_hash"]
+            for row in chat_store.list_chat_files(chat_id)
+            if row.get("content_hash")
+        }
+        outlines = outline_store().load(content_hashes)
+    except Exception as e:
+        logger.warning(f"No se pudieron leer los esquemas del chat {chat_id}: {e}")
+        return []
+
+    # Una visión general con archivos sin esquema quedaría incompleta
+    if not outlines or (route == ROUTE_OVERVIEW and len(outlines) < len(content_hashes)):
+        return []
+
+    documents = outline_documents(message, route, outlines)
+    logger.info(f"Pregunta de tipo {route} respondida con {len(documents)} entradas de esquemas")
+    return documents
+
+
+# Cantidad de chunks por chat: chat_id -> (versión de documentos, expiración, cantidad)
+_document_counts: "OrderedDict[int, tuple]" = OrderedDict()
+_document_counts_lock = threading.Lock()
+
+
+def chat_document_count(chat_id: int) -> int:
+    """Cantidad de chunks del chat, con caché hasta que cambien sus documentos.
+
+    Solo se guardan conteos positivos: otro worker puede estar ingiriendo
+    archivos en un chat que aquí todavía figura vacío.
+    """
+    version = session_registry.document_version(chat_id)
+    with _document_counts_lock:
+        cached = _document_counts.get(chat_id)
+        if cached and cached[0] == version and cached[1] > time.monotonic():
+            _document_counts.move_to_end(chat_id)
+            return cached[2]
+
+    result = (
+        supabase.table("documents")
+        .select("id", count="exact")
+        .eq("chat_id", chat_id)
+        .limit(1)
+        .execute()
+    )
+    count = result.count or 0
+    if count:
+        with _document_counts_lock:
+            _document_counts[chat_id] = (
+                version,
+                time.monotonic() + Config.SESSION_CACHE_TTL,
+                count,
+            )
+            _document_counts.move_to_end(chat_id)
+            while len(_document_counts) > Config.SESSION_CACHE_SIZE:
+                _document_counts.popitem(last=False)
+    return count
+
+
 def chat_has_documents(chat_id: int) -> bool:
     """Verifica si un chat tiene documentos asociados."""
     try:
         logger.info(f"Verificando documentos para chat {chat_id}")
-        result = (
-            supabase.table("documents")
-            .select("id, content")
-            .eq("chat_id", chat_id)
-            .execute()
-        )
-        has_docs = len(result.data) > 0
+        has_docs = chat_document_count(chat_id) > 0
         logger.info(
             f"Chat {chat_id} {'tiene' if has_docs else 'no tiene'} documentos asociados"
         )
@@ -92,19 +285,92 @@ def chat_has_documents(chat_id: int) -> bool:
         return False
 
 
+# Estado de salud compartido de la recuperación
+retrieval_breaker = CircuitBreaker(
+    "retrieval",
+    failure_threshold=Config.RETRIEVAL_FAILURE_THRESHOLD,
+    reset_timeout=Config.RETRIEVAL_RESET_TIMEOUT,
+)
+retrieval_latencies = LatencyTracker()
+
+# Hilos para las búsquedas de sub-consultas en paralelo
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="subquery-search")
+
+
+def retrieve_context(message: str, chat_id: int, deadline: Deadline) -> List[Dict]:
+    """Recupera los documentos relevantes dentro del plazo de la petición.
+
+    Si la recuperación falla, se agota su plazo o el circuito está abierto,
+    retorna una lista vacía y la respuesta se genera sin contexto.
+    """
+    if not retrieval_breaker.allow():
+        logger.warning("Circuito de recuperación abierto, respondiendo sin contexto")
+        return []
+
+    budget = deadline.child(Config.RETRIEVAL_TIMEOUT_SECONDS)
+    hedge_after = (
+        retrieval_latencies.percentile(Config.RETRIEVAL_HEDGE_PERCENTILE)
+        if Config.RETRIEVAL_HEDGE_ENABLED
+        else None
+    )
+
+    try:
+        # Solo buscar documentos relevantes si el chat tiene documentos asociados
+        # Sin pasar por chat_has_documents, que oculta los errores: una base
+        # caída debe contar como fallo del circuito
+        if call_with_deadline(lambda: chat_document_count(chat_id), budget) == 0:
+            retrieval_breaker.record_success()
+            return []
+
+        queries = [message]
+        if Config.QUERY_DECOMPOSITION_ENABLED:
+            queries = call_with_deadline(
+                lambda: decompose_query(message, deadline=budget), budget
+            )
+
+        if len(queries) > 1:
+            search = lambda: search_subqueries_for_chat(queries, chat_id, deadline=budget)
+        else:
+            search = lambda: search_similar_for_chat(message, chat_id, deadline=budget)
+
+        results = retry_with_deadline(
+            lambda: hedged_call(
+                search,
+                budget,
+                hedge_after,
+                retrieval_latencies,
+            ),
+            budget,
+            attempts=Config.RETRIEVAL_MAX_ATTEMPTS,
+        )
+    except Exception as e:
+        retrieval_breaker.record_failure()
+        logger.warning(f"Recuperación fallida, respondiendo sin contexto: {e}")
+        return []
+
+    retrieval_breaker.record_success()
+    return results
+
+
 class Assistant:
     def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o", temperature=0.3)
-        self.current_chat_id = None
+        self.llm = ChatOpenAI(model=Config.CHAT_MODEL_LARGE, temperature=0.3)
         self.rules = orchestrator
+        self._chat_models = {Config.CHAT_MODEL_LARGE: self.llm}
+        self._chat_models_lock = threading.Lock()
+
+    def _chat_model(self, model: str) -> ChatOpenAI:
+        """Cliente de chat para el modelo elegido por el enrutador."""
+        with self._chat_models_lock:
+            if model not in self._chat_models:
+                self._chat_models[model] = ChatOpenAI(model=model, temperature=0.3)
+            return self._chat_models[model]
 
     async def process_uploaded_files(self, file_info: Dict, chat_id: int):
         """Procesa la información de archivos subidos y genera un resumen inicial."""
         try:
-            # Crear un resumen del contenido del archivo
-            chunks_content = "\n".join(
-                [chunk["content"] for chunk in file_info["chunks"]]
-            )
+            # Crear un resumen a partir del extracto del archivo
+            chunks_content = file_info["excerpt"]
 
             prompt = PromptTemplate(
                 template="""Se ha subido un nuevo archivo a la conversación. Por favor, genera un resumen conciso del contenido
@@ -128,7 +394,12 @@ class Assistant:
                 | StrOutputParser()
             )
 
-            summary = chain.invoke({})
+            with openai_scheduler.slot(
+                PRIORITY_INGEST,
+                estimate_tokens(chunks_content) + SUMMARY_MAX_TOKENS,
+                chat_id=chat_id,
+            ):
+                summary = chain.invoke({})
 
             # Crear mensaje de bienvenida con el resumen
             welcome_message = f"""He procesado el archivo "{file_info["file_name"]}" y lo he dividido en {file_info["num_chunks"]} segmentos para su análisis.
@@ -138,20 +409,78 @@ class Assistant:
 Ahora puedes hacerme preguntas sobre el contenido del archivo y te ayudaré a encontrar la información relevante."""
 
             # Guardar el mensaje del asistente
-            supabase.table("messages").insert(
+            chat_store.add_message(
+                chat_id,
+                "assistant",
+                welcome_message,
+                {
+                    "file_info": {
+                        "file_name": file_info["file_name"],
+                        "file_url": file_info["file_url"],
+                        "num_chunks": file_info["num_chunks"],
+                    }
+                },
+            )
+
+            return welcome_message
+
+        except Exception as e:
+            logger.error(f"Error procesando archivos subidos: {e}")
+            raise
+
+    async def process_uploaded_batch(self, files_info: List[Dict], chat_id: int):
+        """Genera un único resumen combinado para varios archivos subidos juntos."""
+        try:
+            # Tomar un extracto acotado de cada archivo para mantener el prompt pequeño
+            excerpts = []
+            for info in files_info:
+                excerpt = info["excerpt"][:BATCH_SUMMARY_CHARS_PER_FILE]
+                excerpts.append(f"Archivo: {info['file_name']}\n{excerpt}")
+
+            prompt = PromptTemplate(
+                template="""Se han subido varios archivos a la conversación. Por favor, genera un resumen conciso
+                de cada archivo en una o dos frases y luego una visión general de los temas que tienen en común.
+
+                {content}
+
+                Resumen:""",
+                input_variables=["content"],
+            )
+
+            chain = prompt | self.llm | StrOutputParser()
+            content = "\n\n".join(excerpts)
+            with openai_scheduler.slot(
+                PRIORITY_INGEST,
+                estimate_tokens(content) + SUMMARY_MAX_TOKENS,
+                chat_id=chat_id,
+            ):
+                summary = chain.invoke({"content": content})
+
+            total_chunks = sum(info["num_chunks"] for info in files_info)
+            file_names = "\n".join(f"• {info['file_name']}" for info in files_info)
+            welcome_message = f"""He procesado {len(files_info)} archivos y los he dividido en {total_chunks} segmentos para su análisis:
+
+{file_names}
+
+{summary}
+
+Ahora puedes hacerme preguntas sobre el contenido de los archivos y te ayudaré a encontrar la información relevante."""
+
+            chat_store.add_message(
+                chat_id,
+                "assistant",
+                welcome_message,
                 {
-                    "chat_session_id": chat_id,
-                    "role": "assistant",
-                    "content": welcome_message,
-                    "metadata": {
-                        "file_info": {
-                            "file_name": file_info["file_name"],
-                            "file_url": file_info["file_url"],
-                            "num_chunks": file_info["num_chunks"],
+                    "files_info": [
+                        {
+                            "file_name": info["file_name"],
+                            "file_url": info["file_url"],
+                            "num_chunks": info["num_chunks"],
                         }
-                    },
-                }
-            ).execute()
+                        for info in files_info
+                    ]
+                },
+            )
 
             return welcome_message
 
@@ -159,75 +488,107 @@ Ahora puedes hacerme preguntas sobre el contenido del archivo y te ayudaré a en
             logger.error(f"Error procesando archivos subidos: {e}")
             raise
 
-    def process_message(self, message: str, chat_id: int = None) -> Dict:
+    def process_message(
+        self, message: str, chat_id: int = None, deadline: Deadline = None
+    ) -> Dict:
+        """Procesa un mensaje y retorna la respuesta.
+
+        Los mensajes idénticos que llegan mientras otro igual se procesa en el
+        mismo chat comparten la respuesta en lugar de generarla dos veces.
+        """
+        deadline = deadline or Deadline(Config.REQUEST_DEADLINE_SECONDS)
+        if not chat_id:
+            return self._process_message(message, chat_id, deadline)
+
+        key = (
+            "answer",
+            chat_id,
+            normalize_text(message),
+            session_registry.document_version(chat_id),
+        )
+        return single_flight.do(key, self._process_message, message, chat_id, deadline)
+
+    def _process_message(
+        self, message: str, chat_id: int, deadline: Deadline
+    ) -> Dict:
         """Procesa un mensaje y retorna la respuesta"""
 
         try:
             # Si no hay chat_id, crear nueva sesión
             if not chat_id:
-                response = (
-                    supabase.table("chat_sessions")
-                    .insert(
-                        {
-                            "title": "Nueva conversación",
-                            "description": "Conversación iniciada",
-                        }
-                    )
-                    .execute()
-                )
-                chat_id = response.data[0]["id"]
+                chat_id = chat_store.create_chat(DEFAULT_CHAT_TITLE, "Conversación iniciada")
+                session_registry.add(chat_id)
+            elif not session_registry.exists(chat_id):
+                raise ValueError(f"El chat {chat_id} no existe")
 
-            self.current_chat_id = chat_id
-
-            # Solo buscar documentos relevantes si el chat tiene documentos asociados
+            # Buscar documentos relevantes dentro del plazo de la petición
             context = ""
             references = []
             used_sources = set()
 
-            if chat_has_documents(chat_id):
-                relevant_docs = search_similar_for_chat(message, chat_id)
-                if relevant_docs:
-                    # Crear el contexto y las referencias
-                    context_parts = []
-                    for i, doc in enumerate(relevant_docs, 1):
-                        # Agregar número de chunk al contenido para referencia
-                        source_info = ""
-                        if doc["metadata"].get("source"):
-                            from pathlib import Path
-
-                            filename = Path(doc["metadata"]["source"]).name
-                            source_info = f" [Fuente: {filename}]"
-                        if doc["metadata"].get("page"):
-                            source_info += f" [Página: {doc['metadata']['page']}]"
-
-                        chunk_content = f"[Chunk {i}] (Relevancia: {doc['similarity']:.2f}){source_info}\n{doc['content']}\n"
-                        context_parts.append(chunk_content)
-
-                        # Crear referencia con metadata
-                        ref = {
-                            "chunk": i,
-                            "content": doc["content"],
-                            "metadata": doc["metadata"],
-                            "similarity": doc["similarity"],
-                        }
-                        references.append(ref)
-
-                        # Trackear fuente única
-                        if doc["metadata"].get("source"):
-                            filename = Path(doc["metadata"]["source"]).name
-                            used_sources.add(filename)
-
-                    context = "\n".join(context_parts)
+            # Las preguntas de resumen se responden con los esquemas precalculados
+            relevant_docs = outline_context(message, chat_id) if Config.OUTLINES_ENABLED else []
+            # Charla y pedidos de formato no necesitan buscar en los documentos
+            retrieval_skipped = not relevant_docs and not retrieval_gate.should_retrieve(message)
+            if not relevant_docs and not retrieval_skipped:
+                relevant_docs = single_flight.do(
+                    (
+                        "search",
+                        chat_id,
+                        normalize_text(message),
+                        session_registry.document_version(chat_id),
+                    ),
+                    retrieve_context,
+                    message,
+                    chat_id,
+                    deadline,
+                )
+            if relevant_docs:
+                # Crear el contexto y las referencias
+                context_parts = []
+                for i, doc in enumerate(relevant_docs, 1):
+                    # Agregar número de chunk al contenido para referencia
+                    source_info = ""
+                    if doc["metadata"].get("source"):
+                        from pathlib import Path
+
+                        filename = Path(doc["metadata"]["source"]).name
+                        source_info = f" [Fuente: {filename}]"
+                    if doc["metadata"].get("page"):
+                        source_info += f" [Página: {doc['metadata']['page']}]"
+
+                    chunk_content = f"[Chunk {i}] (Relevancia: {doc['similarity']:.2f}){source_info}\n{doc['content']}\n"
+                    context_parts.append(chunk_content)
+
+                    # Crear referencia con metadata
+                    ref = {
+                        "chunk": i,
+                        "content": doc["content"],
+                        "metadata": doc["metadata"],
+                        "similarity": doc["similarity"],
+                    }
+                    references.append(ref)
+
+                    # Trackear fuente única
+                    if doc["metadata"].get("source"):
+                        filename = Path(doc["metadata"]["source"]).name
+                        used_sources.add(filename)
+
+                context = "\n".join(context_parts)
+
+            # Sin documentos, los pedidos sobre la respuesta anterior necesitan el último intercambio
+            previous_exchange = ""
+            if retrieval_skipped:
+                previous_exchange = "\n".join(
+                    f"{'Usuario' if m['role'] == 'user' else 'Asistente'}: {m['content']}"
+                    for m in chat_store.get_recent_messages(chat_id, PREVIOUS_EXCHANGE_MESSAGES)
+                )
 
             # Guardar mensaje del usuario
-            supabase.table("messages").insert(
-                {
-                    "chat_session_id": chat_id,
-                    "role": "user",
-                    "content": message,
-                    "metadata": None,
-                }
-            ).execute()
+            chat_store.add_message(chat_id, "user", message)
+
+            # Preguntas simples con poco contexto las responde el modelo chico
+            routing = model_router.route(message, relevant_docs)
 
             # Generar respuesta
             prompt = PromptTemplate(
@@ -254,29 +615,50 @@ Ahora puedes hacerme preguntas sobre el contenido del archivo y te ayudaré a en
                 {
                     "context": lambda x: f"Contexto: {context}"
                     if context
-                    else "No hay documentos asociados a esta conversación.",
+                    else (
+                        "Este mensaje no requiere consultar los documentos."
+                        + (
+                            f"\nConversación anterior:\n{previous_exchange}"
+                            if previous_exchange
+                            else ""
+                        )
+                        if retrieval_skipped
+                        else "No hay documentos asociados a esta conversación."
+                    ),
                     "question": RunnablePassthrough(),
                     "rules": lambda x: self.rules,
                 }
                 | prompt
-                | self.llm
-                | StrOutputParser()
+                | self._chat_model(routing["model"]).bind(
+                    timeout=max(deadline.remaining(), MIN_GENERATION_TIMEOUT)
+                )
             )
 
-            response = chain.invoke(message)
+            prompt_tokens = estimate_tokens(context + previous_exchange + message + self.rules)
+            with openai_scheduler.slot(
+                PRIORITY_INTERACTIVE,
+                prompt_tokens + ANSWER_MAX_TOKENS,
+                chat_id=chat_id,
+            ):
+                started = time.monotonic()
+                answer = chain.invoke(message)
+                elapsed = time.monotonic() - started
+            response = answer.content
+
+            # Uso real reportado por la API; estimado si no viene en la respuesta
+            usage = getattr(answer, "usage_metadata", None) or {}
+            model_router.record(
+                routing["route"],
+                elapsed,
+                usage.get("input_tokens", prompt_tokens),
+                usage.get("output_tokens", estimate_tokens(response)),
+            )
 
             # Preparar metadata con referencias si existen
             message_metadata = {"references": references} if references else None
 
             # Guardar respuesta del asistente
-            supabase.table("messages").insert(
-                {
-                    "chat_session_id": chat_id,
-                    "role": "assistant",
-                    "content": response,
-                    "metadata": message_metadata,
-                }
-            ).execute()
+            chat_store.add_message(chat_id, "assistant", response, message_metadata)
 
             # Si hay referencias, agregarlas al final de la respuesta para mostrar
             if references:
@@ -312,6 +694,7 @@ Ahora puedes hacerme preguntas sobre el contenido del archivo y te ayudaré a en
                 "message": response_with_refs,
                 "chat_id": chat_id,
                 "metadata": message_metadata,
+                "model": routing["model"],
             }
 
         except Exception as e:
@@ -1,5 +1,12 @@
+import json
 from openai import OpenAI
 from config import Config
+from services.openai_scheduler import openai_scheduler, estimate_tokens, PRIORITY_HOUSEKEEPING
+
+SUMMARY_MODEL = "gpt-4o-mini"
+MESSAGE_PREVIEW_CHARS = 500  # Caracteres de cada mensaje enviados al modelo
+TITLE_MAX_CHARS = 50
+DESCRIPTION_MAX_CHARS = 150
 
 class ChatSummarizer:
     def __init__(self):
@@ -20,12 +27,13 @@ class ChatSummarizer:
         Genera solo el título, sin comillas ni puntos finales.
         """
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=50
-        )
+        with openai_scheduler.slot(PRIORITY_HOUSEKEEPING, estimate_tokens(prompt) + 50):
+            response = self.client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=50
+            )
 
         return response.choices[0].message.content.strip()
 
@@ -44,19 +52,66 @@ class ChatSummarizer:
         Genera solo la descripción, sin puntos finales.
         """
 
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=50
-        )
+        with openai_scheduler.slot(PRIORITY_HOUSEKEEPING, estimate_tokens(prompt) + 50):
+            response = self.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=50
+            )
 
         return response.choices[0].message.content.strip()
 
-    def _format_messages(self, messages):
+    def summarize_chats(self, conversations):
+        """Genera título y descripción de varios chats con una sola llamada.
+
+        `conversations` es {chat_id: [mensajes]}; retorna
+        {chat_id: {"title": ..., "description": ...}} para los chats que el
+        modelo resolvió.
+        """
+        if not conversations:
+            return {}
+
+        chats = "\n\n".join(
+            f"### Chat {chat_id}\n{self._format_messages(messages, MESSAGE_PREVIEW_CHARS)}"
+            for chat_id, messages in conversations.items()
+        )
+        prompt = f"""
+        Para cada una de las siguientes conversaciones genera un título corto (máximo {TITLE_MAX_CHARS} caracteres)
+        que resuma el tema principal y una descripción breve (máximo {DESCRIPTION_MAX_CHARS} caracteres)
+        de los puntos principales, sin comillas ni puntos finales.
+
+        Responde solo con un JSON de la forma:
+        {{"chats": [{{"id": <número del chat>, "title": "...", "description": "..."}}]}}
+
+        {chats}
+        """
+
+        max_tokens = 80 * len(conversations)
+        with openai_scheduler.slot(PRIORITY_HOUSEKEEPING, estimate_tokens(prompt) + max_tokens):
+            response = self.client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"},
+            )
+
+        results = {}
+        for item in json.loads(response.choices[0].message.content).get("chats", []):
+            chat_id = item.get("id")
+            if chat_id in conversations and item.get("title"):
+                results[chat_id] = {
+                    "title": item["title"].strip().rstrip(".")[:TITLE_MAX_CHARS],
+                    "description": (item.get("description") or "").strip().rstrip(".")[:DESCRIPTION_MAX_CHARS],
+                }
+        return results
+
+    def _format_messages(self, messages, max_chars=None):
         """Formatea los mensajes para incluirlos en el prompt."""
         formatted = []
         for msg in messages:
             role = "Usuario" if msg["role"] == "user" else "Karen"
-            formatted.append(f"{role}: {msg['content']}")
+            content = msg["content"] if max_chars is None else msg["content"][:max_chars]
+            formatted.append(f"{role}: {content}")
         return "\n".join(formatted) 
\ No newline at end of file
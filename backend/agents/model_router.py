@@ -0,0 +1,168 @@
+"""
+Elección del modelo que genera cada respuesta del chat.
+
+La mayoría de los mensajes son preguntas puntuales que se responden con uno o
+dos fragmentos, y no necesitan la latencia ni el costo del modelo grande. El
+enrutador decide con señales locales y baratas, sin llamadas a la API:
+
+- tamaño del contexto recuperado (tokens estimados),
+- cantidad de archivos distintos en el contexto (síntesis entre documentos),
+- largo de la pregunta,
+- tipo de pregunta: comparaciones, análisis, explicaciones causales,
+  redacción o cálculos.
+
+Cualquiera de esas señales escala el mensaje al modelo grande; si no hay
+ninguna, responde el modelo chico. Con MODEL_ROUTING_MODE=shadow las
+decisiones se registran pero siempre responde el modelo grande, para comparar
+antes de activarlo; con off no se enruta.
+
+Por cada ruta se registran latencia, tokens y costo estimado en /metrics.
+"""
+import logging
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+from config import Config
+from services.openai_scheduler import estimate_tokens
+from services.resilience import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+ROUTING_OFF = "off"
+ROUTING_SHADOW = "shadow"
+ROUTING_ON = "on"
+
+ROUTE_SMALL = "small"
+ROUTE_LARGE = "large"
+
+MAX_SIMPLE_QUERY_WORDS = 40  # Preguntas más largas suelen pedir varias cosas
+
+# Precio en USD por millón de tokens (entrada, salida)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+_COMPLEX_QUESTION = re.compile(
+    r"\b(?:compar\w*|diferencias?|similitud\w*|contrast\w*|ventajas|desventajas|pros y contras"
+    r"|analiz\w*|evalu\w*|critic\w*|por que|explica\w* (?:como|por que)|justific\w*"
+    r"|infier\w*|deduc\w*|implicaciones|relacion entre|paso a paso|calcul\w*"
+    r"|redact\w*|escribe (?:un|una)|elabor\w*|propon\w*|disen\w*|plan de"
+    r"|compare|difference|versus|vs|analy[sz]\w*|evaluate|why|reason\w*|implications"
+    r"|step by step|calculate|write (?:a|an)|draft|design|propose)\b"
+)
+
+
+def _normalize(text: str) -> str:
+    """Minúsculas y sin tildes, para comparar sin depender de la ortografía."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def model_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Costo estimado en USD de una llamada (0 si el modelo no tiene precio)."""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+class ModelRouter:
+    def __init__(self, small_model: str, large_model: str, max_context_tokens: int):
+        self.models = {ROUTE_SMALL: small_model, ROUTE_LARGE: large_model}
+        self.max_context_tokens = max_context_tokens
+        self._lock = threading.Lock()
+        self._escalations = Counter()
+        self._shadow = Counter()
+        self._latencies = {route: LatencyTracker() for route in self.models}
+        self._usage = {
+            route: {"requests": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+            for route in self.models
+        }
+
+    def classify(self, message: str, documents: List[Dict]) -> Dict:
+        """Ruta sugerida para el mensaje con su contexto y las razones para escalar."""
+        reasons = []
+        context_tokens = sum(estimate_tokens(doc["content"]) for doc in documents)
+        if context_tokens > self.max_context_tokens:
+            reasons.append("context")
+        sources = {
+            Path(doc["metadata"]["source"]).name
+            for doc in documents
+            if doc["metadata"].get("source")
+        }
+        if len(sources) > 1:
+            reasons.append("multi_document")
+        text = _normalize(message)
+        if len(text.split()) > MAX_SIMPLE_QUERY_WORDS:
+            reasons.append("long_query")
+        if _COMPLEX_QUESTION.search(text):
+            reasons.append("complex_question")
+        return {
+            "route": ROUTE_LARGE if reasons else ROUTE_SMALL,
+            "reasons": reasons,
+            "context_tokens": context_tokens,
+        }
+
+    def route(self, message: str, documents: List[Dict], mode: str = None) -> Dict:
+        """Decisión final según el modo: {"route", "model", "reasons"}."""
+        mode = mode or Config.MODEL_ROUTING_MODE
+        if mode == ROUTING_OFF:
+            return {"route": ROUTE_LARGE, "model": self.models[ROUTE_LARGE], "reasons": []}
+
+        decision = self.classify(message, documents)
+        with self._lock:
+            for reason in decision["reasons"]:
+                self._escalations[reason] += 1
+            if mode == ROUTING_SHADOW:
+                self._shadow[decision["route"]] += 1
+        logger.info(
+            f"Modelo {self.models[decision['route']]} para el mensaje "
+            f"({', '.join(decision['reasons']) or 'simple'}, "
+            f"~{decision['context_tokens']} tokens de contexto, modo {mode})"
+        )
+        route = ROUTE_LARGE if mode == ROUTING_SHADOW else decision["route"]
+        return {"route": route, "model": self.models[route], "reasons": decision["reasons"]}
+
+    def record(self, route: str, seconds: float, input_tokens: int, output_tokens: int):
+        """Registra la latencia y el uso de una respuesta generada por la ruta."""
+        self._latencies[route].record(seconds)
+        cost = model_cost(self.models[route], input_tokens, output_tokens)
+        with self._lock:
+            usage = self._usage[route]
+            usage["requests"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["output_tokens"] += output_tokens
+            usage["cost_usd"] += cost
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            routes = {
+                route: {
+                    "model": self.models[route],
+                    **usage,
+                    "cost_usd": round(usage["cost_usd"], 6),
+                    "avg_cost_usd": round(usage["cost_usd"] / usage["requests"], 6)
+                    if usage["requests"]
+                    else 0.0,
+                    "p50_latency": self._latencies[route].percentile(0.5),
+                    "p95_latency": self._latencies[route].percentile(0.95),
+                }
+                for route, usage in self._usage.items()
+            }
+            return {
+                "mode": Config.MODEL_ROUTING_MODE,
+                "routes": routes,
+                "escalations": dict(self._escalations),
+                "shadow_decisions": dict(self._shadow),
+            }
+
+
+# Enrutador compartido por todo el proceso
+model_router = ModelRouter(
+    Config.CHAT_MODEL_SMALL,
+    Config.CHAT_MODEL_LARGE,
+    max_context_tokens=Config.MODEL_ROUTING_MAX_CONTEXT_TOKENS,
+)
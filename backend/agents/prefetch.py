@@ -0,0 +1,185 @@
+"""
+Preparación en segundo plano del estado de recuperación de un chat.
+
+Al abrir un chat el frontend pide su historial; en ese momento se prepara,
+fuera de la petición, lo que la primera pregunta pagaría en frío:
+
+- el conteo de documentos del chat (queda en caché para `chat_has_documents`),
+- con LOCAL_INDEX_PREFETCH, la copia local de sus embeddings: se exporta el
+  snapshot a LOCAL_INDEX_DIR si falta o está desactualizado y se carga en el
+  índice local,
+- los embeddings de las últimas preguntas del chat que necesitan recuperación,
+  que suelen repetirse o reformularse al volver a la conversación.
+
+Los chats preparados forman un LRU de PREFETCH_MAX_CHATS entradas; al salir de
+él se descarga la copia local que se cargó al prepararlo.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from config import Config
+from db.session_cache import session_registry
+from rag.local_index import local_index
+from rag.retrieval_gate import retrieval_gate
+from services.openai_scheduler import PRIORITY_HOUSEKEEPING
+from .assistant import chat_document_count, embed_queries
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_WORKERS = 2
+
+
+def ensure_local_index(chat_id: int, directory: str) -> bool:
+    """Carga en el índice local el snapshot del chat, exportándolo si no está al día.
+
+    La frescura se comprueba contra la base y no contra el conteo en caché del
+    proceso, que no ve las subidas atendidas por otros workers.
+
+    Retorna True si se cargó una copia nueva.
+    """
+    from rag.snapshot import ChatSnapshot, document_state, export_chat
+
+    state = document_state(chat_id)
+    if not state["count"] or local_index.is_current(chat_id, state):
+        return False
+
+    target = Path(directory) / str(chat_id)
+    snapshot = None
+    if (target / "manifest.json").exists():
+        snapshot = ChatSnapshot(str(target))
+        if not snapshot.is_current(state):
+            snapshot = None
+
+    if snapshot is None:
+        # Exportar aparte y reemplazar el directorio al final: otros workers
+        # pueden tener mapeado el snapshot anterior
+        tmp = Path(directory) / f".{chat_id}-{os.getpid()}-{threading.get_ident()}"
+        export_chat(chat_id, str(tmp))
+        old = Path(directory) / f".{chat_id}-{os.getpid()}-{threading.get_ident()}-old"
+        if target.exists():
+            target.rename(old)
+        try:
+            tmp.rename(target)
+        except OSError:
+            # Otro worker lo reemplazó al mismo tiempo; su copia sirve igual
+            shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(old, ignore_errors=True)
+        snapshot = ChatSnapshot(str(target))
+
+    local_index.load(snapshot, chat_id)
+    return True
+
+
+class ChatPrefetcher:
+    def __init__(self, max_chats: int, ttl: float, recent_queries: int):
+        self.max_chats = max_chats
+        self.ttl = ttl
+        self.recent_queries = recent_queries
+        self._warm: "OrderedDict[int, tuple]" = OrderedDict()  # chat_id -> (versión, expiración)
+        self._pending = set()
+        self._loaded = set()  # Chats cuya copia local cargó el prefetch
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch"
+        )
+        self._stats = {"scheduled": 0, "skipped": 0, "completed": 0, "failed": 0, "evicted": 0}
+
+    def _is_warm(self, chat_id: int, version: int) -> bool:
+        entry = self._warm.get(chat_id)
+        return bool(entry) and entry[0] == version and entry[1] > time.monotonic()
+
+    def _queries(self, messages: Iterable[Dict]) -> List[str]:
+        """Últimas preguntas del usuario que pasarían por la recuperación."""
+        queries = []
+        for message in reversed(list(messages)):
+            if len(queries) >= self.recent_queries:
+                break
+            content = (message.get("content") or "").strip()
+            if (
+                message.get("role") == "user"
+                and content
+                and content not in queries
+                and retrieval_gate.classify(content)["retrieve"]
+            ):
+                queries.append(content)
+        return queries
+
+    def schedule(self, chat_id: int, messages: Iterable[Dict] = ()) -> bool:
+        """Programa la preparación del chat; no hace nada si ya está preparado o en curso."""
+        version = session_registry.document_version(chat_id)
+        with self._lock:
+            if chat_id in self._pending or self._is_warm(chat_id, version):
+                self._stats["skipped"] += 1
+                return False
+            self._pending.add(chat_id)
+            self._stats["scheduled"] += 1
+        try:
+            queries = self._queries(messages)
+            self._executor.submit(self._prefetch, chat_id, version, queries)
+        except Exception:
+            with self._lock:
+                self._pending.discard(chat_id)
+            raise
+        return True
+
+    def _prefetch(self, chat_id: int, version: int, queries: List[str]):
+        start_time = time.time()
+        loaded = False
+        try:
+            count = chat_document_count(chat_id)
+            if count and Config.LOCAL_INDEX_PREFETCH and Config.LOCAL_INDEX_DIR:
+                loaded = ensure_local_index(chat_id, Config.LOCAL_INDEX_DIR)
+            if count and queries:
+                embed_queries(queries, chat_id, priority=PRIORITY_HOUSEKEEPING)
+        except Exception as e:
+            logger.warning(f"No se pudo preparar el chat {chat_id}: {e}")
+            with self._lock:
+                self._stats["failed"] += 1
+            return
+        finally:
+            with self._lock:
+                self._pending.discard(chat_id)
+
+        evicted = []
+        with self._lock:
+            self._stats["completed"] += 1
+            self._warm[chat_id] = (version, time.monotonic() + self.ttl)
+            self._warm.move_to_end(chat_id)
+            if loaded:
+                self._loaded.add(chat_id)
+            while len(self._warm) > self.max_chats:
+                cold, _ = self._warm.popitem(last=False)
+                self._stats["evicted"] += 1
+                if cold in self._loaded:
+                    self._loaded.discard(cold)
+                    evicted.append(cold)
+        for cold in evicted:
+            local_index.evict(cold)
+        logger.info(
+            f"Chat {chat_id} preparado en {time.time() - start_time:.2f}s "
+            f"({count} chunks, {len(queries)} preguntas embebidas)"
+        )
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "warm_chats": len(self._warm),
+                "local_index_chats": len(self._loaded),
+                "pending": len(self._pending),
+            }
+
+
+# Preparación compartida por todo el proceso
+chat_prefetcher = ChatPrefetcher(
+    max_chats=Config.PREFETCH_MAX_CHATS,
+    ttl=Config.PREFETCH_TTL,
+    recent_queries=Config.PREFETCH_RECENT_QUERIES,
+)
@@ -0,0 +1,62 @@
+from agents.model_router import (
+    ROUTE_LARGE,
+    ROUTE_SMALL,
+    ROUTING_OFF,
+    ROUTING_ON,
+    ROUTING_SHADOW,
+    ModelRouter,
+    model_cost,
+)
+
+
+def _doc(content, source="manual.pdf"):
+    return {"content": content, "metadata": {"source": source, "page": 1}, "similarity": 0.8}
+
+
+def _router():
+    return ModelRouter("gpt-4o-mini", "gpt-4o", max_context_tokens=500)
+
+
+def test_pregunta_puntual_usa_el_modelo_chico():
+    decision = _router().route(
+        "¿Cuál es el voltaje de entrada?", [_doc("El voltaje de entrada es 220 V.")], ROUTING_ON
+    )
+    assert decision["route"] == ROUTE_SMALL
+    assert decision["model"] == "gpt-4o-mini"
+
+
+def test_escala_por_tipo_de_pregunta_contexto_y_documentos():
+    router = _router()
+
+    comparison = router.classify("Compara las dos versiones del contrato", [_doc("...")])
+    assert comparison["route"] == ROUTE_LARGE
+    assert comparison["reasons"] == ["complex_question"]
+
+    long_context = router.classify("¿Qué dice?", [_doc("palabra " * 400)])
+    assert long_context["reasons"] == ["context"]
+
+    several_files = router.classify(
+        "¿Qué plazos aparecen?", [_doc("Plazo de 30 días."), _doc("Plazo de 10 días.", "anexo.pdf")]
+    )
+    assert several_files["reasons"] == ["multi_document"]
+
+
+def test_modos_off_y_shadow_usan_el_modelo_grande():
+    router = _router()
+    docs = [_doc("Dato puntual.")]
+
+    assert router.route("¿Cuál es el dato?", docs, ROUTING_OFF)["model"] == "gpt-4o"
+    assert router.route("¿Cuál es el dato?", docs, ROUTING_SHADOW)["model"] == "gpt-4o"
+    assert router.metrics()["shadow_decisions"] == {ROUTE_SMALL: 1}
+
+
+def test_metricas_de_costo_por_ruta():
+    router = _router()
+    router.record(ROUTE_SMALL, 0.8, 1_000_000, 0)
+    router.record(ROUTE_LARGE, 2.5, 0, 1_000_000)
+
+    routes = router.metrics()["routes"]
+    assert routes[ROUTE_SMALL]["requests"] == 1
+    assert routes[ROUTE_SMALL]["cost_usd"] == model_cost("gpt-4o-mini", 1_000_000, 0) == 0.15
+    assert routes[ROUTE_LARGE]["cost_usd"] == 10.0
+    assert model_cost("modelo-desconocido", 1000, 1000) == 0.0
@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip("openai")
+
+import agents.title_job as title_job
+from db.chat_store import DEFAULT_CHAT_TITLE
+from db.sqlite_store import SQLiteChatStore
+
+
+class _Summarizer:
+    """Resume solo los chats indicados, como un modelo que omite algunos."""
+
+    def __init__(self, answered):
+        self.answered = answered
+        self.requested = []
+
+    def summarize_chats(self, conversations):
+        self.requested.extend(conversations)
+        return {
+            chat_id: {"title": f"Chat {chat_id}", "description": ""}
+            for chat_id in conversations
+            if chat_id in self.answered
+        }
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = SQLiteChatStore(str(tmp_path / "chats.db"))
+    monkeypatch.setattr(title_job, "chat_store", store)
+    monkeypatch.setattr(title_job.Config, "TITLE_RETRY_SECONDS", 3600)
+    return store
+
+
+def _chats(store, count):
+    chat_ids = [store.create_chat(DEFAULT_CHAT_TITLE, "") for _ in range(count)]
+    for chat_id in chat_ids:
+        store.add_message(chat_id, "user", "Hola")
+    return chat_ids
+
+
+def test_chats_sin_titulo_no_bloquean_a_los_nuevos(store):
+    omitted, answered = _chats(store, 2)
+    summarizer = _Summarizer(answered={answered})
+    assert title_job.generate_pending_titles(2, 2, summarizer) == {
+        answered: {"title": f"Chat {answered}", "description": ""}
+    }
+
+    # El chat omitido espera su reintento y el nuevo entra en el cupo del ciclo
+    (newer,) = _chats(store, 1)
+    summarizer = _Summarizer(answered={newer})
+    title_job.generate_pending_titles(1, 1, summarizer)
+    assert summarizer.requested == [newer]
+
+
+def test_un_lote_fallido_se_reintenta_mas_tarde(store, monkeypatch):
+    (chat_id,) = _chats(store, 1)
+
+    class _Failing:
+        def summarize_chats(self, conversations):
+            raise RuntimeError("sin respuesta del modelo")
+
+    assert title_job.generate_pending_titles(5, 5, _Failing()) == {}
+    assert store.chats_needing_titles(5, retry_after=3600) == []
+    monkeypatch.setattr(title_job.Config, "TITLE_RETRY_SECONDS", 0)
+    assert title_job.generate_pending_titles(5, 5, _Summarizer({chat_id}))
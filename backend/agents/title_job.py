@@ -0,0 +1,53 @@
+"""
+Generación en segundo plano de títulos y descripciones de chats.
+
+Cada ciclo toma los chats que conservan el título por defecto y ya tienen
+mensajes (primero los nunca intentados; los que fallaron o el modelo omitió
+esperan TITLE_RETRY_SECONDS para no bloquear a los nuevos), envía solo sus primeros mensajes en lotes de varios chats por
+llamada y guarda todos los resultados con una escritura. No interviene en el
+camino de respuesta de los mensajes.
+"""
+import logging
+from typing import Dict
+
+from config import Config
+from db.chat_store import chat_store
+from services.background import start_periodic
+from .chat_summarizer import ChatSummarizer
+
+logger = logging.getLogger(__name__)
+
+TITLE_MESSAGES = 4  # Primeros mensajes de cada chat enviados al modelo
+
+
+def generate_pending_titles(
+    max_chats: int = None, chats_per_call: int = None, summarizer: ChatSummarizer = None
+) -> Dict[int, Dict]:
+    """Genera y guarda títulos para los chats pendientes; retorna lo actualizado."""
+    max_chats = max_chats or Config.TITLE_MAX_CHATS
+    chats_per_call = chats_per_call or Config.TITLE_CHATS_PER_CALL
+    chat_ids = chat_store.chats_needing_titles(max_chats, retry_after=Config.TITLE_RETRY_SECONDS)
+    if not chat_ids:
+        return {}
+    chat_store.mark_title_attempts(chat_ids)
+
+    summarizer = summarizer or ChatSummarizer()
+    updates = {}
+    for i in range(0, len(chat_ids), chats_per_call):
+        conversations = {
+            chat_id: chat_store.get_messages(chat_id, limit=TITLE_MESSAGES)
+            for chat_id in chat_ids[i : i + chats_per_call]
+        }
+        try:
+            updates.update(summarizer.summarize_chats(conversations))
+        except Exception as e:
+            logger.error(f"Error generando títulos de los chats {list(conversations)}: {e}")
+
+    chat_store.update_chats(updates)
+    logger.info(f"Títulos generados para {len(updates)} de {len(chat_ids)} chats")
+    return updates
+
+
+def start_background_titles(interval: float):
+    """Genera títulos periódicamente; con varios workers, solo en uno por host."""
+    return start_periodic("chat-titles", interval, generate_pending_titles, lock_name="chat-titles")
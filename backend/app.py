@@ -0,0 +1,103 @@
+from flask import Flask, jsonify
+from flask_cors import CORS
+from routes.assistant_routes import assistant_bp
+from config import config
+from rag import file_store
+from services.openai_scheduler import openai_scheduler
+from services.single_flight import single_flight
+from agents.assistant import retrieval_breaker
+from db.garbage_collector import start_background_gc
+from agents.title_job import start_background_titles
+from rag.local_index import local_index
+from rag.context_builder import count_tokens
+from rag.retrieval_gate import retrieval_gate
+from agents.model_router import model_router
+from agents.prefetch import chat_prefetcher
+from rag.embedding_cache import query_embedding_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def bootstrap_worker():
+    """Inicialización que usa la red; se ejecuta una vez por proceso que atiende peticiones.
+
+    En modo producción corre en cada worker después del fork para no compartir
+    conexiones abiertas entre procesos.
+    """
+    # Verificar el bucket de archivos una sola vez al iniciar
+    try:
+        file_store.ensure_bucket()
+    except Exception as e:
+        logger.warning(f"No se pudo verificar el bucket de archivos: {e}")
+
+    # Limpieza periódica de documentos y archivos de chats eliminados
+    if config.GC_INTERVAL_SECONDS > 0:
+        start_background_gc(config.GC_INTERVAL_SECONDS)
+
+    # Títulos y descripciones de chats nuevos, fuera del camino de los mensajes
+    if config.TITLE_INTERVAL_SECONDS > 0:
+        start_background_titles(config.TITLE_INTERVAL_SECONDS)
+
+
+def create_app(bootstrap=True):
+    """Crea y configura la aplicación Flask
+
+    Con bootstrap=False no se hace ninguna llamada de red, de modo que la
+    aplicación se puede precargar en el proceso maestro antes del fork.
+    """
+    app = Flask(__name__)
+    
+    # Configuración básica
+    app.config['SECRET_KEY'] = config.SECRET_KEY
+    app.config['DEBUG'] = config.DEBUG
+    
+    # Habilitar CORS
+    CORS(app)
+    
+    if bootstrap:
+        bootstrap_worker()
+
+    # Precargar el índice vectorial local desde snapshots (memoria compartida tras el fork)
+    if config.LOCAL_INDEX_DIR:
+        loaded = local_index.warm_from_directory(config.LOCAL_INDEX_DIR)
+        logger.info(f"Índice local: {loaded} chats precargados")
+
+    # Cargar el tokenizer y entrenar el clasificador de recuperación antes del fork
+    count_tokens("")
+    retrieval_gate.warm()
+
+    # Registrar rutas
+    app.register_blueprint(assistant_bp, url_prefix='/api/assistant')
+    
+    # Ruta de prueba
+    @app.route('/')
+    def index():
+        return jsonify({
+            "status": "success",
+            "message": "API de Karen funcionando correctamente"
+        })
+    
+    # Ruta de estado
+    @app.route('/health')
+    def health():
+        return jsonify({
+            "status": "healthy",
+            "version": "1.0.0"
+        })
+
+    # Ruta de métricas
+    @app.route('/metrics')
+    def metrics():
+        return jsonify({
+            "openai_scheduler": openai_scheduler.metrics(),
+            "single_flight": single_flight.metrics(),
+            "retrieval_circuit": retrieval_breaker.metrics(),
+            "local_index": local_index.metrics(),
+            "retrieval_gate": retrieval_gate.metrics(),
+            "model_router": model_router.metrics(),
+            "prefetch": chat_prefetcher.metrics(),
+            "query_embedding_cache": query_embedding_cache.metrics()
+        })
+    
+    return app
@@ -20,6 +20,108 @@ class Config:
     HOST = os.getenv('HOST', 'localhost')
     PORT = int(os.getenv('PORT', 5000))
 
+    # Modo producción (Gunicorn); 0 workers = uno por núcleo
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', 0))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 4))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 300))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+    WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', 1000))
+
+    # Almacenamiento de sesiones, mensajes y archivos: supabase o sqlite
+    CHAT_STORE_BACKEND = os.getenv('CHAT_STORE_BACKEND', 'supabase')
+    SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(os.path.dirname(__file__), 'data', 'karen.db'))
+    # Los chats de SQLite reciben ids mayores a este valor. Cada despliegue que comparte
+    # la tabla documents necesita un rango propio (p. ej. 1000000000 por despliegue)
+    SQLITE_CHAT_ID_BASE = int(os.getenv('SQLITE_CHAT_ID_BASE', 0))
+
+    # Caché de sesiones de chat
+    SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', 10000))
+    SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', 300))
+
+    # Presupuestos del planificador de OpenAI
+    OPENAI_REQUESTS_PER_MINUTE = float(os.getenv('OPENAI_REQUESTS_PER_MINUTE', 500))
+    OPENAI_TOKENS_PER_MINUTE = float(os.getenv('OPENAI_TOKENS_PER_MINUTE', 150000))
+    # Fracción del presupuesto que pueden usar la ingesta y las tareas de fondo
+    OPENAI_BACKGROUND_SHARE = float(os.getenv('OPENAI_BACKGROUND_SHARE', 0.8))
+
+    # Parámetros de la recuperación (medir con python -m rag.benchmark)
+    RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', 5))
+    RETRIEVAL_SCORE_THRESHOLD = float(os.getenv('RETRIEVAL_SCORE_THRESHOLD', 0.7))
+
+    # Plazos y resiliencia de la recuperación
+    REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', 30))
+    RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv('RETRIEVAL_TIMEOUT_SECONDS', 5))
+    RETRIEVAL_MAX_ATTEMPTS = int(os.getenv('RETRIEVAL_MAX_ATTEMPTS', 3))
+    RETRIEVAL_HEDGE_ENABLED = os.getenv('RETRIEVAL_HEDGE_ENABLED', 'True').lower() == 'true'
+    RETRIEVAL_HEDGE_PERCENTILE = float(os.getenv('RETRIEVAL_HEDGE_PERCENTILE', 0.95))
+    RETRIEVAL_FAILURE_THRESHOLD = int(os.getenv('RETRIEVAL_FAILURE_THRESHOLD', 5))
+    RETRIEVAL_RESET_TIMEOUT = float(os.getenv('RETRIEVAL_RESET_TIMEOUT', 30))
+
+    # Búsqueda en dos fases: candidatos sobre vectores compactos y reordenamiento exacto
+    VECTOR_SEARCH_COMPACT = os.getenv('VECTOR_SEARCH_COMPACT', 'False').lower() == 'true'
+    VECTOR_RESCORE_FACTOR = int(os.getenv('VECTOR_RESCORE_FACTOR', 5))
+    # none, float16 o int8
+    LOCAL_INDEX_QUANTIZATION = os.getenv('LOCAL_INDEX_QUANTIZATION', 'none')
+
+    # Descomposición de preguntas compuestas en sub-consultas
+    QUERY_DECOMPOSITION_ENABLED = os.getenv('QUERY_DECOMPOSITION_ENABLED', 'False').lower() == 'true'
+
+    # Modelo de embeddings; los text-embedding-3 permiten truncar la dimensión (p. ej. 512 o 768)
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-ada-002')
+    EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', 1536))
+
+    # Clasificador local que salta la recuperación en mensajes de charla
+    # (off, shadow = solo registra las decisiones, on = salta la recuperación)
+    RETRIEVAL_GATE_MODE = os.getenv('RETRIEVAL_GATE_MODE', 'shadow')
+    RETRIEVAL_GATE_THRESHOLD = float(os.getenv('RETRIEVAL_GATE_THRESHOLD', 0.8))  # Confianza mínima para saltar
+    # El modelo también salta la recuperación (si no, solo las reglas de charla)
+    RETRIEVAL_GATE_MODEL_SKIPS = os.getenv('RETRIEVAL_GATE_MODEL_SKIPS', 'False').lower() == 'true'
+
+    # Modelo de cada respuesta: el chico para preguntas simples, el grande para las complejas
+    # (off = siempre el grande, shadow = solo registra las decisiones, on = enruta)
+    CHAT_MODEL_SMALL = os.getenv('CHAT_MODEL_SMALL', 'gpt-4o-mini')
+    CHAT_MODEL_LARGE = os.getenv('CHAT_MODEL_LARGE', 'gpt-4o')
+    MODEL_ROUTING_MODE = os.getenv('MODEL_ROUTING_MODE', 'on')
+    MODEL_ROUTING_MAX_CONTEXT_TOKENS = int(os.getenv('MODEL_ROUTING_MAX_CONTEXT_TOKENS', 1500))  # Más contexto escala
+
+    # Esquema y resúmenes por sección de cada archivo para preguntas de resumen
+    OUTLINES_ENABLED = os.getenv('OUTLINES_ENABLED', 'True').lower() == 'true'
+
+    # Títulos y descripciones de chats en segundo plano (0 desactiva la tarea)
+    TITLE_INTERVAL_SECONDS = float(os.getenv('TITLE_INTERVAL_SECONDS', 60))
+    TITLE_MAX_CHATS = int(os.getenv('TITLE_MAX_CHATS', 50))  # Chats por ciclo
+    TITLE_CHATS_PER_CALL = int(os.getenv('TITLE_CHATS_PER_CALL', 10))
+    # Segundos antes de reintentar un chat cuyo título no se pudo generar
+    TITLE_RETRY_SECONDS = float(os.getenv('TITLE_RETRY_SECONDS', 3600))
+
+    # Limpieza de datos huérfanos (0 desactiva la recolección periódica)
+    GC_INTERVAL_SECONDS = float(os.getenv('GC_INTERVAL_SECONDS', 0))
+    GC_BATCH_SIZE = int(os.getenv('GC_BATCH_SIZE', 200))
+    GC_BATCH_PAUSE = float(os.getenv('GC_BATCH_PAUSE', 0.5))
+
+    # Directorio de snapshots para precargar el índice vectorial local
+    LOCAL_INDEX_DIR = os.getenv('LOCAL_INDEX_DIR', '')
+    # Segundos entre comprobaciones de que la copia local coincide con la base
+    LOCAL_INDEX_CHECK_INTERVAL = float(os.getenv('LOCAL_INDEX_CHECK_INTERVAL', 30))
+    # Exportar y cargar el snapshot de un chat al abrirlo (requiere LOCAL_INDEX_DIR)
+    LOCAL_INDEX_PREFETCH = os.getenv('LOCAL_INDEX_PREFETCH', 'False').lower() == 'true'
+
+    # Preparación en segundo plano del estado de recuperación al abrir un chat
+    PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'True').lower() == 'true'
+    PREFETCH_MAX_CHATS = int(os.getenv('PREFETCH_MAX_CHATS', 200))  # Chats preparados a la vez
+    PREFETCH_TTL = float(os.getenv('PREFETCH_TTL', 300))  # Segundos antes de volver a prepararlo
+    PREFETCH_RECENT_QUERIES = int(os.getenv('PREFETCH_RECENT_QUERIES', 3))  # Preguntas recientes a embeber
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 2048))
+
+    # Caché del texto extraído de los PDFs por hash de contenido (vacío la desactiva)
+    PAGE_CACHE_DIR = os.getenv('PAGE_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'data', 'page_cache'))
+
+    # Subidas reanudables por partes
+    UPLOAD_DIR = os.getenv('UPLOAD_DIR', os.path.join(os.path.dirname(__file__), 'data', 'uploads'))
+    UPLOAD_PART_SIZE = int(os.getenv('UPLOAD_PART_SIZE', 8 * 1024 * 1024))
+    MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 200 * 1024 * 1024))  # También límite del bucket
+    UPLOAD_SESSION_TTL = float(os.getenv('UPLOAD_SESSION_TTL', 24 * 3600))  # Sesiones sin actividad
+
     def __init__(self):
         # Verificar variables requeridas
         required_vars = [
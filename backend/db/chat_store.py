@@ -0,0 +1,271 @@
+"""
+Almacenamiento del estado de los chats: sesiones, mensajes y archivos.
+
+Las rutas, el asistente y la ingesta usan `chat_store` en lugar de consultar
+directamente las tablas `chat_sessions`, `messages` y `chat_files`. El backend
+se elige con CHAT_STORE_BACKEND: `supabase` (por defecto) o `sqlite`, una base
+embebida sin saltos de red para despliegues de un solo nodo y para pruebas.
+Los documentos y sus embeddings siguen en Supabase.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from config import Config
+
+PAGE_SIZE = 1000  # Filas leídas por consulta al recorrer tablas completas
+DEFAULT_CHAT_TITLE = "Nueva conversación"  # Título de los chats aún sin título generado
+
+CHAT_FILE_COLUMNS = "id, chat_id, file_name, file_url, file_path, content_hash"
+
+
+class ChatStore(ABC):
+    # Sesiones de chat
+    @abstractmethod
+    def create_chat(self, title: str, description: str) -> int:
+        """Crea un chat y retorna su ID."""
+
+    @abstractmethod
+    def chat_exists(self, chat_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    def list_chats(self) -> List[Dict]:
+        """Chats con id, title, description y created_at, del más reciente al más antiguo."""
+
+    @abstractmethod
+    def chat_ids(self) -> Iterator[int]:
+        ...
+
+    @abstractmethod
+    def delete_chat(self, chat_id: int):
+        """Elimina el chat y sus mensajes."""
+
+    @abstractmethod
+    def chats_needing_titles(self, limit: int, retry_after: Optional[float] = None) -> List[int]:
+        """Chats con mensajes que aún tienen el título por defecto.
+
+        Primero los que nunca se intentaron; con `retry_after`, los ya
+        intentados solo vuelven pasados esos segundos.
+        """
+
+    @abstractmethod
+    def mark_title_attempts(self, chat_ids: List[int]):
+        """Registra que se intentó generar el título de los chats."""
+
+    @abstractmethod
+    def update_chats(self, updates: Dict[int, Dict]):
+        """Actualiza title y description de varios chats a la vez.
+
+        Los chats eliminados mientras tanto se ignoran: no se vuelven a crear.
+        """
+
+    # Mensajes
+    @abstractmethod
+    def add_message(self, chat_id: int, role: str, content: str, metadata: Optional[Dict] = None):
+        ...
+
+    @abstractmethod
+    def get_messages(self, chat_id: int, limit: Optional[int] = None) -> List[Dict]:
+        """Mensajes del chat con role, content y created_at, en orden cronológico."""
+
+    @abstractmethod
+    def get_recent_messages(self, chat_id: int, limit: int) -> List[Dict]:
+        """Últimos `limit` mensajes del chat, en orden cronológico."""
+
+    # Archivos de los chats
+    @abstractmethod
+    def add_chat_files(self, rows: List[Dict]):
+        """Registra archivos (chat_id, file_name, file_url, file_path, content_hash)."""
+
+    @abstractmethod
+    def find_chat_file(self, content_hash: str, chat_id: Optional[int] = None) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def list_chat_files(self, chat_id: int) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def iter_chat_files(self) -> Iterator[Dict]:
+        """Recorre todos los archivos registrados (id, chat_id, content_hash)."""
+
+    @abstractmethod
+    def delete_chat_files(self, chat_id: int) -> List[Dict]:
+        """Elimina los archivos de un chat y retorna las filas eliminadas."""
+
+    @abstractmethod
+    def delete_chat_files_by_id(self, ids: Iterable[int]):
+        ...
+
+
+class SupabaseChatStore(ChatStore):
+    def __init__(self, client=None):
+        if client is None:
+            from db.supabase_utils import supabase as client
+        self.client = client
+
+    def _paged(self, table: str, columns: str) -> Iterator[Dict]:
+        start = 0
+        while True:
+            page = (
+                self.client.table(table)
+                .select(columns)
+                .order("id")
+                .range(start, start + PAGE_SIZE - 1)
+                .execute()
+            )
+            yield from page.data
+            if len(page.data) < PAGE_SIZE:
+                return
+            start += PAGE_SIZE
+
+    def create_chat(self, title: str, description: str) -> int:
+        response = (
+            self.client.table("chat_sessions")
+            .insert({"title": title, "description": description})
+            .execute()
+        )
+        if not response.data:
+            raise Exception("Error al crear la sesión de chat")
+        return response.data[0]["id"]
+
+    def chat_exists(self, chat_id: int) -> bool:
+        result = self.client.table("chat_sessions").select("id").eq("id", chat_id).execute()
+        return bool(result.data)
+
+    def list_chats(self) -> List[Dict]:
+        response = (
+            self.client.table("chat_sessions")
+            .select("id,title,description,created_at")
+            .order("created_at", desc=True)
+            .execute()
+        )
+        return response.data
+
+    def chat_ids(self) -> Iterator[int]:
+        return (row["id"] for row in self._paged("chat_sessions", "id"))
+
+    def delete_chat(self, chat_id: int):
+        # Los mensajes se eliminan por la restricción ON DELETE CASCADE
+        self.client.table("chat_sessions").delete().eq("id", chat_id).execute()
+
+    def chats_needing_titles(self, limit: int, retry_after: Optional[float] = None) -> List[int]:
+        # `messages!inner` deja solo los chats que tienen al menos un mensaje
+        query = (
+            self.client.table("chat_sessions")
+            .select("id, messages!inner(id)")
+            .eq("title", DEFAULT_CHAT_TITLE)
+        )
+        if retry_after is not None:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=retry_after)
+            query = query.or_(
+                f"title_attempted_at.is.null,title_attempted_at.lte.{cutoff:%Y-%m-%dT%H:%M:%SZ}"
+            )
+        response = (
+            query.order("title_attempted_at", nullsfirst=True)
+            .order("id")
+            .limit(1, foreign_table="messages")
+            .limit(limit)
+            .execute()
+        )
+        return [row["id"] for row in response.data]
+
+    def mark_title_attempts(self, chat_ids: List[int]):
+        if chat_ids:
+            self.client.table("chat_sessions").update(
+                {"title_attempted_at": datetime.now(timezone.utc).isoformat()}
+            ).in_("id", list(chat_ids)).execute()
+
+    def update_chats(self, updates: Dict[int, Dict]):
+        # update y no upsert: un upsert volvería a insertar los chats borrados
+        for chat_id, fields in updates.items():
+            self.client.table("chat_sessions").update(fields).eq("id", chat_id).execute()
+
+    def add_message(self, chat_id: int, role: str, content: str, metadata: Optional[Dict] = None):
+        self.client.table("messages").insert(
+            {
+                "chat_session_id": chat_id,
+                "role": role,
+                "content": content,
+                "metadata": metadata,
+            }
+        ).execute()
+
+    def get_messages(self, chat_id: int, limit: Optional[int] = None) -> List[Dict]:
+        query = (
+            self.client.table("messages")
+            .select("role,content,created_at")
+            .eq("chat_session_id", chat_id)
+            .order("created_at")
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return query.execute().data
+
+    def get_recent_messages(self, chat_id: int, limit: int) -> List[Dict]:
+        rows = (
+            self.client.table("messages")
+            .select("role,content,created_at")
+            .eq("chat_session_id", chat_id)
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute()
+            .data
+        )
+        return rows[::-1]
+
+    def add_chat_files(self, rows: List[Dict]):
+        if rows:
+            self.client.table("chat_files").insert(rows).execute()
+
+    def find_chat_file(self, content_hash: str, chat_id: Optional[int] = None) -> Optional[Dict]:
+        query = (
+            self.client.table("chat_files")
+            .select(CHAT_FILE_COLUMNS)
+            .eq("content_hash", content_hash)
+        )
+        if chat_id is not None:
+            query = query.eq("chat_id", chat_id)
+        result = query.limit(1).execute()
+        return result.data[0] if result.data else None
+
+    def list_chat_files(self, chat_id: int) -> List[Dict]:
+        result = (
+            self.client.table("chat_files")
+            .select(CHAT_FILE_COLUMNS)
+            .eq("chat_id", chat_id)
+            .order("id")
+            .execute()
+        )
+        return result.data
+
+    def iter_chat_files(self) -> Iterator[Dict]:
+        return self._paged("chat_files", "id, chat_id, content_hash")
+
+    def delete_chat_files(self, chat_id: int) -> List[Dict]:
+        result = self.client.table("chat_files").delete().eq("chat_id", chat_id).execute()
+        return result.data or []
+
+    def delete_chat_files_by_id(self, ids: Iterable[int]):
+        from postgrest.types import ReturnMethod
+
+        self.client.table("chat_files").delete(returning=ReturnMethod.minimal).in_(
+            "id", list(ids)
+        ).execute()
+
+
+def create_chat_store(backend: str = None) -> ChatStore:
+    """Crea el almacenamiento configurado en CHAT_STORE_BACKEND."""
+    backend = backend or Config.CHAT_STORE_BACKEND
+    if backend == "supabase":
+        return SupabaseChatStore()
+    if backend == "sqlite":
+        from db.sqlite_store import SQLiteChatStore
+
+        return SQLiteChatStore(Config.SQLITE_PATH, chat_id_base=Config.SQLITE_CHAT_ID_BASE)
+    raise ValueError(f"Backend de almacenamiento no soportado: {backend}")
+
+
+# Almacenamiento compartido por todo el proceso
+chat_store = create_chat_store()
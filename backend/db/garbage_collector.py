@@ -0,0 +1,283 @@
+"""
+Limpieza de datos huérfanos de chats eliminados.
+
+Borrar un chat solo elimina la sesión y sus mensajes. Este módulo elimina los `documents`, las filas de `chat_files` y los
+archivos del bucket que ya no pertenecen a ningún chat, en lotes con pausas
+para no saturar la base de datos.
+
+Los documentos y el bucket son compartidos, así que la recolección completa
+solo corre con CHAT_STORE_BACKEND=supabase: con SQLite la lista de chats
+válidos es local y se borrarían datos de otros despliegues.
+
+Uso: python -m db.garbage_collector
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Set
+
+from postgrest.types import ReturnMethod
+
+from config import Config
+from db.chat_store import SupabaseChatStore, chat_store
+from db.supabase_utils import supabase
+from rag.file_store import BUCKET_NAME
+from rag.outline import outline_store
+from rag.page_cache import page_cache
+from services.background import start_periodic
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000  # Filas u objetos leídos por consulta
+STORAGE_GRACE_PERIOD = timedelta(hours=1)  # Antigüedad mínima de un archivo para borrarlo
+
+
+def _shares_chat_state() -> bool:
+    """Si los chats válidos se leen de la misma base que los documentos y el bucket."""
+    return isinstance(chat_store, SupabaseChatStore)
+
+
+def _owns_chat_documents(chat_id: int) -> bool:
+    """Si las filas de `documents` con este chat_id son de este despliegue.
+
+    Con SQLite los ids son locales: solo son propios si están en el rango
+    reservado con SQLITE_CHAT_ID_BASE.
+    """
+    if _shares_chat_state():
+        return True
+    return Config.SQLITE_CHAT_ID_BASE > 0 and chat_id > Config.SQLITE_CHAT_ID_BASE
+
+
+def _new_report() -> Dict:
+    return {"documents": 0, "chat_files": 0, "storage_objects": 0, "storage_bytes": 0}
+
+
+def _paged_rows(table: str, columns: str) -> Iterator[Dict]:
+    """Recorre una tabla completa por páginas ordenadas por id."""
+    start = 0
+    while True:
+        page = (
+            supabase.table(table)
+            .select(columns)
+            .order("id")
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+        )
+        yield from page.data
+        if len(page.data) < PAGE_SIZE:
+            return
+        start += PAGE_SIZE
+
+
+def _list_storage(path: str) -> Iterator[Dict]:
+    """Lista los objetos de una carpeta del bucket por páginas."""
+    offset = 0
+    while True:
+        items = supabase.storage.from_(BUCKET_NAME).list(
+            path, {"limit": PAGE_SIZE, "offset": offset}
+        )
+        yield from items
+        if len(items) < PAGE_SIZE:
+            return
+        offset += PAGE_SIZE
+
+
+def _stored_object(path: str) -> Optional[Dict]:
+    """Metadatos de un objeto del bucket, o None si ya no existe."""
+    folder, name = path.rsplit("/", 1)
+    items = supabase.storage.from_(BUCKET_NAME).list(folder, {"search": name})
+    return next((item for item in items if item["name"] == name), None)
+
+
+def _is_old_enough(item: Dict) -> bool:
+    created_at = item.get("created_at")
+    if not created_at:
+        return True
+    created = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    return datetime.now(timezone.utc) - created >= STORAGE_GRACE_PERIOD
+
+
+def _delete_in_batches(table: str, ids: List[int], batch_size: int, pause: float) -> int:
+    deleted = 0
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i : i + batch_size]
+        if table == "chat_files":
+            chat_store.delete_chat_files_by_id(batch)
+        else:
+            supabase.table(table).delete(returning=ReturnMethod.minimal).in_(
+                "id", batch
+            ).execute()
+        deleted += len(batch)
+        if i + batch_size < len(ids):
+            time.sleep(pause)
+    return deleted
+
+
+def _remove_objects(items: List[Dict], batch_size: int, pause: float, report: Dict):
+    """Elimina objetos del bucket y acumula la cantidad y los bytes liberados."""
+    for i in range(0, len(items), batch_size):
+        batch = items[i : i + batch_size]
+        supabase.storage.from_(BUCKET_NAME).remove([item["path"] for item in batch])
+        report["storage_objects"] += len(batch)
+        report["storage_bytes"] += sum(
+            (item.get("metadata") or {}).get("size", 0) for item in batch
+        )
+        if i + batch_size < len(items):
+            time.sleep(pause)
+
+
+def _remove_derived(content_hashes: List[str]):
+    """Elimina las páginas en caché y los índices de secciones de archivos borrados."""
+    for content_hash in content_hashes:
+        page_cache.remove(content_hash)
+    outline_store().delete(content_hashes)
+
+
+def _referenced_hashes() -> Set[str]:
+    return {
+        row["content_hash"]
+        for row in chat_store.iter_chat_files()
+        if row.get("content_hash")
+    }
+
+
+def _unreferenced_blobs(referenced: Set[str]) -> List[Dict]:
+    """Archivos en blobs/ cuyo hash ya no aparece en `chat_files`."""
+    orphans = []
+    for prefix in _list_storage("blobs"):
+        if prefix.get("id") is not None:  # Solo carpetas
+            continue
+        folder = f"blobs/{prefix['name']}"
+        for item in _list_storage(folder):
+            content_hash = item["name"].rsplit(".", 1)[0]
+            if content_hash not in referenced and _is_old_enough(item):
+                orphans.append({**item, "path": f"{folder}/{item['name']}"})
+    return orphans
+
+
+def delete_chat_artifacts(chat_id: int, batch_size: int = None, pause: float = None) -> Dict:
+    """Elimina los documentos, archivos y objetos de un chat recién borrado."""
+    batch_size = batch_size or Config.GC_BATCH_SIZE
+    pause = Config.GC_BATCH_PAUSE if pause is None else pause
+    report = _new_report()
+
+    deleted_files = chat_store.delete_chat_files(chat_id)
+    report["chat_files"] = len(deleted_files)
+
+    # Un id de SQLite sin rango propio puede ser el de un chat de otro despliegue
+    if not _owns_chat_documents(chat_id):
+        logger.warning(
+            f"Documentos del chat {chat_id} conservados: configurar SQLITE_CHAT_ID_BASE"
+        )
+        return report
+
+    deleted_documents = (
+        supabase.table("documents")
+        .delete(count="exact", returning=ReturnMethod.minimal)
+        .eq("chat_id", chat_id)
+        .execute()
+    )
+    report["documents"] = deleted_documents.count or 0
+
+    # Con un almacenamiento local no se ven los chats de otros despliegues que
+    # comparten el bucket: los archivos se dejan para no borrar los ajenos
+    if not _shares_chat_state():
+        logger.info(f"Limpieza del chat {chat_id}: {report}")
+        return report
+
+    # Archivos compartidos: borrar solo los que ningún otro chat referencia y
+    # con la misma antigüedad mínima que exige collect_orphans
+    candidates = {}
+    for row in deleted_files:
+        content_hash = row.get("content_hash")
+        if not content_hash or content_hash in candidates:
+            continue
+        if chat_store.find_chat_file(content_hash) is None:
+            item = _stored_object(row["file_path"])
+            if item is not None and _is_old_enough(item):
+                candidates[content_hash] = {**item, "path": row["file_path"]}
+
+    # Volver a comprobar justo antes de borrar: una subida del mismo contenido
+    # puede haber reutilizado el archivo mientras se leían los metadatos
+    orphan_hashes = [
+        content_hash
+        for content_hash in candidates
+        if chat_store.find_chat_file(content_hash) is None
+    ]
+    orphan_objects = [candidates[content_hash] for content_hash in orphan_hashes]
+    _remove_derived(orphan_hashes)
+
+    # Archivos subidos antes del almacenamiento por hash
+    legacy_folder = f"chat_{chat_id}"
+    orphan_objects.extend(
+        {**item, "path": f"{legacy_folder}/{item['name']}"}
+        for item in _list_storage(legacy_folder)
+        if item.get("id") is not None and _is_old_enough(item)
+    )
+    _remove_objects(orphan_objects, batch_size, pause, report)
+
+    logger.info(f"Limpieza del chat {chat_id}: {report}")
+    return report
+
+
+def collect_orphans(batch_size: int = None, pause: float = None) -> Dict:
+    """Busca y elimina en lotes todo lo que pertenece a chats inexistentes."""
+    if not _shares_chat_state():
+        raise RuntimeError(
+            "La recolección de huérfanos requiere CHAT_STORE_BACKEND=supabase: "
+            "los documentos y archivos son compartidos con otros despliegues"
+        )
+    batch_size = batch_size or Config.GC_BATCH_SIZE
+    pause = Config.GC_BATCH_PAUSE if pause is None else pause
+    report = _new_report()
+    start_time = time.time()
+
+    valid_chats = set(chat_store.chat_ids())
+    # Ignorar chats creados después de leer la lista de chats válidos
+    max_chat_id = max(valid_chats, default=0)
+
+    def is_orphan(chat_id) -> bool:
+        return chat_id is not None and chat_id <= max_chat_id and chat_id not in valid_chats
+
+    tables = {
+        "documents": _paged_rows("documents", "id, chat_id"),
+        "chat_files": chat_store.iter_chat_files(),
+    }
+    for table, rows in tables.items():
+        orphan_ids = [row["id"] for row in rows if is_orphan(row["chat_id"])]
+        report[table] = _delete_in_batches(table, orphan_ids, batch_size, pause)
+
+    orphan_objects = _unreferenced_blobs(_referenced_hashes())
+    _remove_derived([item["name"].rsplit(".", 1)[0] for item in orphan_objects])
+    for folder in _list_storage(""):
+        name = folder["name"]
+        if folder.get("id") is None and name.startswith("chat_"):
+            chat_id = name[len("chat_") :]
+            if chat_id.isdigit() and is_orphan(int(chat_id)):
+                orphan_objects.extend(
+                    {**item, "path": f"{name}/{item['name']}"}
+                    for item in _list_storage(name)
+                    if item.get("id") is not None and _is_old_enough(item)
+                )
+    _remove_objects(orphan_objects, batch_size, pause, report)
+
+    duration = time.time() - start_time
+    logger.info(f"Recolección de huérfanos completada en {duration:.2f}s: {report}")
+    return report
+
+
+def start_background_gc(interval: float) -> Optional[threading.Thread]:
+    """Ejecuta la recolección de huérfanos periódicamente en un hilo de fondo.
+
+    Con varios workers en el mismo host solo uno ejecuta la recolección.
+    """
+    if not _shares_chat_state():
+        logger.warning("Recolección de huérfanos desactivada: requiere CHAT_STORE_BACKEND=supabase")
+        return None
+    return start_periodic("orphan-gc", interval, collect_orphans, lock_name="orphan-gc")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(collect_orphans())
@@ -0,0 +1,101 @@
+-- Búsqueda en dos fases sobre vectores compactos (requiere pgvector >= 0.7)
+--
+-- El índice HNSW se construye sobre la expresión embedding::halfvec (float16),
+-- la mitad de memoria que el índice sobre vector(1536), y reemplaza al índice
+-- de precisión completa de add_documents_vector_indexes.sql: al aplicar esta
+-- migración se debe activar VECTOR_SEARCH_COMPACT=true. La función busca los
+-- candidatos en el índice compacto y recalcula la similitud exacta con los
+-- embeddings completos antes de filtrar por umbral y ordenar.
+--
+-- Igual que match_documents_for_chat, los chats de hasta exact_limit chunks se
+-- buscan de forma exacta sobre sus filas, y los más grandes usan el índice con
+-- hnsw.iterative_scan (pgvector >= 0.8) para no perder filas por el filtro de chat.
+--
+-- Con EMBEDDING_DIMENSIONS distinto de 1536 se debe cambiar la dimensión de la
+-- columna (ALTER TABLE documents ALTER COLUMN embedding TYPE vector(N)), de este
+-- archivo y de add_match_documents_for_chat.sql, y volver a generar los embeddings.
+
+CREATE INDEX IF NOT EXISTS idx_documents_embedding_halfvec_hnsw
+ON documents USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- El índice compacto reemplaza al de precisión completa: mantener ambos duplica la memoria
+DROP INDEX IF EXISTS idx_documents_embedding_hnsw;
+
+CREATE OR REPLACE FUNCTION match_documents_for_chat_compact(
+    query_embedding vector(1536),
+    chat_id bigint,
+    match_threshold float DEFAULT 0.7,
+    match_count int DEFAULT 20,
+    rescore_count int DEFAULT 100
+)
+RETURNS TABLE (
+    id bigint,
+    content text,
+    metadata jsonb,
+    embedding vector(1536),
+    similarity float
+)
+LANGUAGE plpgsql STABLE
+SET hnsw.ef_search = 100
+AS $$
+DECLARE
+    exact_limit CONSTANT bigint := 50000;
+    chat_rows bigint;
+BEGIN
+    SELECT count(*) INTO chat_rows
+    FROM documents d
+    WHERE d.chat_id = match_documents_for_chat_compact.chat_id;
+
+    IF chat_rows <= exact_limit THEN
+        -- MATERIALIZED impide que el planificador use el índice HNSW global
+        RETURN QUERY
+        WITH chat_documents AS MATERIALIZED (
+            SELECT d.id, d.content, d.metadata, d.embedding
+            FROM documents d
+            WHERE d.chat_id = match_documents_for_chat_compact.chat_id
+        )
+        SELECT
+            c.id,
+            c.content,
+            c.metadata,
+            c.embedding,
+            1 - (c.embedding <=> query_embedding) AS similarity
+        FROM chat_documents c
+        WHERE c.embedding <=> query_embedding < 1 - match_threshold
+        ORDER BY c.embedding <=> query_embedding
+        LIMIT match_count;
+        RETURN;
+    END IF;
+
+    BEGIN
+        PERFORM set_config('hnsw.iterative_scan', 'relaxed_order', true);
+    EXCEPTION WHEN OTHERS THEN
+        NULL;  -- pgvector < 0.8
+    END;
+
+    RETURN QUERY
+    WITH coarse AS MATERIALIZED (
+        SELECT d.id
+        FROM documents d
+        WHERE d.chat_id = match_documents_for_chat_compact.chat_id
+        ORDER BY d.embedding::halfvec(1536) <=> query_embedding::halfvec(1536)
+        LIMIT rescore_count
+    )
+    SELECT
+        d.id,
+        d.content,
+        d.metadata,
+        d.embedding,
+        1 - (d.embedding <=> query_embedding) AS similarity
+    FROM coarse
+    JOIN documents d ON d.id = coarse.id
+    WHERE d.embedding <=> query_embedding < 1 - match_threshold
+    ORDER BY d.embedding <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
+
+-- Comentarios
+COMMENT ON INDEX idx_documents_embedding_halfvec_hnsw IS 'Búsqueda aproximada sobre embeddings en float16';
+COMMENT ON FUNCTION match_documents_for_chat_compact(vector, bigint, float, int, int) IS 'Busca candidatos en el índice float16 y los reordena con la similitud exacta';
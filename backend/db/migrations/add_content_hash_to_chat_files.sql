@@ -0,0 +1,14 @@
+-- Agregar hash de contenido para deduplicar archivos entre chats
+ALTER TABLE chat_files
+ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Índice para encontrar archivos con el mismo contenido
+CREATE INDEX IF NOT EXISTS idx_chat_files_content_hash
+ON chat_files (content_hash);
+
+-- Índice para reutilizar los chunks ya procesados de un archivo
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash
+ON documents ((metadata->>'content_hash'));
+
+-- Comentario para la columna
+COMMENT ON COLUMN chat_files.content_hash IS 'Hash SHA-256 del contenido; el archivo se guarda una sola vez en blobs/ y se referencia desde varios chats';
@@ -0,0 +1,15 @@
+-- Esquema y resúmenes por sección de cada archivo, por hash de contenido
+--
+-- Se generan en la ingesta y se usan para responder preguntas de visión
+-- general o sobre una sección sin recuperar fragmentos. Un mismo archivo en
+-- varios chats comparte su esquema.
+CREATE TABLE IF NOT EXISTS document_outlines (
+    content_hash TEXT PRIMARY KEY,
+    file_name TEXT,
+    overview TEXT,
+    sections JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Comentario para la columna
+COMMENT ON COLUMN document_outlines.sections IS 'Secciones con number, title, level, page_start, page_end y summary, en orden del documento';
@@ -0,0 +1,15 @@
+-- Índices para la búsqueda vectorial sobre la tabla documents
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Índice ANN (HNSW) para similitud coseno sobre los embeddings
+CREATE INDEX IF NOT EXISTS idx_documents_embedding_hnsw
+ON documents USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Índice para filtrar documentos por chat
+CREATE INDEX IF NOT EXISTS idx_documents_chat_id
+ON documents (chat_id);
+
+-- Comentario para los índices
+COMMENT ON INDEX idx_documents_embedding_hnsw IS 'Búsqueda aproximada de vecinos cercanos por similitud coseno';
+COMMENT ON INDEX idx_documents_chat_id IS 'Filtrado de documentos por sesión de chat';
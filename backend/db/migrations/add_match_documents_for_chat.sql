@@ -0,0 +1,83 @@
+-- Variante de match_documents que filtra por chat y umbral en el servidor
+--
+-- El índice HNSW es global: con WHERE chat_id = ... devuelve los ef_search
+-- vecinos más cercanos de toda la tabla y después filtra por chat, así que un
+-- chat pequeño dentro de una tabla grande puede quedarse con pocas filas o
+-- ninguna. Por eso:
+--
+--   * Chats de hasta exact_limit chunks: búsqueda exacta sobre sus filas, que
+--     se leen con idx_documents_chat_id (unos milisegundos incluso con decenas
+--     de miles de vectores).
+--   * Chats más grandes: índice HNSW con hnsw.iterative_scan (pgvector >= 0.8),
+--     que sigue recorriendo el grafo hasta reunir match_count filas del chat.
+--     Con versiones anteriores se usa el índice sin recorrido iterativo; esos
+--     chats son una parte grande de la tabla y el filtrado posterior pierde poco.
+CREATE OR REPLACE FUNCTION match_documents_for_chat(
+    query_embedding vector(1536),
+    chat_id bigint,
+    match_threshold float DEFAULT 0.7,
+    match_count int DEFAULT 20
+)
+RETURNS TABLE (
+    id bigint,
+    content text,
+    metadata jsonb,
+    embedding vector(1536),
+    similarity float
+)
+LANGUAGE plpgsql STABLE
+SET hnsw.ef_search = 100
+AS $$
+DECLARE
+    exact_limit CONSTANT bigint := 50000;
+    chat_rows bigint;
+BEGIN
+    SELECT count(*) INTO chat_rows
+    FROM documents d
+    WHERE d.chat_id = match_documents_for_chat.chat_id;
+
+    IF chat_rows <= exact_limit THEN
+        -- MATERIALIZED impide que el planificador use el índice HNSW global
+        RETURN QUERY
+        WITH chat_documents AS MATERIALIZED (
+            SELECT d.id, d.content, d.metadata, d.embedding
+            FROM documents d
+            WHERE d.chat_id = match_documents_for_chat.chat_id
+        )
+        SELECT
+            c.id,
+            c.content,
+            c.metadata,
+            c.embedding,
+            1 - (c.embedding <=> query_embedding) AS similarity
+        FROM chat_documents c
+        WHERE c.embedding <=> query_embedding < 1 - match_threshold
+        ORDER BY c.embedding <=> query_embedding
+        LIMIT match_count;
+        RETURN;
+    END IF;
+
+    BEGIN
+        PERFORM set_config('hnsw.iterative_scan', 'relaxed_order', true);
+    EXCEPTION WHEN OTHERS THEN
+        NULL;  -- pgvector < 0.8
+    END;
+
+    -- relaxed_order puede devolver los candidatos algo desordenados: se reordenan
+    RETURN QUERY
+    WITH candidates AS MATERIALIZED (
+        SELECT d.id, d.content, d.metadata, d.embedding, d.embedding <=> query_embedding AS distance
+        FROM documents d
+        WHERE d.chat_id = match_documents_for_chat.chat_id
+        ORDER BY d.embedding <=> query_embedding
+        LIMIT match_count
+    )
+    SELECT c.id, c.content, c.metadata, c.embedding, 1 - c.distance AS similarity
+    FROM candidates c
+    WHERE c.distance < 1 - match_threshold
+    ORDER BY c.distance;
+END;
+$$;
+
+-- Comentario para la función
+COMMENT ON FUNCTION match_documents_for_chat(vector, bigint, float, int) IS 'Devuelve los documentos de un chat con similitud mayor a match_threshold, ordenados por similitud';
@@ -0,0 +1,6 @@
+-- Último intento de generar el título de un chat. Los chats cuyo título no se pudo
+-- generar se reintentan más tarde en lugar de ocupar siempre el primer lugar de la cola
+ALTER TABLE chat_sessions
+ADD COLUMN IF NOT EXISTS title_attempted_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN chat_sessions.title_attempted_at IS 'Último intento de generar el título y la descripción del chat';
@@ -0,0 +1,77 @@
+"""
+Caché en proceso de las sesiones de chat existentes.
+
+Evita consultar el almacenamiento de chats en cada subida o mensaje para saber si un chat
+es válido. Solo se guardan resultados positivos; las rutas de creación y
+borrado mantienen la caché al día.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from db.chat_store import chat_store
+
+
+class SessionRegistry:
+    def __init__(self, max_size: int = 10000, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._expires_at = OrderedDict()
+        self._document_versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, chat_id: int) -> bool:
+        with self._lock:
+            expires_at = self._expires_at.get(chat_id)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._expires_at[chat_id]
+                return False
+            self._expires_at.move_to_end(chat_id)
+            return True
+
+    def add(self, chat_id: int):
+        """Registra un chat que se sabe que existe."""
+        with self._lock:
+            self._expires_at[chat_id] = time.monotonic() + self.ttl
+            self._expires_at.move_to_end(chat_id)
+            while len(self._expires_at) > self.max_size:
+                self._expires_at.popitem(last=False)
+
+    def invalidate(self, chat_id: int):
+        """Elimina un chat de la caché (por ejemplo, al borrarlo)."""
+        with self._lock:
+            self._expires_at.pop(chat_id, None)
+            self._document_versions.pop(chat_id, None)
+
+    def document_version(self, chat_id: int) -> int:
+        """Versión de los documentos del chat conocida por este proceso."""
+        with self._lock:
+            return self._document_versions.get(chat_id, 0)
+
+    def bump_document_version(self, chat_id: int):
+        """Marca que los documentos del chat cambiaron."""
+        with self._lock:
+            self._document_versions[chat_id] = self._document_versions.get(chat_id, 0) + 1
+            self._document_versions.move_to_end(chat_id)
+            while len(self._document_versions) > self.max_size:
+                self._document_versions.popitem(last=False)
+
+    def exists(self, chat_id: int) -> bool:
+        """Indica si el chat existe, consultando la base de datos solo si no está en caché."""
+        if chat_id is None:
+            return False
+        if self._cached(chat_id):
+            return True
+        if chat_store.chat_exists(chat_id):
+            self.add(chat_id)
+            return True
+        return False
+
+
+# Registro compartido por todo el proceso
+session_registry = SessionRegistry(
+    max_size=Config.SESSION_CACHE_SIZE, ttl=Config.SESSION_CACHE_TTL
+)
@@ -0,0 +1,256 @@
+"""
+Almacenamiento embebido de chats en SQLite.
+
+Usa modo WAL (lecturas concurrentes con una escritura), una conexión por hilo
+y por proceso (segura con workers preforkeados) y sentencias fijas que SQLite
+mantiene preparadas en su caché de sentencias.
+"""
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from db.chat_store import DEFAULT_CHAT_TITLE, ChatStore
+
+STATEMENT_CACHE_SIZE = 128
+BUSY_TIMEOUT_MS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT,
+    description TEXT,
+    title_attempted_at TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_session_id INTEGER NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    metadata TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS chat_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    file_name TEXT,
+    file_url TEXT,
+    file_path TEXT,
+    content_hash TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_created_at ON chat_sessions (created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_chat_created ON messages (chat_session_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_chat_files_chat_id ON chat_files (chat_id);
+CREATE INDEX IF NOT EXISTS idx_chat_files_content_hash ON chat_files (content_hash);
+"""
+
+# Sentencias fijas: sqlite3 reutiliza la sentencia preparada para el mismo texto
+INSERT_CHAT = "INSERT INTO chat_sessions (title, description) VALUES (?, ?)"
+SELECT_CHAT = "SELECT 1 FROM chat_sessions WHERE id = ?"
+LIST_CHATS = (
+    "SELECT id, title, description, created_at FROM chat_sessions "
+    "ORDER BY created_at DESC, id DESC"
+)
+SELECT_CHAT_IDS = "SELECT id FROM chat_sessions ORDER BY id"
+DELETE_CHAT = "DELETE FROM chat_sessions WHERE id = ?"
+SELECT_UNTITLED_CHATS = (
+    "SELECT id FROM chat_sessions s WHERE title = ? "
+    "AND EXISTS (SELECT 1 FROM messages m WHERE m.chat_session_id = s.id) "
+    "AND (? IS NULL OR title_attempted_at IS NULL "
+    "OR title_attempted_at <= strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now', ?)) "
+    "ORDER BY title_attempted_at IS NOT NULL, title_attempted_at, id LIMIT ?"
+)
+MARK_TITLE_ATTEMPT = (
+    "UPDATE chat_sessions SET title_attempted_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') "
+    "WHERE id = ?"
+)
+# Bases creadas antes de la columna title_attempted_at
+ADD_TITLE_ATTEMPTED_AT = "ALTER TABLE chat_sessions ADD COLUMN title_attempted_at TEXT"
+UPDATE_CHAT = "UPDATE chat_sessions SET title = ?, description = ? WHERE id = ?"
+INSERT_MESSAGE = (
+    "INSERT INTO messages (chat_session_id, role, content, metadata) VALUES (?, ?, ?, ?)"
+)
+SELECT_MESSAGES = (
+    "SELECT role, content, created_at FROM messages "
+    "WHERE chat_session_id = ? ORDER BY created_at, id LIMIT ?"
+)
+SELECT_RECENT_MESSAGES = (
+    "SELECT role, content, created_at FROM messages "
+    "WHERE chat_session_id = ? ORDER BY created_at DESC, id DESC LIMIT ?"
+)
+INSERT_CHAT_FILE = (
+    "INSERT INTO chat_files (chat_id, file_name, file_url, file_path, content_hash) "
+    "VALUES (:chat_id, :file_name, :file_url, :file_path, :content_hash)"
+)
+CHAT_FILE_COLUMNS = "id, chat_id, file_name, file_url, file_path, content_hash"
+FIND_CHAT_FILE = f"SELECT {CHAT_FILE_COLUMNS} FROM chat_files WHERE content_hash = ? LIMIT 1"
+FIND_CHAT_FILE_IN_CHAT = (
+    f"SELECT {CHAT_FILE_COLUMNS} FROM chat_files WHERE content_hash = ? AND chat_id = ? LIMIT 1"
+)
+LIST_CHAT_FILES = f"SELECT {CHAT_FILE_COLUMNS} FROM chat_files WHERE chat_id = ? ORDER BY id"
+ITER_CHAT_FILES = "SELECT id, chat_id, content_hash FROM chat_files ORDER BY id"
+DELETE_CHAT_FILES = "DELETE FROM chat_files WHERE chat_id = ?"
+DELETE_CHAT_FILE_BY_ID = "DELETE FROM chat_files WHERE id = ?"
+# El contador de AUTOINCREMENT vive en sqlite_sequence; se adelanta hasta la base
+INSERT_CHAT_SEQUENCE = (
+    "INSERT INTO sqlite_sequence (name, seq) SELECT 'chat_sessions', ? "
+    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'chat_sessions')"
+)
+RAISE_CHAT_SEQUENCE = "UPDATE sqlite_sequence SET seq = ? WHERE name = 'chat_sessions' AND seq < ?"
+
+
+class SQLiteChatStore(ChatStore):
+    def __init__(self, path: str, chat_id_base: int = 0):
+        self.path = path
+        # Los ids de chat empiezan después de la base, para no chocar con los de
+        # otros despliegues que comparten la tabla documents
+        self.chat_id_base = chat_id_base
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión del hilo actual; se abre de nuevo si el proceso cambió (fork)."""
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path,
+                timeout=BUSY_TIMEOUT_MS / 1000,
+                cached_statements=STATEMENT_CACHE_SIZE,
+                isolation_level=None,  # Autocommit; las transacciones se abren explícitamente
+            )
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute("PRAGMA foreign_keys = ON")
+            connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            with self._schema_lock:
+                if self._schema_pid != os.getpid():
+                    connection.executescript(SCHEMA)
+                    columns = {
+                        row["name"] for row in connection.execute("PRAGMA table_info(chat_sessions)")
+                    }
+                    if "title_attempted_at" not in columns:
+                        connection.execute(ADD_TITLE_ATTEMPTED_AT)
+                    if self.chat_id_base:
+                        connection.execute(INSERT_CHAT_SEQUENCE, (self.chat_id_base,))
+                        connection.execute(
+                            RAISE_CHAT_SEQUENCE, (self.chat_id_base, self.chat_id_base)
+                        )
+                    self._schema_pid = os.getpid()
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self._connection().execute(sql, params)
+
+    def create_chat(self, title: str, description: str) -> int:
+        return self._execute(INSERT_CHAT, (title, description)).lastrowid
+
+    def chat_exists(self, chat_id: int) -> bool:
+        return self._execute(SELECT_CHAT, (chat_id,)).fetchone() is not None
+
+    def list_chats(self) -> List[Dict]:
+        return [dict(row) for row in self._execute(LIST_CHATS)]
+
+    def chat_ids(self) -> Iterator[int]:
+        return (row["id"] for row in self._execute(SELECT_CHAT_IDS).fetchall())
+
+    def delete_chat(self, chat_id: int):
+        self._execute(DELETE_CHAT, (chat_id,))
+
+    def chats_needing_titles(self, limit: int, retry_after: Optional[float] = None) -> List[int]:
+        modifier = None if retry_after is None else f"-{retry_after} seconds"
+        rows = self._execute(SELECT_UNTITLED_CHATS, (DEFAULT_CHAT_TITLE, modifier, modifier, limit))
+        return [row["id"] for row in rows]
+
+    def mark_title_attempts(self, chat_ids: List[int]):
+        if chat_ids:
+            self._transaction([(MARK_TITLE_ATTEMPT, (chat_id,)) for chat_id in chat_ids])
+
+    def update_chats(self, updates: Dict[int, Dict]):
+        if updates:
+            self._transaction(
+                [
+                    (UPDATE_CHAT, (fields["title"], fields["description"], chat_id))
+                    for chat_id, fields in updates.items()
+                ]
+            )
+
+    def add_message(self, chat_id: int, role: str, content: str, metadata: Optional[Dict] = None):
+        self._execute(
+            INSERT_MESSAGE,
+            (chat_id, role, content, json.dumps(metadata) if metadata is not None else None),
+        )
+
+    def get_messages(self, chat_id: int, limit: Optional[int] = None) -> List[Dict]:
+        # LIMIT -1 en SQLite significa sin límite
+        limit = -1 if limit is None else limit
+        return [dict(row) for row in self._execute(SELECT_MESSAGES, (chat_id, limit))]
+
+    def get_recent_messages(self, chat_id: int, limit: int) -> List[Dict]:
+        rows = self._execute(SELECT_RECENT_MESSAGES, (chat_id, limit))
+        return [dict(row) for row in rows][::-1]
+
+    def add_chat_files(self, rows: List[Dict]):
+        if not rows:
+            return
+        self._transaction(
+            [
+                (
+                    INSERT_CHAT_FILE,
+                    {
+                        "chat_id": row["chat_id"],
+                        "file_name": row.get("file_name"),
+                        "file_url": row.get("file_url"),
+                        "file_path": row.get("file_path"),
+                        "content_hash": row.get("content_hash"),
+                    },
+                )
+                for row in rows
+            ]
+        )
+
+    def find_chat_file(self, content_hash: str, chat_id: Optional[int] = None) -> Optional[Dict]:
+        if chat_id is None:
+            row = self._execute(FIND_CHAT_FILE, (content_hash,)).fetchone()
+        else:
+            row = self._execute(FIND_CHAT_FILE_IN_CHAT, (content_hash, chat_id)).fetchone()
+        return dict(row) if row else None
+
+    def list_chat_files(self, chat_id: int) -> List[Dict]:
+        return [dict(row) for row in self._execute(LIST_CHAT_FILES, (chat_id,))]
+
+    def iter_chat_files(self) -> Iterator[Dict]:
+        return (dict(row) for row in self._execute(ITER_CHAT_FILES).fetchall())
+
+    def _transaction(self, statements):
+        """Ejecuta varias sentencias en una sola transacción."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            results = [connection.execute(sql, params).fetchall() for sql, params in statements]
+            connection.execute("COMMIT")
+            return results
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def delete_chat_files(self, chat_id: int) -> List[Dict]:
+        rows, _ = self._transaction(
+            [(LIST_CHAT_FILES, (chat_id,)), (DELETE_CHAT_FILES, (chat_id,))]
+        )
+        return [dict(row) for row in rows]
+
+    def delete_chat_files_by_id(self, ids: Iterable[int]):
+        self._transaction([(DELETE_CHAT_FILE_BY_ID, (i,)) for i in ids])
@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip("postgrest")
+
+import db.garbage_collector as gc
+from db.sqlite_store import SQLiteChatStore
+
+
+def _file(chat_id, content_hash):
+    return {
+        "chat_id": chat_id,
+        "file_name": "manual.pdf",
+        "file_url": f"https://example.com/{content_hash}.pdf",
+        "file_path": f"blobs/{content_hash[:2]}/{content_hash}.pdf",
+        "content_hash": content_hash,
+    }
+
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path):
+    store = SQLiteChatStore(str(tmp_path / "chats.db"))
+    client = MagicMock()
+    client.storage.from_.return_value.list.return_value = []
+    outlines = MagicMock()
+    monkeypatch.setattr(gc, "chat_store", store)
+    monkeypatch.setattr(gc, "supabase", client)
+    monkeypatch.setattr(gc, "page_cache", MagicMock())
+    monkeypatch.setattr(gc, "outline_store", lambda: outlines)
+    # Como si los chats estuvieran en la misma base que los documentos
+    monkeypatch.setattr(gc, "_shares_chat_state", lambda: True)
+    return store, client, outlines
+
+
+def _stored(client, created_at):
+    """Hace que el bucket devuelva cada objeto buscado con esa fecha de creación."""
+
+    def listing(folder, options):
+        name = options.get("search")
+        if not name:
+            return []
+        return [{"id": name, "name": name, "created_at": created_at, "metadata": {"size": 10}}]
+
+    client.storage.from_.return_value.list.side_effect = listing
+
+
+def test_borrar_un_chat_limpia_los_derivados_de_sus_archivos_huerfanos(storage):
+    store, client, outlines = storage
+    _stored(client, "2024-01-01T00:00:00Z")
+    first = store.create_chat("Primero", "Conversación iniciada")
+    second = store.create_chat("Segundo", "Conversación iniciada")
+    store.add_chat_files([_file(first, "aa11"), _file(first, "bb22"), _file(second, "bb22")])
+
+    report = gc.delete_chat_artifacts(first, pause=0)
+
+    assert report["storage_objects"] == 1
+    assert report["storage_bytes"] == 10
+    client.storage.from_.return_value.remove.assert_called_once_with(["blobs/aa/aa11.pdf"])
+    gc.page_cache.remove.assert_called_once_with("aa11")
+    outlines.delete.assert_called_once_with(["aa11"])
+
+
+def test_no_borra_archivos_recien_subidos(storage):
+    store, client, outlines = storage
+    _stored(client, datetime.now(timezone.utc).isoformat())
+    chat_id = store.create_chat("Primero", "Conversación iniciada")
+    store.add_chat_files([_file(chat_id, "aa11")])
+
+    report = gc.delete_chat_artifacts(chat_id, pause=0)
+
+    assert report["chat_files"] == 1
+    assert report["storage_objects"] == 0
+    client.storage.from_.return_value.remove.assert_not_called()
+    gc.page_cache.remove.assert_not_called()
+
+
+def test_no_borra_archivos_reutilizados_durante_la_limpieza(storage):
+    store, client, outlines = storage
+    chat_id = store.create_chat("Primero", "Conversación iniciada")
+    other = store.create_chat("Segundo", "Conversación iniciada")
+    store.add_chat_files([_file(chat_id, "aa11")])
+
+    def listing(folder, options):
+        if not options.get("search"):
+            return []
+        # Una subida del mismo contenido registra el archivo mientras tanto
+        store.add_chat_files([_file(other, "aa11")])
+        return [{"id": "x", "name": "aa11.pdf", "created_at": "2024-01-01T00:00:00Z"}]
+
+    client.storage.from_.return_value.list.side_effect = listing
+
+    gc.delete_chat_artifacts(chat_id, pause=0)
+
+    client.storage.from_.return_value.remove.assert_not_called()
+    gc.page_cache.remove.assert_not_called()
+
+
+def test_con_almacenamiento_local_no_borra_datos_compartidos(storage, monkeypatch):
+    store, client, outlines = storage
+    monkeypatch.setattr(gc, "_shares_chat_state", lambda: False)
+    chat_id = store.create_chat("Local", "Conversación iniciada")
+    store.add_chat_files([_file(chat_id, "aa11")])
+
+    with pytest.raises(RuntimeError):
+        gc.collect_orphans(pause=0)
+    assert gc.start_background_gc(60) is None
+
+    gc.delete_chat_artifacts(chat_id, pause=0)
+    client.storage.from_.return_value.remove.assert_not_called()
+    outlines.delete.assert_not_called()
+    # Sin rango propio de ids, el chat 1 puede ser de otro despliegue
+    client.table.assert_not_called()
+
+
+def test_con_rango_de_ids_propio_borra_los_documentos_del_chat(storage, monkeypatch, tmp_path):
+    _, client, _ = storage
+    monkeypatch.setattr(gc, "_shares_chat_state", lambda: False)
+    monkeypatch.setattr(gc.Config, "SQLITE_CHAT_ID_BASE", 5000)
+    store = SQLiteChatStore(str(tmp_path / "namespaced.db"), chat_id_base=5000)
+    monkeypatch.setattr(gc, "chat_store", store)
+    chat_id = store.create_chat("Local", "Conversación iniciada")
+
+    gc.delete_chat_artifacts(chat_id, pause=0)
+
+    assert chat_id == 5001
+    client.table.return_value.delete.return_value.eq.assert_called_once_with("chat_id", 5001)
+    client.storage.from_.return_value.remove.assert_not_called()
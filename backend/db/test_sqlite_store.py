@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+
+from db.chat_store import DEFAULT_CHAT_TITLE
+from db.sqlite_store import SQLiteChatStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteChatStore(str(tmp_path / "chats.db"))
+
+
+def _file(chat_id, content_hash, name="manual.pdf"):
+    return {
+        "chat_id": chat_id,
+        "file_name": name,
+        "file_url": f"https://example.com/{content_hash}.pdf",
+        "file_path": f"blobs/{content_hash[:2]}/{content_hash}.pdf",
+        "content_hash": content_hash,
+    }
+
+
+def test_usa_modo_wal(store):
+    assert store._execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_sesiones_y_mensajes(store):
+    first = store.create_chat("Primero", "Conversación iniciada")
+    second = store.create_chat("Segundo", "Conversación iniciada")
+    store.add_message(first, "user", "Hola")
+    store.add_message(first, "assistant", "¿En qué te ayudo?", {"references": [1]})
+
+    assert store.chat_exists(first)
+    assert not store.chat_exists(999)
+    assert [chat["id"] for chat in store.list_chats()] == [second, first]
+    assert [(m["role"], m["content"]) for m in store.get_messages(first)] == [
+        ("user", "Hola"),
+        ("assistant", "¿En qué te ayudo?"),
+    ]
+
+    store.delete_chat(first)
+    assert not store.chat_exists(first)
+    assert store.get_messages(first) == []
+    assert list(store.chat_ids()) == [second]
+
+
+def test_chats_pendientes_de_titulo(store):
+    empty = store.create_chat(DEFAULT_CHAT_TITLE, "")
+    pending = store.create_chat(DEFAULT_CHAT_TITLE, "")
+    titled = store.create_chat("Manual de usuario", "")
+    for chat_id in (pending, titled):
+        for i in range(3):
+            store.add_message(chat_id, "user", f"Mensaje {i}")
+
+    assert store.chats_needing_titles(10) == [pending]
+    assert [m["content"] for m in store.get_messages(pending, limit=2)] == ["Mensaje 0", "Mensaje 1"]
+    assert [m["content"] for m in store.get_recent_messages(pending, 2)] == ["Mensaje 1", "Mensaje 2"]
+
+    store.update_chats({pending: {"title": "Instalación", "description": "Pasos de instalación"}})
+    assert store.chats_needing_titles(10) == []
+    titles = {chat["id"]: chat["title"] for chat in store.list_chats()}
+    assert titles == {empty: DEFAULT_CHAT_TITLE, pending: "Instalación", titled: "Manual de usuario"}
+
+    # Un chat borrado mientras se generaba su título no vuelve a aparecer
+    store.delete_chat(titled)
+    store.update_chats({titled: {"title": "Otro", "description": ""}})
+    assert titled not in {chat["id"] for chat in store.list_chats()}
+
+
+def test_chats_con_titulo_fallido_esperan_a_los_nuevos(store):
+    failed, new = (store.create_chat(DEFAULT_CHAT_TITLE, "") for _ in range(2))
+    for chat_id in (failed, new):
+        store.add_message(chat_id, "user", "Hola")
+
+    store.mark_title_attempts([failed])
+    assert store.chats_needing_titles(10) == [new, failed]
+    assert store.chats_needing_titles(10, retry_after=3600) == [new]
+    assert store.chats_needing_titles(10, retry_after=0) == [new, failed]
+
+
+def test_agrega_la_columna_de_intentos_a_bases_anteriores(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "chats.db"
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE chat_sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, "
+        "description TEXT, created_at TEXT NOT NULL DEFAULT '')"
+    )
+    connection.execute("INSERT INTO chat_sessions (title, description) VALUES ('Viejo', '')")
+    connection.commit()
+    connection.close()
+
+    store = SQLiteChatStore(str(path))
+    store.mark_title_attempts([1])
+    assert store.chats_needing_titles(10) == []
+
+
+def test_archivos_de_chats(store):
+    chat_id = store.create_chat("Archivos", "")
+    store.add_chat_files([_file(chat_id, "aa11"), _file(chat_id, "bb22"), _file(7, "aa11")])
+
+    assert store.find_chat_file("aa11", chat_id=7)["chat_id"] == 7
+    assert store.find_chat_file("cc33") is None
+    assert [f["content_hash"] for f in store.list_chat_files(chat_id)] == ["aa11", "bb22"]
+
+    deleted = store.delete_chat_files(chat_id)
+    assert {f["content_hash"] for f in deleted} == {"aa11", "bb22"}
+    assert store.find_chat_file("aa11")["chat_id"] == 7
+
+    store.delete_chat_files_by_id([f["id"] for f in store.iter_chat_files()])
+    assert list(store.iter_chat_files()) == []
+
+
+def test_escrituras_desde_varios_hilos(store):
+    chat_id = store.create_chat("Concurrente", "")
+
+    def write(worker):
+        for i in range(20):
+            store.add_message(chat_id, "user", f"{worker}-{i}")
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(store.get_messages(chat_id)) == 80
+
+
+def test_ids_de_chat_despues_de_la_base(tmp_path):
+    path = str(tmp_path / "chats.db")
+    assert SQLiteChatStore(path).create_chat("Antes", "") == 1
+
+    # Una base existente salta al rango configurado; los ids ya usados se conservan
+    store = SQLiteChatStore(path, chat_id_base=1000)
+    assert store.create_chat("Después", "") == 1001
+    assert SQLiteChatStore(path, chat_id_base=1000).create_chat("Otro", "") == 1002
+    assert sorted(store.chat_ids()) == [1, 1001, 1002]
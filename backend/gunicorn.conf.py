@@ -0,0 +1,38 @@
+"""
+Configuración de Gunicorn para el modo producción.
+
+La aplicación se precarga en el proceso maestro (módulos pesados, tokenizer,
+índice local mapeado en memoria) y los workers la comparten mediante
+copy-on-write. Las conexiones de red se abren en cada worker después del fork.
+
+Recarga sin cortes: `kill -HUP <pid del maestro>` reinicia los workers con la
+misma aplicación precargada; para cargar código nuevo usar `kill -USR2` y luego
+`kill -QUIT` sobre el maestro anterior.
+"""
+import multiprocessing
+
+from config import Config
+
+bind = f"{Config.HOST}:{Config.PORT}"
+workers = Config.WEB_WORKERS or multiprocessing.cpu_count()
+threads = Config.WEB_THREADS
+worker_class = "gthread"
+preload_app = True
+
+timeout = Config.WEB_TIMEOUT
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+max_requests = Config.WEB_MAX_REQUESTS
+max_requests_jitter = Config.WEB_MAX_REQUESTS // 10
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    """Inicialización con red de cada worker, ya separado del maestro."""
+    from app import bootstrap_worker
+    from services.openai_scheduler import openai_scheduler
+
+    # El presupuesto de OpenAI es por cuenta: repartirlo entre los workers
+    openai_scheduler.set_share(1.0 / workers)
+    bootstrap_worker()
@@ -0,0 +1,272 @@
+"""
+Benchmark offline de la recuperación: calidad frente a costo por configuración.
+
+Toma un corpus (directorio con .txt, .md o .pdf) y preguntas etiquetadas con
+los pasajes que deberían recuperarse, recorre una grilla de parámetros de
+chunking y búsqueda, y reporta por configuración:
+
+    recall@k, MRR, tokens de contexto por respuesta, tamaño del índice,
+    tokens de embeddings al indexar y latencia de búsqueda (p50/p95).
+
+Por defecto usa un embedder local determinista (hashing de palabras y
+bigramas), así que corre sin red ni claves; con --embedder openai usa el
+modelo configurado para resultados comparables con producción.
+
+Formato de las preguntas (JSON):
+    [{"question": "...", "passages": ["texto esperado", ...]}, ...]
+
+Uso:
+    python -m rag.benchmark corpus/ preguntas.json \\
+        --chunk-sizes 128,256 --overlaps 12,32 --top-k 3,5 --thresholds 0,0.3,0.7
+
+Los tamaños de chunk y la superposición se miden en tokens, como en la ingesta.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from rag.context_builder import build_context, count_tokens, CONTEXT_FETCH_K
+from rag.splitting import split_pages
+
+OVERLAP_CHARS_PER_TOKEN = 10  # Cota en caracteres de la superposición al fusionar chunks
+
+MATCH_COVERAGE = 0.6  # Fracción de las palabras del pasaje que debe contener un resultado
+HASHING_DIMENSIONS = 512
+
+_WORD = re.compile(r"\w+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+class HashingEmbedder:
+    """Embeddings deterministas por hashing de palabras y bigramas (sin red)."""
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        words = _words(text)
+        for feature in itertools.chain(words, map(" ".join, zip(words, words[1:]))):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        return np.vstack([self._embed(text) for text in texts])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._embed(text)
+
+
+class OpenAIEmbedder:
+    """Embeddings del modelo configurado para la ingesta."""
+
+    def __init__(self):
+        from langchain_openai import OpenAIEmbeddings
+        from rag.optimized_rag import embedding_model_kwargs
+
+        self.embeddings = OpenAIEmbeddings(**embedding_model_kwargs())
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+
+
+def load_corpus(directory: str) -> List[Tuple[str, Dict]]:
+    """Páginas (texto, metadata) de todos los archivos del corpus."""
+    pages = []
+    for path in sorted(Path(directory).rglob("*")):
+        suffix = path.suffix.lower()
+        if suffix in (".txt", ".md"):
+            pages.append((path.read_text(encoding="utf-8"), {"source": path.name, "page": 0}))
+        elif suffix == ".pdf":
+            from langchain_community.document_loaders import PyPDFLoader
+
+            for doc in PyPDFLoader(str(path)).load():
+                pages.append((doc.page_content, {**doc.metadata, "source": path.name}))
+    if not pages:
+        raise ValueError(f"No se encontraron documentos en {directory}")
+    return pages
+
+
+def load_questions(path: str) -> List[Dict]:
+    questions = json.loads(Path(path).read_text(encoding="utf-8"))
+    for item in questions:
+        if not item.get("question") or not item.get("passages"):
+            raise ValueError("Cada pregunta necesita 'question' y 'passages'")
+    return questions
+
+
+def is_match(passage: str, text: str) -> bool:
+    passage_words = set(_words(passage))
+    if not passage_words:
+        return False
+    return len(passage_words & set(_words(text))) / len(passage_words) >= MATCH_COVERAGE
+
+
+class _Index:
+    """Chunks y embeddings de una configuración de chunking."""
+
+    def __init__(self, pages, chunk_size: int, chunk_overlap: int, embedder):
+        self.chunks = split_pages(pages, chunk_size, chunk_overlap)
+        self.max_overlap = chunk_overlap * OVERLAP_CHARS_PER_TOKEN
+        self.embeddings = embedder.embed_documents(self.chunks[:])
+        self.norms = np.maximum(np.linalg.norm(self.embeddings, axis=1), 1e-12)
+        self.embedding_tokens = sum(self.chunks.token_count(i) for i in range(len(self.chunks)))
+        self.size_bytes = self.embeddings.nbytes + sum(
+            len(text.encode("utf-8")) for text in self.chunks[:]
+        )
+
+    def search(self, query_embedding: np.ndarray, top_k: int, threshold: float, fetch_k: int):
+        """Misma secuencia que producción: umbral, fetch_k candidatos y build_context."""
+        query = query_embedding / max(float(np.linalg.norm(query_embedding)), 1e-12)
+        scores = (self.embeddings @ query) / self.norms
+        order = np.argsort(-scores)[:fetch_k]
+        candidates = [
+            {
+                "content": self.chunks.text(i),
+                "metadata": self.chunks.metadata(i),
+                "similarity": float(scores[i]),
+                "embedding": self.embeddings[i],
+            }
+            for i in order
+            if scores[i] > threshold
+        ]
+        return build_context(query, candidates, top_k=top_k, max_overlap=self.max_overlap)
+
+
+def _percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+
+def evaluate(
+    index: _Index,
+    questions: List[Dict],
+    query_embeddings: Dict[str, np.ndarray],
+    top_k: int,
+    threshold: float,
+    fetch_k: int = CONTEXT_FETCH_K,
+) -> Dict:
+    """Métricas de una configuración sobre todas las preguntas."""
+    found = total = 0
+    reciprocal_ranks, prompt_tokens, latencies = [], [], []
+
+    for item in questions:
+        start = time.perf_counter()
+        results = index.search(query_embeddings[item["question"]], top_k, threshold, fetch_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        contents = [doc["content"] for doc in results]
+        prompt_tokens.append(sum(count_tokens(text) for text in contents))
+
+        first_relevant = None
+        for passage in item["passages"]:
+            total += 1
+            ranks = [rank for rank, text in enumerate(contents, 1) if is_match(passage, text)]
+            if ranks:
+                found += 1
+                first_relevant = min(ranks[0], first_relevant or ranks[0])
+        reciprocal_ranks.append(1.0 / first_relevant if first_relevant else 0.0)
+
+    return {
+        "top_k": top_k,
+        "threshold": threshold,
+        "recall_at_k": round(found / total, 4) if total else 0.0,
+        "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4),
+        "avg_prompt_tokens": round(sum(prompt_tokens) / len(prompt_tokens), 1),
+        "search_p50_ms": round(_percentile(latencies, 0.5), 3),
+        "search_p95_ms": round(_percentile(latencies, 0.95), 3),
+    }
+
+
+def run_benchmark(
+    pages: List[Tuple[str, Dict]],
+    questions: List[Dict],
+    chunk_sizes: Sequence[int],
+    overlaps: Sequence[int],
+    top_ks: Sequence[int],
+    thresholds: Sequence[float],
+    embedder=None,
+) -> List[Dict]:
+    """Evalúa todas las combinaciones de la grilla; una fila por configuración."""
+    embedder = embedder or HashingEmbedder()
+    texts = [item["question"] for item in questions]
+    query_embeddings = dict(zip(texts, embedder.embed_documents(texts)))
+
+    rows = []
+    for chunk_size, overlap in itertools.product(chunk_sizes, overlaps):
+        if overlap >= chunk_size:
+            continue
+        index = _Index(pages, chunk_size, overlap, embedder)
+        for top_k, threshold in itertools.product(top_ks, thresholds):
+            rows.append(
+                {
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": overlap,
+                    "chunks": len(index.chunks),
+                    "index_bytes": index.size_bytes,
+                    "embedding_tokens": index.embedding_tokens,
+                    **evaluate(index, questions, query_embeddings, top_k, threshold),
+                }
+            )
+    return rows
+
+
+def format_table(rows: List[Dict]) -> str:
+    if not rows:
+        return "Sin resultados"
+    columns = list(rows[0])
+    widths = [max(len(col), *(len(str(row[col])) for row in rows)) for col in columns]
+    lines = ["  ".join(col.rjust(w) for col, w in zip(columns, widths))]
+    lines += ["  ".join(str(row[col]).rjust(w) for col, w in zip(columns, widths)) for row in rows]
+    return "\n".join(lines)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def _float_list(value: str) -> List[float]:
+    return [float(v) for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline de la recuperación")
+    parser.add_argument("corpus")
+    parser.add_argument("questions")
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[128, 256])
+    parser.add_argument("--overlaps", type=_int_list, default=[12])
+    parser.add_argument("--top-k", type=_int_list, default=[3, 5])
+    parser.add_argument("--thresholds", type=_float_list, default=[0.0, 0.7])
+    parser.add_argument("--embedder", choices=["hashing", "openai"], default="hashing")
+    parser.add_argument("--json", help="Guardar los resultados en un archivo JSON")
+    args = parser.parse_args()
+
+    rows = run_benchmark(
+        load_corpus(args.corpus),
+        load_questions(args.questions),
+        args.chunk_sizes,
+        args.overlaps,
+        args.top_k,
+        args.thresholds,
+        embedder=OpenAIEmbedder() if args.embedder == "openai" else HashingEmbedder(),
+    )
+    print(format_table(rows))
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2))
@@ -0,0 +1,122 @@
+"""
+Representación compacta de los chunks de un archivo durante la ingesta.
+
+El texto de cada chunk se guarda como offsets sobre el texto de su página, la
+metadata se comparte por página y los embeddings viven en un único arreglo
+float32. Las filas para la tabla `documents` se generan al momento de insertar.
+"""
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+
+class ChunkStore:
+    def __init__(self):
+        self.pages: List[str] = []
+        self.page_metadata: List[Dict] = []
+        self._page_chunk_counts = array("I")
+        self._page = array("I")
+        self._start = array("I")
+        self._end = array("I")
+        self._chunk_index = array("I")
+        self._tokens = array("I")  # Tokens de cada chunk (0 si el splitter no los cuenta)
+        self.chunk_metadata: Dict[int, Dict] = {}  # Metadata propia de algunos chunks
+        self.embeddings: Optional[np.ndarray] = None
+
+    def add_page(self, text: str, metadata: Dict) -> int:
+        """Agrega el texto de una página y retorna su índice."""
+        self.pages.append(text)
+        self.page_metadata.append(metadata)
+        self._page_chunk_counts.append(0)
+        return len(self.pages) - 1
+
+    def add_chunk(self, page: int, start: int, end: int, tokens: int = 0):
+        """Agrega un chunk como el rango [start, end) del texto de la página."""
+        self._page.append(page)
+        self._start.append(start)
+        self._end.append(end)
+        self._tokens.append(tokens)
+        self._chunk_index.append(self._page_chunk_counts[page])
+        self._page_chunk_counts[page] += 1
+
+    def add_splits(self, page: int, splits: Sequence[str]):
+        """Registra los fragmentos de texto producidos por un splitter para una página."""
+        text = self.pages[page]
+        cursor = 0
+        for split in splits:
+            start = text.find(split, cursor)
+            if start < 0:
+                raise ValueError("El fragmento no pertenece al texto de la página")
+            end = start + len(split)
+            self.add_chunk(page, start, end)
+            # Los fragmentos pueden superponerse, así que se avanza solo hasta el inicio
+            cursor = start + 1
+
+    def __len__(self) -> int:
+        return len(self._page)
+
+    def text(self, i: int) -> str:
+        return self.pages[self._page[i]][self._start[i] : self._end[i]]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.text(i) for i in range(*key.indices(len(self)))]
+        return self.text(key)
+
+    def token_count(self, i: int) -> int:
+        return self._tokens[i]
+
+    def metadata(self, i: int) -> Dict:
+        page = self._page[i]
+        return {
+            **self.page_metadata[page],
+            "chunk_index": self._chunk_index[i],
+            "total_chunks": self._page_chunk_counts[page],
+            **self.chunk_metadata.get(i, {}),
+        }
+
+    def subset(self, indices: Sequence[int]) -> "ChunkStore":
+        """Nuevo store con solo los chunks indicados; comparte páginas y metadata.
+
+        Los chunks conservan su `chunk_index` y `total_chunks` originales.
+        """
+        store = ChunkStore()
+        store.pages = self.pages
+        store.page_metadata = self.page_metadata
+        store._page_chunk_counts = self._page_chunk_counts
+        for new, old in enumerate(indices):
+            store._page.append(self._page[old])
+            store._start.append(self._start[old])
+            store._end.append(self._end[old])
+            store._chunk_index.append(self._chunk_index[old])
+            store._tokens.append(self._tokens[old])
+            if old in self.chunk_metadata:
+                store.chunk_metadata[new] = self.chunk_metadata[old]
+        return store
+
+    def set_embeddings(self, embeddings):
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+
+    def iter_rows(self, chat_id: int, start: int = 0, stop: int = None) -> Iterator[Dict]:
+        """Genera las filas de `documents` una a una, sin materializarlas todas."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for i in range(start, stop):
+            yield {
+                "content": self.text(i),
+                "metadata": self.metadata(i),
+                "embedding": self.embeddings[i].tolist(),
+                "chat_id": chat_id,
+            }
+
+    def excerpt(self, max_chars: int) -> str:
+        """Texto de los primeros chunks, sin superar `max_chars`."""
+        parts = []
+        remaining = max_chars
+        for i in range(len(self)):
+            if remaining <= 0:
+                break
+            text = self.text(i)[:remaining]
+            parts.append(text)
+            remaining -= len(text) + 1
+        return "\n".join(parts)
@@ -0,0 +1,177 @@
+"""
+Etapa post-recuperación: diversifica, fusiona y recorta los chunks antes de
+armar el prompt.
+"""
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Configuración por defecto
+CONTEXT_FETCH_K = 20  # Candidatos que se piden al vector store antes del MMR
+CONTEXT_MAX_TOKENS = 2500  # Presupuesto de tokens para el contexto del prompt
+MMR_LAMBDA = 0.5  # 1.0 = solo relevancia, 0.0 = solo diversidad
+TOKEN_ENCODING_MODEL = "gpt-4o"
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Cuenta tokens con el tokenizer del modelo de chat."""
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+
+        _encoding = tiktoken.encoding_for_model(TOKEN_ENCODING_MODEL)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def mmr_select(
+    query_embedding: Sequence[float],
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = MMR_LAMBDA,
+) -> List[int]:
+    """Selecciona índices por máxima relevancia marginal (vectorizado).
+
+    `query_embedding` puede ser una matriz con varias sub-consultas; la
+    relevancia de cada candidato es su mejor similitud con cualquiera de ellas.
+    """
+    if len(embeddings) == 0 or k <= 0:
+        return []
+
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    queries = np.atleast_2d(np.asarray(query_embedding, dtype=np.float32))
+
+    # Normalizar para que el producto punto sea similitud coseno
+    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    relevance = (matrix @ queries.T).max(axis=1)
+    k = min(k, len(matrix))
+
+    selected = [int(np.argmax(relevance))]
+    # Máxima similitud de cada candidato con el conjunto ya seleccionado
+    max_redundancy = matrix @ matrix[selected[0]]
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        max_redundancy = np.maximum(max_redundancy, matrix @ matrix[best])
+
+    return selected
+
+
+def _overlap_length(previous: str, following: str, max_overlap: int) -> int:
+    """Longitud del sufijo de `previous` que se repite al inicio de `following`."""
+    limit = min(len(previous), len(following), max_overlap)
+    for size in range(limit, 4, -1):
+        if previous.endswith(following[:size]):
+            return size
+    return 0
+
+
+def _span_key(doc: Dict):
+    metadata = doc["metadata"]
+    return metadata.get("source"), metadata.get("page")
+
+
+def merge_adjacent_chunks(docs: List[Dict], max_overlap: int) -> List[Dict]:
+    """Fusiona chunks consecutivos de la misma fuente y página en un solo fragmento."""
+    groups: Dict[tuple, List[Dict]] = {}
+    for doc in docs:
+        groups.setdefault(_span_key(doc), []).append(doc)
+
+    merged = []
+    for group in groups.values():
+        group.sort(key=lambda d: d["metadata"].get("chunk_index", 0))
+
+        current = None
+        for doc in group:
+            index = doc["metadata"].get("chunk_index")
+            if (
+                current is not None
+                and index is not None
+                and index == current["metadata"]["chunk_span"][1] + 1
+            ):
+                overlap = _overlap_length(
+                    current["content"], doc["content"], max_overlap
+                )
+                separator = "" if overlap else "\n"
+                current["content"] += separator + doc["content"][overlap:]
+                current["metadata"]["chunk_span"][1] = index
+                current["similarity"] = max(current["similarity"], doc["similarity"])
+                continue
+
+            if current is not None:
+                merged.append(current)
+            current = {
+                "content": doc["content"],
+                "metadata": {**doc["metadata"], "chunk_span": [index, index]},
+                "similarity": doc["similarity"],
+            }
+
+        if current is not None:
+            merged.append(current)
+
+    merged.sort(key=lambda d: d["similarity"], reverse=True)
+    return merged
+
+
+def trim_to_token_budget(docs: List[Dict], max_tokens: int) -> List[Dict]:
+    """Conserva los fragmentos más relevantes que caben en el presupuesto de tokens."""
+    trimmed = []
+    used = 0
+    for doc in docs:
+        tokens = count_tokens(doc["content"])
+        if used + tokens > max_tokens:
+            # Siempre incluir al menos un fragmento aunque exceda el presupuesto
+            if not trimmed:
+                trimmed.append(doc)
+            break
+        trimmed.append(doc)
+        used += tokens
+    return trimmed
+
+
+def build_context(
+    query_embedding: Sequence[float],
+    candidates: List[Dict],
+    top_k: int = 5,
+    max_overlap: int = 50,
+    max_tokens: Optional[int] = CONTEXT_MAX_TOKENS,
+    lambda_mult: float = MMR_LAMBDA,
+) -> List[Dict]:
+    """Aplica MMR, fusión de chunks adyacentes y recorte por tokens.
+
+    Cada candidato debe tener `content`, `metadata`, `similarity` y `embedding`.
+    Los resultados no incluyen el embedding.
+    """
+    if not candidates:
+        return []
+
+    embeddings = np.vstack([c["embedding"] for c in candidates])
+    selected = mmr_select(query_embedding, embeddings, top_k, lambda_mult)
+
+    docs = [
+        {
+            "content": candidates[i]["content"],
+            "metadata": candidates[i]["metadata"],
+            "similarity": candidates[i]["similarity"],
+        }
+        for i in selected
+    ]
+    docs = merge_adjacent_chunks(docs, max_overlap)
+
+    if max_tokens is not None:
+        docs = trim_to_token_budget(docs, max_tokens)
+
+    logger.info(
+        f"Contexto: {len(candidates)} candidatos -> {len(selected)} por MMR "
+        f"-> {len(docs)} fragmentos finales"
+    )
+    return docs
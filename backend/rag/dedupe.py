@@ -0,0 +1,98 @@
+"""
+Detección de chunks casi duplicados con firmas SimHash.
+
+Encabezados, pies de página, texto legal repetido y páginas duplicadas
+producen chunks casi idénticos. Cada chunk recibe una firma de 64 bits sobre
+sus shingles de palabras; dos chunks son casi duplicados si sus firmas
+difieren en pocos bits. La búsqueda usa bandas de 16 bits: con una distancia
+máxima de 3 bits, dos firmas cercanas coinciden en al menos una banda.
+
+Los números forman parte de la firma y, además, un chunk solo se descarta si
+sus números coinciden exactamente con los del original: tablas de precios,
+cifras por año o fichas técnicas difieren solo en los números y no son
+duplicados.
+"""
+import hashlib
+import re
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+SIMHASH_BITS = 64
+SIMHASH_MAX_DISTANCE = 3  # Bits distintos tolerados entre casi duplicados
+SHINGLE_SIZE = 3  # Palabras por shingle
+BAND_BITS = 16
+
+_BIT_POSITIONS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+_WORD = re.compile(r"\w+")
+_DIGITS = re.compile(r"\d+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def numbers(text: str) -> List[str]:
+    """Números del texto en orden, para exigir igualdad exacta entre duplicados."""
+    return _DIGITS.findall(text)
+
+
+def simhash(text: str) -> int:
+    """Firma SimHash de 64 bits del texto normalizado."""
+    words = _words(text)
+    size = min(SHINGLE_SIZE, len(words)) or 1
+    shingles = {" ".join(words[i : i + size]) for i in range(max(1, len(words) - size + 1))}
+
+    hashes = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+            for s in shingles
+        ),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    bits = (hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    return int(np.packbits((votes > 0)[::-1].astype(np.uint8)).view(">u8")[0])
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def signature_to_hex(signature: int) -> str:
+    """Las firmas se guardan como texto: JSON no representa enteros de 64 bits sin pérdida."""
+    return f"{signature:016x}"
+
+
+class NearDuplicateIndex:
+    """Índice de firmas para encontrar un casi duplicado ya visto."""
+
+    def __init__(self, max_distance: int = SIMHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._bands: Dict[tuple, List] = defaultdict(list)
+
+    @staticmethod
+    def _band_keys(signature: int):
+        mask = (1 << BAND_BITS) - 1
+        for band in range(SIMHASH_BITS // BAND_BITS):
+            yield band, (signature >> (band * BAND_BITS)) & mask
+
+    def add(self, signature: int, ref: Hashable):
+        for key in self._band_keys(signature):
+            self._bands[key].append((signature, ref))
+
+    def find(
+        self, signature: int, accept: Callable[[Hashable], bool] = None
+    ) -> Optional[Hashable]:
+        """Referencia del primer elemento a distancia tolerada que `accept` confirma, o None."""
+        checked = set()
+        for key in self._band_keys(signature):
+            for other, ref in self._bands.get(key, ()):
+                if ref in checked or hamming_distance(signature, other) > self.max_distance:
+                    continue
+                checked.add(ref)
+                if accept is None or accept(ref):
+                    return ref
+        return None
@@ -0,0 +1,77 @@
+"""
+Caché en proceso de embeddings de consultas.
+
+El embedding de una pregunta depende solo del texto y del modelo, así que una
+pregunta repetida (o precalculada al abrir el chat) no vuelve a llamar a la
+API. Los vectores se guardan como float32 en un LRU acotado por cantidad de
+entradas: con 1536 dimensiones cada entrada ocupa ~6 KB.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import Config
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, text: str) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._entries.get(text)
+            if embedding is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(text)
+            self._hits += 1
+        return embedding.tolist()
+
+    def put(self, text: str, embedding: Sequence[float]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[text] = np.asarray(embedding, dtype=np.float32)
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def embed(
+        self, texts: Sequence[str], embed_documents: Callable[[List[str]], List[List[float]]]
+    ) -> List[List[float]]:
+        """Embeddings de los textos; los que faltan se piden en una sola llamada."""
+        embeddings = [self.get(text) for text in texts]
+        missing = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+        if missing:
+            computed = dict(zip(missing, embed_documents(missing)))
+            for text, embedding in computed.items():
+                self.put(text, embedding)
+            embeddings = [
+                e if e is not None else list(computed[t]) for t, e in zip(texts, embeddings)
+            ]
+        return embeddings
+
+    def __contains__(self, text: str) -> bool:
+        with self._lock:
+            return text in self._entries
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+            }
+
+
+# Caché compartida por todo el proceso
+query_embedding_cache = QueryEmbeddingCache(Config.QUERY_EMBEDDING_CACHE_SIZE)
@@ -0,0 +1,218 @@
+"""
+Almacenamiento de archivos direccionado por contenido.
+
+Los archivos se guardan una sola vez en el bucket bajo su hash SHA-256 y se
+referencian desde varios chats mediante la tabla `chat_files`.
+"""
+import hashlib
+import logging
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from config import Config
+from db.chat_store import chat_store
+from db.supabase_utils import supabase
+
+logger = logging.getLogger(__name__)
+
+BUCKET_NAME = "chat-files"
+BUCKET_FILE_SIZE_LIMIT = Config.MAX_UPLOAD_SIZE
+STREAM_CHUNK_SIZE = 1024 * 1024  # Bloques de 1 MB al leer la subida
+COPY_PAGE_SIZE = 500  # Filas de documents por página al reutilizar chunks
+
+_bucket_ready = False
+
+
+def save_stream(stream: BinaryIO, destination: Path) -> Tuple[str, int]:
+    """Escribe el stream en disco calculando el hash en la misma pasada.
+
+    Retorna el hash SHA-256 y el tamaño en bytes.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(destination, "wb") as f:
+        while True:
+            block = stream.read(STREAM_CHUNK_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+            f.write(block)
+            size += len(block)
+    return hasher.hexdigest(), size
+
+
+def batch_file_path(directory: Path, index: int, file_name: str) -> Path:
+    """Ruta temporal del archivo `index` de una subida por lotes.
+
+    Cada archivo va en su propio subdirectorio: dos archivos con el mismo nombre
+    no se sobrescriben y se conserva el nombre, que la ingesta toma de la ruta.
+    """
+    folder = Path(directory) / str(index)
+    folder.mkdir()
+    return folder / (file_name or "upload.pdf")
+
+
+def hash_file(file_path: str) -> str:
+    """Calcula el hash SHA-256 de un archivo en disco sin cargarlo completo."""
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def blob_path(content_hash: str, extension: str = ".pdf") -> str:
+    """Ruta del archivo dentro del bucket según su hash."""
+    return f"blobs/{content_hash[:2]}/{content_hash}{extension}"
+
+
+def ensure_bucket():
+    """Verifica que el bucket exista y lo crea si es necesario.
+
+    Se ejecuta una vez al iniciar la aplicación; las llamadas posteriores no
+    consultan el storage. Un bucket creado con un límite de tamaño menor se
+    actualiza al límite configurado.
+    """
+    global _bucket_ready
+    if _bucket_ready:
+        return
+    options = {
+        "public": True,
+        "file_size_limit": BUCKET_FILE_SIZE_LIMIT,
+        "allowed_mime_types": ["application/pdf"],
+    }
+    try:
+        logger.info("Verificando si el bucket existe...")
+        bucket = supabase.storage.get_bucket(BUCKET_NAME)
+        logger.info(f"Bucket encontrado: {bucket}")
+    except Exception as e:
+        logger.warning(f"Bucket no encontrado, intentando crear: {str(e)}")
+        try:
+            supabase.storage.create_bucket(id=BUCKET_NAME, options=options)
+            logger.info("Bucket creado exitosamente")
+        except Exception as create_error:
+            logger.error(f"Error creando bucket: {str(create_error)}")
+            raise
+    else:
+        current_limit = getattr(bucket, "file_size_limit", None)
+        if current_limit and current_limit < BUCKET_FILE_SIZE_LIMIT:
+            supabase.storage.update_bucket(BUCKET_NAME, options)
+            logger.info(f"Límite del bucket actualizado a {BUCKET_FILE_SIZE_LIMIT} bytes")
+    _bucket_ready = True
+
+
+def find_file_by_hash(content_hash: str, chat_id: Optional[int] = None) -> Optional[Dict]:
+    """Busca un archivo registrado con el hash dado, opcionalmente en un chat."""
+    return chat_store.find_chat_file(content_hash, chat_id=chat_id)
+
+
+def store_blob(file_path: str, content_hash: str) -> Tuple[str, str]:
+    """Sube el archivo solo si su contenido aún no está en el bucket.
+
+    Retorna la ruta en el bucket y la URL pública.
+    """
+    existing = find_file_by_hash(content_hash)
+    if existing:
+        logger.info(f"Archivo {content_hash[:12]} ya almacenado, se reutiliza")
+        return existing["file_path"], existing["file_url"]
+
+    ensure_bucket()
+    storage_path = blob_path(content_hash, Path(file_path).suffix or ".pdf")
+    logger.info(f"Subiendo archivo al bucket {BUCKET_NAME}: {storage_path}")
+    with open(file_path, "rb") as f:
+        try:
+            supabase.storage.from_(BUCKET_NAME).upload(
+                path=storage_path,
+                file=f,
+                file_options={"content-type": "application/pdf"},
+            )
+        except Exception as upload_error:
+            # Otra subida concurrente pudo haber guardado el mismo contenido
+            if "Duplicate" not in str(upload_error) and "409" not in str(upload_error):
+                logger.error(f"Error en la subida: {str(upload_error)}")
+                raise
+            logger.info("El archivo ya existía en el bucket")
+
+    file_url = supabase.storage.from_(BUCKET_NAME).get_public_url(storage_path)
+    return storage_path, file_url
+
+
+def download_blob(storage_path: str, destination: Path):
+    """Descarga un archivo del bucket a una ruta local."""
+    data = supabase.storage.from_(BUCKET_NAME).download(storage_path)
+    Path(destination).write_bytes(data)
+
+
+def register_chat_file(
+    chat_id: int, file_name: str, file_url: str, storage_path: str, content_hash: str
+):
+    """Registra la referencia de un chat a un archivo almacenado."""
+    chat_store.add_chat_files(
+        [
+            {
+                "chat_id": chat_id,
+                "file_name": file_name,  # Guardamos el nombre original
+                "file_url": file_url,
+                "file_path": storage_path,
+                "content_hash": content_hash,
+            }
+        ]
+    )
+
+
+def find_ingested_chunks(content_hash: str, chat_id: Optional[int] = None) -> List[Dict]:
+    """Obtiene los chunks ya procesados de un archivo con el mismo contenido.
+
+    Solo se toman los de un chat para no duplicar filas, y de uno donde el
+    archivo conserva todos sus chunks: en los chats donde parte del contenido
+    ya estaba en otros archivos (`metadata.partial`) faltarían fragmentos.
+    Con `chat_id` se toman los chunks del archivo en ese chat.
+    """
+    source_chat_id = chat_id
+    if source_chat_id is None:
+        source = (
+            supabase.table("documents")
+            .select("chat_id")
+            .eq("metadata->>content_hash", content_hash)
+            .is_("metadata->>partial", "null")
+            .limit(1)
+            .execute()
+        )
+        if not source.data:
+            return []
+        source_chat_id = source.data[0]["chat_id"]
+
+    rows = []
+    start = 0
+    while True:
+        page = (
+            supabase.table("documents")
+            .select("content, metadata, embedding")
+            .eq("metadata->>content_hash", content_hash)
+            .eq("chat_id", source_chat_id)
+            .order("id")
+            .range(start, start + COPY_PAGE_SIZE - 1)
+            .execute()
+        )
+        rows.extend(page.data)
+        if len(page.data) < COPY_PAGE_SIZE:
+            break
+        start += COPY_PAGE_SIZE
+    return rows
+
+
+def copy_chunks_to_chat(rows: List[Dict], chat_id: int, file_url: str) -> List[Dict]:
+    """Inserta en el chat los chunks de un archivo duplicado sin volver a procesarlo."""
+    documents = [
+        {
+            "content": row["content"],
+            "metadata": {**row["metadata"], "chat_id": chat_id, "file_url": file_url},
+            "embedding": row["embedding"],
+            "chat_id": chat_id,
+        }
+        for row in rows
+    ]
+    for i in range(0, len(documents), COPY_PAGE_SIZE):
+        supabase.table("documents").insert(documents[i : i + COPY_PAGE_SIZE]).execute()
+    logger.info(f"Se reutilizaron {len(documents)} chunks para el chat {chat_id}")
+    return documents
@@ -0,0 +1,224 @@
+"""
+Índice vectorial local en memoria para chats precargados desde snapshots.
+
+Permite responder la búsqueda semántica de un chat sin consultar Supabase.
+Los embeddings se mantienen mapeados en memoria desde el snapshot, por lo que
+varios workers comparten las mismas páginas del sistema operativo.
+
+La copia local se compara con la base en la primera búsqueda y luego cada
+LOCAL_INDEX_CHECK_INTERVAL segundos (cantidad de chunks e id del último); si
+otro worker agregó o borró documentos del chat, se descarta. Cargar no usa la
+red, así que los snapshots se pueden precargar antes del fork.
+
+Con cuantización (float16 o int8) el índice guarda en memoria una copia
+compacta y normalizada de los vectores; la búsqueda elige candidatos sobre esa
+copia y recalcula la similitud exacta de los mejores con el snapshot.
+"""
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import Config
+from db.session_cache import session_registry
+from rag.snapshot import ChatSnapshot, document_state
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+BLOCK_ROWS = 8192  # Filas procesadas por bloque para acotar la memoria temporal
+
+
+class _Entry:
+    def __init__(self, snapshot: ChatSnapshot, document_version: int, quantization: str):
+        self.snapshot = snapshot
+        self.document_version = document_version
+        self.checked_at = None  # Aún sin comparar con la base
+        count = len(snapshot)
+        self.norms = np.empty(count, dtype=np.float32)
+        self.compact = None
+        self.scales = None
+
+        if quantization == "float16":
+            self.compact = np.empty(snapshot.embeddings.shape, dtype=np.float16)
+        elif quantization == "int8":
+            self.compact = np.empty(snapshot.embeddings.shape, dtype=np.int8)
+            self.scales = np.empty(count, dtype=np.float32)
+
+        for start in range(0, count, BLOCK_ROWS):
+            block = np.asarray(snapshot.embeddings[start : start + BLOCK_ROWS], dtype=np.float32)
+            norms = np.maximum(np.linalg.norm(block, axis=1), 1e-12)
+            self.norms[start : start + len(block)] = norms
+            if self.compact is None:
+                continue
+            unit = block / norms[:, None]
+            if self.scales is None:
+                self.compact[start : start + len(block)] = unit
+            else:
+                # Escala simétrica por fila: el mayor valor absoluto pasa a 127
+                scales = np.maximum(np.abs(unit).max(axis=1), 1e-12) / 127.0
+                self.scales[start : start + len(block)] = scales
+                self.compact[start : start + len(block)] = np.round(unit / scales[:, None])
+
+    def coarse_scores(self, query: np.ndarray) -> np.ndarray:
+        """Similitud aproximada contra la copia compacta, por bloques."""
+        scores = np.empty(len(self.compact), dtype=np.float32)
+        for start in range(0, len(self.compact), BLOCK_ROWS):
+            block = self.compact[start : start + BLOCK_ROWS].astype(np.float32)
+            scores[start : start + len(block)] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def exact_scores(self, query: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        embeddings = self.snapshot.embeddings if rows is None else self.snapshot.embeddings[rows]
+        norms = self.norms if rows is None else self.norms[rows]
+        return (np.asarray(embeddings, dtype=np.float32) @ query) / norms
+
+    def nbytes(self) -> int:
+        if self.compact is not None:
+            return self.compact.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        return self.snapshot.embeddings.nbytes
+
+
+class LocalVectorIndex:
+    def __init__(
+        self, quantization: str = "none", rescore_factor: int = 5, check_interval: float = 30
+    ):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Cuantización no soportada: {quantization}")
+        self.quantization = quantization
+        # Candidatos compactos por resultado que se reordenan con la similitud exacta
+        self.rescore_factor = rescore_factor
+        self.check_interval = check_interval
+        self._entries: Dict[int, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def load(self, snapshot: ChatSnapshot, chat_id: int = None):
+        """Registra un snapshot como copia local de los documentos de un chat.
+
+        Si no coincide con la base se descarta en la primera búsqueda.
+        """
+        chat_id = chat_id if chat_id is not None else snapshot.chat_id
+        entry = _Entry(snapshot, session_registry.document_version(chat_id), self.quantization)
+        with self._lock:
+            self._entries[chat_id] = entry
+        logger.info(f"Índice local cargado para el chat {chat_id} ({len(snapshot)} chunks)")
+
+    def evict(self, chat_id: int):
+        with self._lock:
+            self._entries.pop(chat_id, None)
+
+    def _entry(self, chat_id: int) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(chat_id)
+        if entry is None:
+            return None
+        # Si el chat recibió documentos nuevos, la copia local ya no sirve
+        if entry.document_version != session_registry.document_version(chat_id) or (
+            not self._check(chat_id, entry)
+        ):
+            self.evict(chat_id)
+            return None
+        return entry
+
+    def _check(self, chat_id: int, entry: _Entry) -> bool:
+        """Compara la copia con la base la primera vez y luego cada intervalo."""
+        with self._lock:
+            if (
+                entry.checked_at is not None
+                and time.monotonic() - entry.checked_at < self.check_interval
+            ):
+                return True
+            # Una sola comprobación por intervalo aunque busquen varios hilos
+            entry.checked_at = time.monotonic()
+        try:
+            state = document_state(chat_id)
+        except Exception as e:
+            logger.warning(f"No se pudo comprobar el índice local del chat {chat_id}: {e}")
+            return True
+        if entry.snapshot.is_current(state):
+            return True
+        logger.info(f"Índice local del chat {chat_id} desactualizado, se descarta")
+        return False
+
+    def has(self, chat_id: int) -> bool:
+        return self._entry(chat_id) is not None
+
+    def is_current(self, chat_id: int, state: Dict) -> bool:
+        """Si la copia local del chat coincide con `document_state` en la base."""
+        entry = self._entry(chat_id)
+        return entry is not None and entry.snapshot.is_current(state)
+
+    def search(
+        self,
+        chat_id: int,
+        query_embedding: Sequence[float],
+        k: int,
+        threshold: float,
+    ) -> List[Dict]:
+        """Búsqueda por similitud coseno con el mismo formato que la RPC.
+
+        Las similitudes devueltas son siempre exactas, también con cuantización.
+        """
+        entry = self._entry(chat_id)
+        if entry is None:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if entry.compact is None:
+            rows = np.arange(len(entry.norms))
+            scores = entry.exact_scores(query)
+        else:
+            coarse = entry.coarse_scores(query)
+            n = min(k * self.rescore_factor, len(coarse))
+            rows = np.sort(np.argpartition(-coarse, n - 1)[:n])
+            scores = entry.exact_scores(query, rows)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {
+                "content": entry.snapshot.content(rows[i]),
+                "metadata": entry.snapshot.metadata(rows[i]),
+                "similarity": float(scores[i]),
+                "embedding": np.asarray(entry.snapshot.embeddings[rows[i]], dtype=np.float32),
+            }
+            for i in top
+            if scores[i] > threshold
+        ]
+
+    def warm_from_directory(self, directory: str) -> int:
+        """Carga todos los snapshots de un directorio (uno por subdirectorio)."""
+        loaded = 0
+        for manifest in Path(directory).glob("*/manifest.json"):
+            try:
+                self.load(ChatSnapshot(str(manifest.parent)))
+                loaded += 1
+            except Exception as e:
+                logger.error(f"No se pudo cargar el snapshot {manifest.parent}: {e}")
+        return loaded
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "chats": len(self._entries),
+                "chunks": sum(len(e.snapshot) for e in self._entries.values()),
+                "quantization": self.quantization,
+                "index_bytes": sum(e.nbytes() for e in self._entries.values()),
+            }
+
+
+# Índice compartido por todo el proceso
+local_index = LocalVectorIndex(
+    quantization=Config.LOCAL_INDEX_QUANTIZATION,
+    rescore_factor=Config.VECTOR_RESCORE_FACTOR,
+    check_interval=Config.LOCAL_INDEX_CHECK_INTERVAL,
+)
@@ -1,14 +1,27 @@
 import os
 import time
+import asyncio
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import Dict, List, Sequence, Set
+import numpy as np
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.document_loaders import PyPDFDirectoryLoader
+from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores.supabase import SupabaseVectorStore
 from langchain.schema import Document
 from supabase.client import Client, create_client
+from config import Config
+from rag import file_store
+from rag.chunk_store import ChunkStore
+from rag.dedupe import NearDuplicateIndex, numbers, signature_to_hex, simhash
+from rag.outline import build_outline, outline_store
+from rag.page_cache import page_cache
+from rag.splitting import split_pages
+from db.chat_store import DEFAULT_CHAT_TITLE, chat_store
+from db.session_cache import session_registry
+from services.openai_scheduler import openai_scheduler, estimate_tokens, PRIORITY_INGEST
 
 import dotenv
 
@@ -21,21 +34,122 @@ SCRIPT_DIR = Path(__file__).parent.absolute()
 dotenv.load_dotenv()
 
 # Configuración de parámetros optimizados
-CHUNK_SIZE = 1000  # Tamaño de chunk para embeddings
-CHUNK_OVERLAP = 50  # Superposición entre chunks
-EMBEDDING_MODEL = "text-embedding-ada-002"  # Modelo con 1536 dimensiones
-EMBEDDING_BATCH_SIZE = 500  # Aumentado para menos llamadas a la API
+CHUNK_SIZE = 256  # Tokens por chunk (tokenizer del modelo de embeddings)
+CHUNK_OVERLAP = 12  # Tokens repetidos entre chunks consecutivos
+CHUNK_OVERLAP_CHARS = CHUNK_OVERLAP * 10  # Cota en caracteres, para fusionar chunks adyacentes
+EMBEDDING_MODEL = Config.EMBEDDING_MODEL
+EMBEDDING_DIMENSIONS = Config.EMBEDDING_DIMENSIONS
+EMBEDDING_BATCH_SIZE = 2048  # Entradas máximas por petición de embeddings
+EMBEDDING_BATCH_TOKENS = 250000  # Tokens por petición (la API admite hasta 300k)
+INSERT_BATCH_SIZE = 500  # Filas por inserción en la tabla documents
+SUMMARY_EXCERPT_CHARS = 12000  # Texto del archivo enviado para el resumen inicial
+MAX_CONCURRENT_EMBEDDING_REQUESTS = 4  # Peticiones de embeddings simultáneas
+INGEST_CONCURRENCY = 4  # Archivos procesados en paralelo en una subida múltiple
+DEDUPE_PAGE_SIZE = 1000  # Firmas de documentos existentes leídas por consulta
+
+
+def embedding_model_kwargs() -> Dict:
+    """Parámetros del modelo de embeddings; solo text-embedding-3 acepta `dimensions`."""
+    kwargs = {"model": EMBEDDING_MODEL}
+    if EMBEDDING_MODEL.startswith("text-embedding-3"):
+        kwargs["dimensions"] = EMBEDDING_DIMENSIONS
+    return kwargs
+
 
 # Configurar Supabase
 supabase: Client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
 
 
-class OptimizedRAG:
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+class EmbeddingScheduler:
+    """Cliente de embeddings compartido que limita las peticiones concurrentes."""
+
+    def __init__(self, max_concurrent_requests: int = MAX_CONCURRENT_EMBEDDING_REQUESTS):
+        # Los chunks ya respetan el presupuesto de tokens del modelo: no hace
+        # falta que el cliente vuelva a tokenizarlos para partirlos
         self.embeddings = OpenAIEmbeddings(
-            model=EMBEDDING_MODEL, chunk_size=EMBEDDING_BATCH_SIZE
+            **embedding_model_kwargs(),
+            chunk_size=EMBEDDING_BATCH_SIZE,
+            check_embedding_ctx_length=False,
         )
+        self._slots = threading.BoundedSemaphore(max_concurrent_requests)
+
+    @staticmethod
+    def _batches(token_counts: Sequence[int]):
+        """Rangos consecutivos que llenan cada petición hasta el límite de entradas o tokens."""
+        start, tokens = 0, 0
+        for i, count in enumerate(token_counts):
+            if i > start and (i - start >= EMBEDDING_BATCH_SIZE or tokens + count > EMBEDDING_BATCH_TOKENS):
+                yield start, i, tokens
+                start, tokens = i, 0
+            tokens += count
+        if start < len(token_counts):
+            yield start, len(token_counts), tokens
+
+    def embed_documents(
+        self, texts: Sequence[str], chat_id: int = None, token_counts: Sequence[int] = None
+    ) -> np.ndarray:
+        """Genera embeddings en lotes respetando el límite de concurrencia.
+
+        Con `token_counts` (los tokens exactos de cada texto) los lotes se
+        llenan hasta el límite de tokens por petición; sin ellos se estiman.
+        Cada lote pide turno al planificador global con prioridad de ingesta.
+
+        Retorna un arreglo float32 contiguo de forma (len(texts), dimensión).
+        """
+        if token_counts is None:
+            token_counts = [estimate_tokens(text) for text in texts]
+        embeddings = None
+        for number, (start, stop, tokens) in enumerate(self._batches(token_counts), 1):
+            batch = texts[start:stop]
+            with self._slots, openai_scheduler.slot(PRIORITY_INGEST, tokens, chat_id):
+                batch_embeddings = self.embeddings.embed_documents(batch)
+            if embeddings is None:
+                embeddings = np.empty(
+                    (len(texts), len(batch_embeddings[0])), dtype=np.float32
+                )
+            embeddings[start:stop] = batch_embeddings
+            logger.info(f"Procesado lote de embeddings {number} ({stop - start} textos, {tokens} tokens)")
+        if embeddings is None:
+            return np.empty((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+        return embeddings
+
+
+# Planificador compartido por todas las ingestas del proceso
+embedding_scheduler = EmbeddingScheduler()
+
+# Los esquemas se generan fuera de la respuesta de la subida
+_outline_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="outline")
+
+
+def _build_outline(pages, file_name: str, content_hash: str, chat_id: int):
+    """Genera y guarda el esquema de un archivo si su contenido aún no lo tiene."""
+    try:
+        store = outline_store()
+        if store.exists(content_hash):
+            return
+        store.save(content_hash, build_outline(pages, file_name))
+        # Las respuestas cacheadas del chat no usaban el esquema
+        session_registry.bump_document_version(chat_id)
+    except Exception as e:
+        logger.error(f"Error generando el esquema de {file_name}: {e}")
+
+
+def schedule_outline(pages, file_name: str, content_hash: str, chat_id: int):
+    """Encola la generación del esquema; sin páginas se intenta con la caché."""
+    if not Config.OUTLINES_ENABLED or not content_hash:
+        return
+    if pages is None:
+        pages = page_cache.load(content_hash)
+        if pages is None:
+            return
+    _outline_executor.submit(_build_outline, pages, file_name, content_hash, chat_id)
+
+
+class OptimizedRAG:
+    def __init__(self, scheduler: EmbeddingScheduler = None):
+        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+        self.embedding_scheduler = scheduler or embedding_scheduler
+        self.embeddings = self.embedding_scheduler.embeddings
         self.vector_store = SupabaseVectorStore(
             client=supabase,
             embedding=self.embeddings,
@@ -43,24 +157,31 @@ class OptimizedRAG:
             query_name="match_documents",
         )
 
-    def load_documents(self, file_path: str) -> List[Document]:
-        """Carga un documento individual con logging mejorado."""
+    def load_documents(self, file_path: str, content_hash: str = None) -> List[Document]:
+        """Carga un documento individual con logging mejorado.
+
+        Con `content_hash`, las páginas se leen de la caché si el mismo contenido
+        ya fue parseado, y se guardan en ella si no.
+        """
+        cached = page_cache.load(content_hash)
+        if cached:
+            logger.info(f"Páginas de {Path(file_path).name} leídas de la caché")
+            return [Document(page_content=text, metadata=dict(metadata)) for text, metadata in cached]
+
         logger.info(f"Cargando documento: {file_path}")
         start_time = time.time()
 
         try:
-            loader = PyPDFDirectoryLoader(str(Path(file_path).parent))
-            all_documents = loader.load()
-
-            documents = [
-                doc
-                for doc in all_documents
-                if Path(doc.metadata["source"]).name == Path(file_path).name
-            ]
+            # Cargar solo este archivo, no todo el directorio temporal
+            documents = PyPDFLoader(str(file_path)).load()
 
             if not documents:
                 raise FileNotFoundError(f"No se pudo cargar el archivo: {file_path}")
 
+            page_cache.save(
+                content_hash, [(doc.page_content, dict(doc.metadata)) for doc in documents]
+            )
+
             duration = time.time() - start_time
             logger.info(f"Documento cargado en {duration:.2f}s")
             return documents
@@ -69,36 +190,21 @@ class OptimizedRAG:
             logger.error(f"Error cargando documento {file_path}: {e}")
             raise
 
-    def split_documents(self, documents: List[Document]) -> List[Document]:
-        """División optimizada de documentos."""
+    def split_documents(self, documents: List[Document]) -> ChunkStore:
+        """División optimizada de documentos.
+
+        Los chunks se guardan como offsets sobre el texto de cada página.
+        """
         logger.info("Iniciando división de documento")
         start_time = time.time()
 
         try:
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=CHUNK_SIZE,
-                chunk_overlap=CHUNK_OVERLAP,
-                length_function=len,
-                separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
+            chunks = split_pages(
+                ((doc.page_content, doc.metadata) for doc in documents),
+                CHUNK_SIZE,
+                CHUNK_OVERLAP,
             )
 
-            chunks = []
-            for doc in documents:
-                splits = splitter.split_text(doc.page_content)
-                chunks.extend(
-                    [
-                        Document(
-                            page_content=split,
-                            metadata={
-                                **doc.metadata,
-                                "chunk_index": i,
-                                "total_chunks": len(splits),
-                            },
-                        )
-                        for i, split in enumerate(splits)
-                    ]
-                )
-
             duration = time.time() - start_time
             logger.info(
                 f"Documento dividido en {len(chunks)} chunks en {duration:.2f}s"
@@ -109,178 +215,209 @@ class OptimizedRAG:
             logger.error(f"Error dividiendo documento: {e}")
             raise
 
-    def store_in_supabase(self, chunks: List[Document], chat_id: int):
-        """Almacena documentos en Supabase Vector Store."""
+    def _existing_signatures(
+        self, chat_id: int, index: NearDuplicateIndex, exclude_ids: Set[int] = frozenset()
+    ):
+        """Agrega al índice las firmas de los documentos que ya tiene el chat."""
+        start = 0
+        while True:
+            page = (
+                supabase.table("documents")
+                .select("id, simhash:metadata->>simhash")
+                .eq("chat_id", chat_id)
+                .order("id")
+                .range(start, start + DEDUPE_PAGE_SIZE - 1)
+                .execute()
+            )
+            for row in page.data:
+                if row.get("simhash") and row["id"] not in exclude_ids:
+                    index.add(int(row["simhash"], 16), ("document", row["id"]))
+            if len(page.data) < DEDUPE_PAGE_SIZE:
+                return
+            start += DEDUPE_PAGE_SIZE
+
+    def deduplicate(
+        self, chunks: ChunkStore, chat_id: int, exclude_ids: Set[int] = frozenset()
+    ) -> ChunkStore:
+        """Descarta los chunks casi duplicados dentro del archivo y del chat.
+
+        Cada chunk conservado guarda su firma en `metadata.simhash` y, si tiene
+        copias, sus ubicaciones en `metadata.duplicates`. Las copias de
+        documentos que el chat ya tenía se registran en esos documentos.
+        Los documentos de `exclude_ids` (los que se van a reemplazar) no cuentan.
+
+        Si se descartan chunks por estar en otros archivos del chat, los
+        conservados se marcan con `metadata.partial`: no están todos los del
+        archivo y no sirven como copia para otros chats.
+        """
+        index = NearDuplicateIndex()
+        self._existing_signatures(chat_id, index, exclude_ids)
+        document_numbers: Dict[int, List[str]] = {}
+
+        def original_numbers(ref) -> List[str]:
+            kind, ref_id = ref
+            if kind == "chunk":
+                return numbers(chunks.text(ref_id))
+            if ref_id not in document_numbers:
+                row = supabase.table("documents").select("content").eq("id", ref_id).execute()
+                document_numbers[ref_id] = numbers(row.data[0]["content"]) if row.data else None
+            return document_numbers[ref_id]
+
+        keep = []
+        duplicates: Dict[tuple, List[Dict]] = {}
+        for i in range(len(chunks)):
+            text = chunks.text(i)
+            signature = simhash(text)
+            chunk_numbers = numbers(text)
+            # Solo es duplicado si además tiene exactamente los mismos números
+            original = index.find(signature, lambda ref: original_numbers(ref) == chunk_numbers)
+            if original is None:
+                index.add(signature, ("chunk", i))
+                chunks.chunk_metadata[i] = {"simhash": signature_to_hex(signature)}
+                keep.append(i)
+                continue
+            metadata = chunks.metadata(i)
+            duplicates.setdefault(original, []).append(
+                {
+                    "source": metadata.get("source"),
+                    "page": metadata.get("page"),
+                    "chunk_index": metadata["chunk_index"],
+                }
+            )
+
+        if any(kind == "document" for kind, _ in duplicates):
+            for i in keep:
+                chunks.chunk_metadata[i]["partial"] = True
+
+        for (kind, ref), locations in duplicates.items():
+            if kind == "chunk":
+                chunks.chunk_metadata[ref]["duplicates"] = locations
+            else:
+                row = supabase.table("documents").select("metadata").eq("id", ref).execute()
+                if row.data:
+                    metadata = row.data[0]["metadata"] or {}
+                    metadata["duplicates"] = metadata.get("duplicates", []) + locations
+                    supabase.table("documents").update({"metadata": metadata}).eq(
+                        "id", ref
+                    ).execute()
+
+        removed = len(chunks) - len(keep)
+        if removed:
+            logger.info(f"Se descartaron {removed} chunks casi duplicados de {len(chunks)}")
+        return chunks.subset(keep)
+
+    def store_in_supabase(
+        self,
+        chunks: ChunkStore,
+        chat_id: int,
+        known_embeddings: Dict[str, Sequence[float]] = None,
+        replaces_ids: Set[int] = frozenset(),
+    ) -> ChunkStore:
+        """Almacena documentos en Supabase Vector Store.
+
+        `known_embeddings` (texto -> embedding) evita volver a generar los
+        embeddings de chunks cuyo texto no cambió, por ejemplo al reindexar.
+        `replaces_ids` son los documentos que los nuevos reemplazarán; la
+        deduplicación no los toma como originales.
+
+        Retorna los chunks efectivamente almacenados (sin casi duplicados).
+        """
         logger.info(f"Almacenando chunks en Supabase para el chat {chat_id}")
         start_time = time.time()
 
         try:
-            # Agregar chat_id a la metadata de cada documento
-            for chunk in chunks:
-                chunk.metadata["chat_id"] = chat_id
+            # La metadata se comparte por página: basta con actualizarla una vez
+            for metadata in chunks.page_metadata:
+                metadata["chat_id"] = chat_id
                 # Asegurarse de que no haya campos que puedan causar conflictos
-                if "id" in chunk.metadata:
-                    del chunk.metadata["id"]
-
-            # Preparar los documentos para inserción
-            documents_to_insert = []
-
-            # Generar embeddings en lotes
-            texts = [chunk.page_content for chunk in chunks]
-            embeddings = []
-
-            for i in range(0, len(texts), EMBEDDING_BATCH_SIZE):
-                batch = texts[i : i + EMBEDDING_BATCH_SIZE]
-                batch_embeddings = self.embeddings.embed_documents(batch)
-                embeddings.extend(batch_embeddings)
+                metadata.pop("id", None)
+
+            chunks = self.deduplicate(chunks, chat_id, replaces_ids)
+            if len(chunks) == 0:
+                # Todo el contenido ya estaba en el chat: ingesta exitosa sin chunks nuevos
+                logger.info(f"Sin chunks nuevos para el chat {chat_id}: todos eran duplicados")
+                return chunks
+
+            # Generar embeddings en lotes, solo para los textos sin embedding conocido
+            known_embeddings = known_embeddings or {}
+            missing = [i for i in range(len(chunks)) if chunks.text(i) not in known_embeddings]
+            if len(missing) == len(chunks):
+                embeddings = self.embedding_scheduler.embed_documents(
+                    chunks,
+                    chat_id=chat_id,
+                    token_counts=[chunks.token_count(i) for i in range(len(chunks))],
+                )
+            else:
+                embeddings = np.empty((len(chunks), EMBEDDING_DIMENSIONS), dtype=np.float32)
+                missing_set = set(missing)
+                for i in range(len(chunks)):
+                    if i not in missing_set:
+                        embeddings[i] = known_embeddings[chunks.text(i)]
+                if missing:
+                    embeddings[missing] = self.embedding_scheduler.embed_documents(
+                        [chunks.text(i) for i in missing],
+                        chat_id=chat_id,
+                        token_counts=[chunks.token_count(i) for i in missing],
+                    )
                 logger.info(
-                    f"Procesado lote de embeddings {i // EMBEDDING_BATCH_SIZE + 1}"
+                    f"Embeddings reutilizados: {len(chunks) - len(missing)}, nuevos: {len(missing)}"
                 )
+            chunks.set_embeddings(embeddings)
 
             # Verificar dimensiones
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                if len(embedding) != 1536:
-                    logger.warning(
-                        f"Embedding {i} tiene dimensión incorrecta: {len(embedding)}"
-                    )
-                    continue
-
-                doc = {
-                    "content": chunk.page_content,
-                    "metadata": chunk.metadata,
-                    "embedding": embedding,
-                    "chat_id": chat_id,  # Agregar chat_id como campo directo
-                }
-                documents_to_insert.append(doc)
-
-            if not documents_to_insert:
+            if chunks.embeddings.shape[1] != EMBEDDING_DIMENSIONS:
                 raise Exception("No se pudieron generar embeddings válidos")
 
-            # Insertar documentos en Supabase
-            response = supabase.table("documents").insert(documents_to_insert).execute()
+            # Insertar documentos en Supabase, serializando cada lote al enviarlo
+            for i in range(0, len(chunks), INSERT_BATCH_SIZE):
+                rows = list(chunks.iter_rows(chat_id, i, i + INSERT_BATCH_SIZE))
+                response = supabase.table("documents").insert(rows).execute()
+
+                if hasattr(response, "error") and response.error is not None:
+                    raise Exception(f"Error insertando documentos: {response.error}")
 
-            if hasattr(response, "error") and response.error is not None:
-                raise Exception(f"Error insertando documentos: {response.error}")
+            session_registry.bump_document_version(chat_id)
 
             duration = time.time() - start_time
             logger.info(f"Chunks almacenados exitosamente en {duration:.2f}s")
             logger.info(
-                f"Se almacenaron {len(documents_to_insert)} documentos para el chat {chat_id}"
+                f"Se almacenaron {len(chunks)} documentos para el chat {chat_id}"
             )
+            return chunks
 
         except Exception as e:
             logger.error(f"Error almacenando chunks: {str(e)}")
             raise
 
-    async def upload_file_to_supabase(self, file_path: str, chat_id: int) -> str:
-        """Sube un archivo a Supabase Storage y retorna su URL."""
-        try:
-            # Verificar si el chat existe
-            logger.info(f"Verificando si existe el chat {chat_id}...")
-            chat_exists = (
-                supabase.table("chat_sessions").select("id").eq("id", chat_id).execute()
-            )
-
-            if not chat_exists.data:
-                logger.info(f"Chat {chat_id} no existe, creando uno nuevo...")
-                chat_response = (
-                    supabase.table("chat_sessions")
-                    .insert(
-                        {
-                            "title": "Nueva conversación",
-                            "description": "Conversación iniciada por subida de archivo",
-                        }
-                    )
-                    .execute()
-                )
-                if not chat_response.data:
-                    raise Exception("No se pudo crear el chat")
-                # Usar el ID generado automáticamente
-                chat_id = chat_response.data[0]["id"]
-                logger.info(f"Chat creado exitosamente con ID: {chat_id}")
-            else:
-                logger.info(f"Usando chat existente con ID: {chat_id}")
+    def ensure_chat(self, chat_id: int) -> int:
+        """Verifica que el chat exista y, si no, crea uno nuevo. Retorna el ID válido."""
+        logger.info(f"Verificando si existe el chat {chat_id}...")
+        if session_registry.exists(chat_id):
+            logger.info(f"Usando chat existente con ID: {chat_id}")
+            return chat_id
+
+        logger.info(f"Chat {chat_id} no existe, creando uno nuevo...")
+        # Usar el ID generado automáticamente
+        chat_id = chat_store.create_chat(
+            DEFAULT_CHAT_TITLE, "Conversación iniciada por subida de archivo"
+        )
+        session_registry.add(chat_id)
+        logger.info(f"Chat creado exitosamente con ID: {chat_id}")
+        return chat_id
 
+    def _upload_file(self, file_path: str, chat_id: int, content_hash: str) -> str:
+        """Guarda el archivo por su hash (una sola vez) y lo registra en el chat."""
+        try:
             file_name = Path(file_path).name
-            bucket_name = "chat-files"
-
-            logger.info(f"Intentando subir archivo {file_name} al bucket {bucket_name}")
-
-            # Verificar que el bucket existe
-            try:
-                logger.info("Verificando si el bucket existe...")
-                bucket = supabase.storage.get_bucket(bucket_name)
-                logger.info(f"Bucket encontrado: {bucket}")
-            except Exception as e:
-                logger.warning(f"Bucket no encontrado, intentando crear: {str(e)}")
-                try:
-                    supabase.storage.create_bucket(
-                        id=bucket_name,
-                        options={
-                            "public": True,
-                            "file_size_limit": 5242880,
-                            "allowed_mime_types": ["application/pdf"],
-                        },
-                    )
-                    logger.info("Bucket creado exitosamente")
-                except Exception as create_error:
-                    logger.error(f"Error creando bucket: {str(create_error)}")
-                    raise
-
-            # Generar un nombre único para el archivo usando timestamp
-            import time
-
-            timestamp = int(time.time())
-            file_name_without_ext = Path(file_name).stem
-            file_extension = Path(file_name).suffix
-            unique_file_name = f"{file_name_without_ext}_{timestamp}{file_extension}"
-
-            # Subir archivo
-            logger.info(
-                f"Iniciando subida del archivo con nombre único: {unique_file_name}"
-            )
-            with open(file_path, "rb") as f:
-                file_path_in_supabase = f"chat_{chat_id}/{unique_file_name}"
-                try:
-                    result = supabase.storage.from_(bucket_name).upload(
-                        path=file_path_in_supabase,
-                        file=f,
-                        file_options={"content-type": "application/pdf"},
-                    )
-                    logger.info(f"Archivo subido exitosamente: {result}")
-                except Exception as upload_error:
-                    logger.error(f"Error en la subida: {str(upload_error)}")
-                    raise
-
-            # Obtener URL del archivo
-            try:
-                file_url = supabase.storage.from_(bucket_name).get_public_url(
-                    file_path_in_supabase
-                )
-                logger.info(f"URL pública obtenida: {file_url}")
-            except Exception as url_error:
-                logger.error(f"Error obteniendo URL pública: {str(url_error)}")
-                raise
+            storage_path, file_url = file_store.store_blob(file_path, content_hash)
+            logger.info(f"URL pública obtenida: {file_url}")
 
             # Registrar archivo en la tabla de archivos
-            try:
-                logger.info("Registrando archivo en la base de datos...")
-                result = (
-                    supabase.table("chat_files")
-                    .insert(
-                        {
-                            "chat_id": chat_id,
-                            "file_name": file_name,  # Guardamos el nombre original
-                            "file_url": file_url,
-                            "file_path": file_path_in_supabase,
-                        }
-                    )
-                    .execute()
-                )
-                logger.info("Archivo registrado exitosamente en la base de datos")
-            except Exception as db_error:
-                logger.error(f"Error registrando en base de datos: {str(db_error)}")
-                raise
+            logger.info("Registrando archivo en la base de datos...")
+            file_store.register_chat_file(
+                chat_id, file_name, file_url, storage_path, content_hash
+            )
+            logger.info("Archivo registrado exitosamente en la base de datos")
 
             return file_url
 
@@ -292,65 +429,152 @@ class OptimizedRAG:
                 )
             raise
 
-    async def process_file(self, file_path: str, chat_id: int):
-        """Procesa un archivo y lo almacena en Supabase."""
-        try:
-            logger.info(f"Iniciando procesamiento de {file_path}")
-            start_time = time.time()
+    async def upload_file_to_supabase(
+        self, file_path: str, chat_id: int, content_hash: str = None
+    ) -> str:
+        """Sube un archivo a Supabase Storage y retorna su URL."""
+        chat_id = self.ensure_chat(chat_id)
+        content_hash = content_hash or file_store.hash_file(file_path)
+        return self._upload_file(file_path, chat_id, content_hash)
 
-            # Subir archivo a Supabase Storage
-            file_url = await self.upload_file_to_supabase(file_path, chat_id)
+    def _ingest_file(self, file_path: str, chat_id: int, content_hash: str = None) -> Dict:
+        """Sube, divide y almacena un archivo de un chat existente.
 
-            # Verificar si el chat existe
-            chat_exists = (
-                supabase.table("chat_sessions").select("id").eq("id", chat_id).execute()
+        Si el mismo contenido ya fue procesado se reutilizan sus chunks y
+        embeddings en lugar de volver a parsear y generar embeddings.
+        """
+        logger.info(f"Iniciando procesamiento de {file_path}")
+        start_time = time.time()
+        file_name = Path(file_path).name
+        content_hash = content_hash or file_store.hash_file(file_path)
+
+        # El archivo ya pertenece a este chat: no hay nada que procesar
+        existing = file_store.find_file_by_hash(content_hash, chat_id=chat_id)
+        if existing:
+            logger.info(f"El archivo {file_name} ya estaba en el chat {chat_id}")
+            rows = file_store.find_ingested_chunks(content_hash, chat_id=chat_id)
+            return self._file_info(
+                file_name,
+                existing["file_url"],
+                chat_id,
+                len(rows),
+                "\n".join(row["content"] for row in rows)[:SUMMARY_EXCERPT_CHARS],
             )
 
-            # Si el chat no existe, obtener el último chat creado
-            if not chat_exists.data:
-                latest_chat = (
-                    supabase.table("chat_sessions")
-                    .select("id")
-                    .order("created_at", desc=True)
-                    .limit(1)
-                    .execute()
-                )
-                if latest_chat.data:
-                    chat_id = latest_chat.data[0]["id"]
-                    logger.info(f"Usando el nuevo chat_id: {chat_id}")
-                else:
-                    raise Exception("No se pudo encontrar o crear un chat válido")
-
-            # Cargar y procesar documento
-            documents = self.load_documents(file_path)
-
-            # Agregar metadata adicional
-            for doc in documents:
-                doc.metadata["file_url"] = file_url
-                doc.metadata["chat_id"] = chat_id
-                if "id" in doc.metadata:
-                    del doc.metadata["id"]
-
-            # Dividir en chunks y almacenar
-            chunks = self.split_documents(documents)
-            self.store_in_supabase(chunks, chat_id)
+        # Subir archivo a Supabase Storage (solo si su contenido es nuevo)
+        file_url = self._upload_file(file_path, chat_id, content_hash)
 
+        # Reutilizar los chunks de otro chat con el mismo archivo
+        rows = file_store.find_ingested_chunks(content_hash)
+        if rows:
+            documents = file_store.copy_chunks_to_chat(rows, chat_id, file_url)
+            session_registry.bump_document_version(chat_id)
+            # Archivos ingresados antes de los esquemas: generarlo desde la caché
+            schedule_outline(None, file_name, content_hash, chat_id)
             duration = time.time() - start_time
-            logger.info(f"Archivo procesado exitosamente en {duration:.2f}s")
-
-            # Preparar resumen del archivo procesado
-            file_info = {
-                "file_name": Path(file_path).name,
-                "file_url": file_url,
-                "num_chunks": len(chunks),
-                "chat_id": chat_id,  # Incluir el chat_id actualizado
-                "chunks": [
-                    {"content": chunk.page_content, "metadata": chunk.metadata}
-                    for chunk in chunks
-                ],
-            }
-
-            return file_info
+            logger.info(f"Archivo duplicado reutilizado en {duration:.2f}s")
+            return self._file_info(
+                file_name,
+                file_url,
+                chat_id,
+                len(documents),
+                "\n".join(doc["content"] for doc in documents)[:SUMMARY_EXCERPT_CHARS],
+            )
+
+        # Cargar y procesar documento
+        documents = self.load_documents(file_path, content_hash)
+
+        # Agregar metadata adicional
+        for doc in documents:
+            doc.metadata["file_url"] = file_url
+            doc.metadata["chat_id"] = chat_id
+            doc.metadata["content_hash"] = content_hash
+            if "id" in doc.metadata:
+                del doc.metadata["id"]
+
+        # Dividir en chunks y almacenar
+        chunks = self.split_documents(documents)
+        chunks = self.store_in_supabase(chunks, chat_id)
+        schedule_outline(
+            [(doc.page_content, doc.metadata) for doc in documents], file_name, content_hash, chat_id
+        )
+
+        duration = time.time() - start_time
+        logger.info(f"Archivo procesado exitosamente en {duration:.2f}s")
+
+        return self._file_info(
+            file_name,
+            file_url,
+            chat_id,
+            len(chunks),
+            chunks.excerpt(SUMMARY_EXCERPT_CHARS),
+        )
+
+    @staticmethod
+    def _file_info(
+        file_name: str, file_url: str, chat_id: int, num_chunks: int, excerpt: str
+    ) -> Dict:
+        """Prepara el resumen del archivo procesado.
+
+        Solo incluye un extracto del contenido para el resumen inicial.
+        """
+        return {
+            "file_name": file_name,
+            "file_url": file_url,
+            "num_chunks": num_chunks,
+            "chat_id": chat_id,  # Incluir el chat_id actualizado
+            "excerpt": excerpt,
+        }
+
+    async def process_file(self, file_path: str, chat_id: int, content_hash: str = None):
+        """Procesa un archivo y lo almacena en Supabase."""
+        try:
+            chat_id = self.ensure_chat(chat_id)
+            return self._ingest_file(file_path, chat_id, content_hash)
 
         except Exception as e:
             logger.error(f"Error procesando archivo {file_path}: {e}")
+            raise
+
+    async def process_files(
+        self,
+        file_paths: List[str],
+        chat_id: int,
+        max_concurrency: int = INGEST_CONCURRENCY,
+        content_hashes: List[str] = None,
+    ) -> Dict:
+        """Procesa varios archivos de un mismo chat con paralelismo acotado.
+
+        Los archivos comparten el planificador de embeddings. Retorna el chat_id
+        válido, la información de los archivos procesados y los errores por archivo.
+        """
+        chat_id = self.ensure_chat(chat_id)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        start_time = time.time()
+
+        async def ingest(file_path: str, content_hash: str):
+            async with semaphore:
+                return await asyncio.to_thread(
+                    self._ingest_file, file_path, chat_id, content_hash
+                )
+
+        content_hashes = content_hashes or [None] * len(file_paths)
+        results = await asyncio.gather(
+            *(ingest(path, h) for path, h in zip(file_paths, content_hashes)),
+            return_exceptions=True,
+        )
+
+        files_info = []
+        errors = []
+        for file_path, result in zip(file_paths, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error procesando archivo {file_path}: {result}")
+                errors.append({"file_name": Path(file_path).name, "error": str(result)})
+            else:
+                files_info.append(result)
+
+        duration = time.time() - start_time
+        logger.info(
+            f"Procesados {len(files_info)}/{len(file_paths)} archivos en {duration:.2f}s"
+        )
+        return {"chat_id": chat_id, "files": files_info, "errors": errors}
@@ -0,0 +1,313 @@
+"""
+Esquema y resúmenes por sección de cada archivo, generados en la ingesta.
+
+Las preguntas de visión general ("¿de qué trata el documento?") o sobre una
+sección completa no se responden bien con fragmentos sueltos recuperados por
+similitud. Al ingresar un archivo se detectan sus encabezados (numerados,
+"Capítulo/Sección N" o, si no hay, líneas en mayúsculas) con sus rangos de
+páginas, se resume cada sección y se arma un resumen general a partir de esos
+resúmenes.
+
+El resultado se guarda en la tabla `document_outlines` por hash de contenido,
+así que un mismo archivo en varios chats se procesa una sola vez.
+"""
+import bisect
+import json
+import logging
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+from services.openai_scheduler import openai_scheduler, estimate_tokens, PRIORITY_INGEST
+
+logger = logging.getLogger(__name__)
+
+OUTLINE_MODEL = "gpt-4o-mini"
+MAX_SECTIONS = 40  # Secciones máximas por archivo; las demás se agrupan
+SECTIONS_PER_CALL = 8  # Secciones resumidas en cada llamada al modelo
+SECTION_PREVIEW_CHARS = 4000  # Texto de cada sección enviado al modelo
+MIN_PREAMBLE_CHARS = 500  # Texto antes del primer encabezado que merece su propia sección
+FALLBACK_PAGES_PER_SECTION = 5  # Páginas por sección si no se detectan encabezados
+RUNNING_HEADER_RATIO = 0.3  # Líneas repetidas en más páginas son encabezados de página
+
+Page = Tuple[str, Dict]
+
+_NUMBERED = re.compile(r"^(\d{1,2}(?:\.\d{1,2}){0,3})\.?\s+([A-ZÁÉÍÓÚÑ¿¡][^\n]{1,80})$")
+_KEYWORD = re.compile(
+    r"^((?:cap[ií]tulo|secci[oó]n|parte|anexo|ap[eé]ndice|chapter|section|part|appendix)\s+"
+    r"(?:\d{1,3}|[IVXLC]{1,6}|[A-Z]))\b\s*[.:\-–—]?\s*([^\n]{0,80})$",
+    re.IGNORECASE,
+)
+_TOC_ENTRY = re.compile(r"(\.{3,}|…|\s\d{1,4})$")
+
+
+def _caps_heading(line: str) -> bool:
+    letters = [c for c in line if c.isalpha()]
+    return 3 <= len(line) <= 60 and len(letters) >= 4 and line.isupper() and len(line.split()) <= 8
+
+
+def detect_headings(pages: List[Page]) -> List[Dict]:
+    """Encabezados con título, número, nivel y posición (página, offset en la página)."""
+    lines_per_page = [
+        {line.strip() for line in text.splitlines() if line.strip()} for text, _ in pages
+    ]
+    counts = Counter(line for lines in lines_per_page for line in lines)
+    running = {
+        line for line, n in counts.items() if n > 1 and n > len(pages) * RUNNING_HEADER_RATIO
+    }
+
+    structured, caps = [], []
+    seen = set()
+    last_chapter = None  # Último número de primer nivel aceptado
+    for page_index, (text, _) in enumerate(pages):
+        offset = 0
+        for raw_line in text.splitlines(keepends=True):
+            line = raw_line.strip()
+            position = offset
+            offset += len(raw_line)
+            if not line or line in running:
+                continue
+
+            numbered = _NUMBERED.match(line)
+            keyword = _KEYWORD.match(line)
+            if numbered:
+                number, title = numbered.groups()
+                if title.endswith((".", ",", ";", ":")) or _TOC_ENTRY.search(title):
+                    continue
+                parts = [int(part) for part in number.split(".")]
+                # Los capítulos van en orden y las subsecciones cuelgan del actual;
+                # así se descartan los pasos numerados dentro del texto
+                if len(parts) == 1:
+                    in_order = parts[0] <= 1 if last_chapter is None else parts[0] == last_chapter + 1
+                else:
+                    in_order = parts[0] == last_chapter
+                key = number
+                if not in_order or key in seen:
+                    continue
+                if len(parts) == 1:
+                    last_chapter = parts[0]
+                heading = {"number": number, "title": line, "level": len(parts)}
+            elif keyword:
+                label, title = keyword.groups()
+                key = label.lower()
+                if _TOC_ENTRY.search(title) or key in seen:
+                    continue
+                heading = {"number": label.split()[-1], "title": line, "level": 1}
+            else:
+                if _caps_heading(line):
+                    heading = {"number": None, "title": line, "level": 1}
+                    caps.append({**heading, "page_index": page_index, "offset": position})
+                continue
+
+            seen.add(key)
+            structured.append({**heading, "page_index": page_index, "offset": position})
+
+    return structured or caps
+
+
+def _limit_sections(headings: List[Dict]) -> List[Dict]:
+    """Reduce los encabezados a MAX_SECTIONS quitando niveles profundos."""
+    for level in (3, 2, 1):
+        if len(headings) <= MAX_SECTIONS:
+            break
+        shallower = [h for h in headings if h["level"] <= level]
+        headings = shallower or headings
+    if len(headings) > MAX_SECTIONS:
+        step = -(-len(headings) // MAX_SECTIONS)
+        headings = headings[::step]
+    return headings
+
+
+def build_sections(pages: List[Page]) -> List[Dict]:
+    """Divide el archivo en secciones con su rango de páginas y su texto."""
+    page_numbers = [metadata.get("page", i) for i, (_, metadata) in enumerate(pages)]
+    starts, position = [], 0
+    for text, _ in pages:
+        starts.append(position)
+        position += len(text) + 1
+    full_text = "\n".join(text for text, _ in pages)
+
+    def page_at(offset: int):
+        return page_numbers[max(0, bisect.bisect_right(starts, offset) - 1)]
+
+    headings = _limit_sections(detect_headings(pages))
+    if not headings:
+        # Sin encabezados: secciones de páginas consecutivas
+        sections = []
+        for i in range(0, len(pages), FALLBACK_PAGES_PER_SECTION):
+            group = pages[i : i + FALLBACK_PAGES_PER_SECTION]
+            first, last = page_numbers[i], page_numbers[i + len(group) - 1]
+            sections.append(
+                {
+                    "number": None,
+                    "title": f"Páginas {first + 1}–{last + 1}",
+                    "level": 1,
+                    "page_start": first,
+                    "page_end": last,
+                    "text": "\n".join(text for text, _ in group),
+                }
+            )
+        return sections
+
+    boundaries = [starts[h["page_index"]] + h["offset"] for h in headings]
+    sections = []
+    if boundaries[0] >= MIN_PREAMBLE_CHARS:
+        boundaries.insert(0, 0)
+        headings = [{"number": None, "title": "Inicio del documento", "level": 1}] + headings
+
+    for i, heading in enumerate(headings):
+        start = boundaries[i]
+        end = boundaries[i + 1] if i + 1 < len(boundaries) else len(full_text)
+        sections.append(
+            {
+                "number": heading["number"],
+                "title": heading["title"],
+                "level": heading["level"],
+                "page_start": page_at(start),
+                "page_end": page_at(max(start, end - 1)),
+                "text": full_text[start:end],
+            }
+        )
+    return sections
+
+
+def _complete_json(client, prompt: str, max_tokens: int) -> Dict:
+    with openai_scheduler.slot(PRIORITY_INGEST, estimate_tokens(prompt) + max_tokens):
+        response = client.chat.completions.create(
+            model=OUTLINE_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"},
+        )
+    return json.loads(response.choices[0].message.content)
+
+
+def summarize_sections(sections: List[Dict], file_name: str, client) -> Dict:
+    """Resume las secciones en lotes y arma el resumen general del archivo."""
+    summaries = {}
+    for batch_start in range(0, len(sections), SECTIONS_PER_CALL):
+        batch = list(enumerate(sections))[batch_start : batch_start + SECTIONS_PER_CALL]
+        content = "\n\n".join(
+            f"### Sección {i}: {section['title']}\n{section['text'][:SECTION_PREVIEW_CHARS]}"
+            for i, section in batch
+        )
+        prompt = f"""
+        Resume cada una de las siguientes secciones del documento "{file_name}" en dos a
+        cuatro frases, con los datos concretos más importantes.
+
+        Responde solo con un JSON de la forma:
+        {{"sections": [{{"id": <número de la sección>, "summary": "..."}}]}}
+
+        {content}
+        """
+        try:
+            result = _complete_json(client, prompt, 150 * len(batch))
+        except Exception as e:
+            logger.error(f"Error resumiendo secciones de {file_name}: {e}")
+            continue
+        for item in result.get("sections", []):
+            if isinstance(item.get("id"), int) and item.get("summary"):
+                summaries[item["id"]] = item["summary"].strip()
+
+    outline = "\n".join(
+        f"- {section['title']} (págs. {section['page_start'] + 1}–{section['page_end'] + 1}): "
+        f"{summaries.get(i, '')}"
+        for i, section in enumerate(sections)
+    )
+    prompt = f"""
+    A partir del esquema y los resúmenes de sus secciones, escribe un resumen general del
+    documento "{file_name}" en un párrafo de hasta 150 palabras: de qué trata, para quién es
+    y cuáles son sus temas principales.
+
+    Responde solo con un JSON de la forma: {{"overview": "..."}}
+
+    {outline}
+    """
+    overview = _complete_json(client, prompt, 300).get("overview", "").strip()
+
+    return {
+        "file_name": file_name,
+        "overview": overview,
+        "sections": [
+            {
+                "number": section["number"],
+                "title": section["title"],
+                "level": section["level"],
+                "page_start": section["page_start"],
+                "page_end": section["page_end"],
+                "summary": summaries.get(i, ""),
+            }
+            for i, section in enumerate(sections)
+        ],
+    }
+
+
+def build_outline(pages: List[Page], file_name: str, client=None) -> Dict:
+    """Esquema del archivo (encabezados y rangos de páginas) con sus resúmenes."""
+    if client is None:
+        from openai import OpenAI
+
+        client = OpenAI(api_key=Config.OPENAI_API_KEY)
+    sections = build_sections(pages)
+    logger.info(f"Esquema de {file_name}: {len(sections)} secciones")
+    return summarize_sections(sections, file_name, client)
+
+
+class OutlineStore:
+    """Esquemas guardados en la tabla `document_outlines` por hash de contenido."""
+
+    def __init__(self, client=None):
+        if client is None:
+            from db.supabase_utils import supabase as client
+        self.client = client
+
+    def exists(self, content_hash: str) -> bool:
+        result = (
+            self.client.table("document_outlines")
+            .select("content_hash")
+            .eq("content_hash", content_hash)
+            .execute()
+        )
+        return bool(result.data)
+
+    def save(self, content_hash: str, outline: Dict):
+        self.client.table("document_outlines").upsert(
+            {
+                "content_hash": content_hash,
+                "file_name": outline["file_name"],
+                "overview": outline["overview"],
+                "sections": outline["sections"],
+            }
+        ).execute()
+
+    def load(self, content_hashes: Iterable[str]) -> List[Dict]:
+        content_hashes = list(content_hashes)
+        if not content_hashes:
+            return []
+        result = (
+            self.client.table("document_outlines")
+            .select("content_hash, file_name, overview, sections")
+            .in_("content_hash", content_hashes)
+            .execute()
+        )
+        return result.data
+
+    def delete(self, content_hashes: Iterable[str]):
+        content_hashes = list(content_hashes)
+        if content_hashes:
+            self.client.table("document_outlines").delete().in_(
+                "content_hash", content_hashes
+            ).execute()
+
+
+_outline_store: Optional[OutlineStore] = None
+
+
+def outline_store() -> OutlineStore:
+    """Almacén compartido, creado en el primer uso."""
+    global _outline_store
+    if _outline_store is None:
+        _outline_store = OutlineStore()
+    return _outline_store
@@ -0,0 +1,88 @@
+"""
+Caché en disco del texto extraído de los PDFs, por hash de contenido.
+
+La extracción de texto es la etapa más costosa de la ingesta. Guardar las
+páginas (texto y metadata) permite volver a dividir un archivo con otra
+configuración de chunking sin parsearlo de nuevo.
+
+Cada archivo se guarda en `<directorio>/<hash[:2]>/<hash>.pages`: un JSON
+columnar {"pages": [...], "metadata": [...]} comprimido con zlib.
+"""
+import json
+import logging
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT = "karen-page-cache"
+CACHE_VERSION = 1
+COMPRESSION_LEVEL = 6
+
+Page = Tuple[str, Dict]
+
+
+class PageCache:
+    def __init__(self, directory: str):
+        self.directory = Path(directory) if directory else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def _path(self, content_hash: str) -> Path:
+        return self.directory / content_hash[:2] / f"{content_hash}.pages"
+
+    def load(self, content_hash: str) -> Optional[List[Page]]:
+        """Páginas (texto, metadata) de un archivo, o None si no están en caché."""
+        if not self.enabled or not content_hash:
+            return None
+        path = self._path(content_hash)
+        try:
+            data = json.loads(zlib.decompress(path.read_bytes()))
+        except FileNotFoundError:
+            return None
+        except (zlib.error, ValueError) as e:
+            logger.warning(f"Caché de páginas inválida para {content_hash[:12]}: {e}")
+            return None
+        if data.get("format") != CACHE_FORMAT:
+            return None
+        return list(zip(data["pages"], data["metadata"]))
+
+    def save(self, content_hash: str, pages: List[Page]):
+        """Guarda las páginas de forma atómica (escritura a temporal y renombrado)."""
+        if not self.enabled or not content_hash:
+            return
+        path = self._path(content_hash)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = json.dumps(
+            {
+                "format": CACHE_FORMAT,
+                "version": CACHE_VERSION,
+                "pages": [text for text, _ in pages],
+                "metadata": [metadata for _, metadata in pages],
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(payload, COMPRESSION_LEVEL))
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def remove(self, content_hash: str):
+        if self.enabled:
+            self._path(content_hash).unlink(missing_ok=True)
+
+
+# Caché compartida por todo el proceso
+page_cache = PageCache(Config.PAGE_CACHE_DIR)
@@ -0,0 +1,129 @@
+"""
+Descomposición de preguntas compuestas en sub-consultas de búsqueda.
+
+Primero se prueban heurísticas baratas (listas, varias preguntas, conectores
+seguidos de una nueva pregunta). Solo si el mensaje es largo, parece pedir
+varias cosas y las heurísticas no lo separan, se consulta a un modelo pequeño.
+"""
+import json
+import logging
+import re
+from typing import List
+
+from openai import OpenAI
+
+from config import Config
+from services.openai_scheduler import openai_scheduler, estimate_tokens, PRIORITY_INTERACTIVE
+from services.resilience import Deadline
+
+logger = logging.getLogger(__name__)
+
+MAX_SUBQUERIES = 4  # Sub-consultas máximas por mensaje
+MIN_SUBQUERY_WORDS = 2  # Fragmentos más cortos no se buscan por separado
+LLM_MIN_WORDS = 25  # Longitud mínima para considerar el modelo
+DECOMPOSITION_MODEL = "gpt-4o-mini"
+
+QUESTION_WORDS = (
+    r"qu[eé]|cu[aá]l(?:es)?|c[oó]mo|d[oó]nde|cu[aá]ndo|qui[eé]n(?:es)?|por qu[eé]|cu[aá]nt[oa]s?|"
+    r"dime|dame|explica|describe|lista|enumera|resume|menciona|what|which|how|where|when|who|why|list"
+)
+
+_LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.+)$")
+_CONNECTOR = re.compile(
+    rf"(?:;|,?\s+y\s+(?:adem[aá]s\s+|tambi[eé]n\s+)?|,?\s+and\s+(?:also\s+)?)(?=(?:{QUESTION_WORDS})\b)",
+    re.IGNORECASE,
+)
+_QUESTION_WORD = re.compile(rf"\b(?:{QUESTION_WORDS})\b", re.IGNORECASE)
+
+
+def _clean(parts: List[str]) -> List[str]:
+    """Quita fragmentos vacíos o triviales y duplicados, conservando el orden."""
+    seen = set()
+    cleaned = []
+    for part in parts:
+        part = part.strip(" \t\n-*•:;,.")
+        key = part.lower()
+        if len(part.split()) >= MIN_SUBQUERY_WORDS and key not in seen:
+            seen.add(key)
+            cleaned.append(part)
+    return cleaned
+
+
+def split_heuristic(message: str) -> List[str]:
+    """Separa un mensaje en sub-consultas usando solo reglas.
+
+    Retorna una lista con el mensaje original si no encuentra varias partes.
+    """
+    # Listas con viñetas o numeradas
+    items = [m.group(1) for m in map(_LIST_ITEM.match, message.splitlines()) if m]
+    parts = _clean(items)
+    if len(parts) >= 2:
+        return parts[:MAX_SUBQUERIES]
+
+    # Varias preguntas en el mismo mensaje
+    questions = [q for q in re.split(r"(?<=\?)\s+", message.strip()) if q]
+    parts = _clean(questions)
+    if len(parts) >= 2:
+        return parts[:MAX_SUBQUERIES]
+
+    # Conectores seguidos de una nueva pregunta u orden ("... y cuáles son ...")
+    parts = _clean(_CONNECTOR.split(message))
+    if len(parts) >= 2:
+        return parts[:MAX_SUBQUERIES]
+
+    return [message]
+
+
+def needs_llm(message: str) -> bool:
+    """El mensaje es largo y tiene varias palabras interrogativas o imperativas."""
+    return (
+        len(message.split()) >= LLM_MIN_WORDS
+        and len(_QUESTION_WORD.findall(message)) >= 2
+    )
+
+
+def _decompose_with_llm(message: str, deadline: Deadline = None) -> List[str]:
+    prompt = f"""
+    Separa el siguiente mensaje en las consultas de búsqueda independientes que contiene
+    (máximo {MAX_SUBQUERIES}). Si solo pide una cosa, devuelve una sola consulta.
+    Responde únicamente con una lista JSON de strings.
+
+    Mensaje:
+    {message}
+    """
+    client = OpenAI(api_key=Config.OPENAI_API_KEY)
+    with openai_scheduler.slot(
+        PRIORITY_INTERACTIVE,
+        estimate_tokens(prompt) + 100,
+        timeout=deadline.remaining() if deadline else None,
+    ):
+        response = client.chat.completions.create(
+            model=DECOMPOSITION_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=200,
+        )
+    content = response.choices[0].message.content.strip()
+    content = content.removeprefix("```json").removeprefix("```").removesuffix("```")
+    queries = json.loads(content)
+    if not isinstance(queries, list):
+        return [message]
+    return _clean([str(q) for q in queries])[:MAX_SUBQUERIES] or [message]
+
+
+def decompose_query(message: str, use_llm: bool = True, deadline: Deadline = None) -> List[str]:
+    """Sub-consultas de búsqueda para un mensaje (al menos una).
+
+    `deadline` acota la espera de turno para la llamada al modelo.
+    """
+    parts = split_heuristic(message)
+    if len(parts) > 1 or not use_llm or not needs_llm(message):
+        return parts
+
+    try:
+        parts = _decompose_with_llm(message, deadline)
+        logger.info(f"Mensaje descompuesto con {DECOMPOSITION_MODEL} en {len(parts)} consultas")
+        return parts
+    except Exception as e:
+        logger.warning(f"No se pudo descomponer el mensaje con el modelo: {e}")
+        return [message]
@@ -0,0 +1,138 @@
+"""
+Enrutamiento de preguntas de resumen hacia los esquemas precalculados.
+
+Las preguntas de visión general ("¿de qué trata el documento?", "resume el
+manual") y las que piden resumir una sección concreta ("resume la sección 3",
+"de qué trata el capítulo de instalación") se responden con el resumen
+general y los resúmenes por sección generados en la ingesta, en lugar de
+recuperar fragmentos por similitud. El resto de las preguntas sigue el camino
+normal de recuperación.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+ROUTE_OVERVIEW = "overview"
+ROUTE_SECTION = "section"
+
+MAX_ROUTED_SECTIONS = 3  # Secciones incluidas en una respuesta sobre secciones
+MIN_TITLE_COVERAGE = 0.6  # Fracción de las palabras del título que debe mencionar la pregunta
+
+_DOCUMENT = r"(?:documento|archivo|manual|pdf|libro|texto|informe|document|file|book|report)s?"
+_OVERVIEW = re.compile(
+    rf"\b(?:de que (?:trata|se trata|habla)n? (?:el|la|los|las|este|esta|estos|estas) {_DOCUMENT}"
+    rf"|resum\w* (?:del? )?(?:(?:el|la|los|las|este|esta|estos|estas) )?{_DOCUMENT}"
+    rf"|(?:temas|puntos|ideas) (?:principales|clave)"
+    rf"|(?:indice|tabla de contenidos?|estructura|esquema) del? {_DOCUMENT}"
+    rf"|what (?:is|are|'s) (?:this|the|these) {_DOCUMENT} about"
+    rf"|summari[sz]e (?:this|the|these) {_DOCUMENT}"
+    rf"|(?:overview|outline|table of contents) of (?:this|the) {_DOCUMENT}"
+    rf"|main (?:topics|points|ideas))\b"
+)
+_SUMMARY_INTENT = re.compile(
+    r"\b(?:resum\w*|sintetiz\w*|de que (?:trata|habla|va)|que (?:cubre|contiene|explica)"
+    r"|summar\w*|what does .+ (?:cover|say|contain)|about|overview)\b"
+)
+_SECTION_REFERENCE = re.compile(
+    r"\b(?:seccion|capitulo|apartado|parte|anexo|apendice|section|chapter|part|appendix)\b"
+    r"(?:\s+(?P<number>\d{1,3}(?:\.\d{1,2})*|[ivxlc]{1,6}\b|[a-z]\b))?"
+)
+_STOPWORDS = {
+    "de", "del", "la", "el", "los", "las", "y", "en", "a", "un", "una", "para", "por", "con",
+    "sobre", "que", "the", "of", "and", "to", "in", "on", "for", "an",
+}
+
+
+def _normalize(text: str) -> str:
+    """Minúsculas y sin tildes, para comparar sin depender de la ortografía."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _words(text: str) -> set:
+    return {w for w in re.findall(r"\w+", _normalize(text)) if w not in _STOPWORDS and not w.isdigit()}
+
+
+def _match_sections(message: str, number: Optional[str], outlines: List[Dict]) -> List[Dict]:
+    """Secciones mencionadas por número o por título, con el archivo al que pertenecen."""
+    by_number, by_title = [], []
+    message_words = _words(message)
+    for outline in outlines:
+        for section in outline.get("sections", []):
+            match = {**section, "file_name": outline["file_name"]}
+            if number and section.get("number") and _normalize(section["number"]) == number:
+                by_number.append(match)
+                continue
+            title_words = _words(re.sub(r"^[\d.]+\s*", "", section["title"]))
+            if title_words:
+                coverage = len(title_words & message_words) / len(title_words)
+                if coverage >= MIN_TITLE_COVERAGE:
+                    by_title.append((coverage, match))
+
+    if by_number:
+        return by_number[:MAX_ROUTED_SECTIONS]
+    by_title.sort(key=lambda item: -item[0])
+    return [match for _, match in by_title[:MAX_ROUTED_SECTIONS]]
+
+
+def route_query(message: str) -> Optional[str]:
+    """Clasifica el mensaje: visión general, sección o None (recuperación normal).
+
+    Solo usa expresiones regulares, así que se puede evaluar en cada mensaje
+    antes de consultar los esquemas.
+    """
+    text = _normalize(message)
+    if _SECTION_REFERENCE.search(text) and _SUMMARY_INTENT.search(text):
+        return ROUTE_SECTION
+    if _OVERVIEW.search(text):
+        return ROUTE_OVERVIEW
+    return None
+
+
+def outline_documents(message: str, route: str, outlines: List[Dict]) -> List[Dict]:
+    """Contexto para el mensaje armado con los esquemas, con la forma de los chunks.
+
+    Retorna una lista vacía si la pregunta menciona una sección que no se
+    encuentra (y no pide además una visión general), para que se responda con
+    la recuperación normal.
+    """
+    text = _normalize(message)
+    if route == ROUTE_SECTION:
+        reference = _SECTION_REFERENCE.search(text)
+        sections = [
+            section
+            for section in _match_sections(message, reference.group("number"), outlines)
+            if section.get("summary")
+        ]
+        if not sections and not _OVERVIEW.search(text):
+            return []
+    if route == ROUTE_SECTION and sections:
+        return [
+            {
+                "content": f"{section['title']}\n{section['summary']}",
+                "metadata": {
+                    "source": section["file_name"],
+                    "page": section["page_start"],
+                    "page_end": section["page_end"],
+                    "section": section["title"],
+                },
+                "similarity": 1.0,
+            }
+            for section in sections
+        ]
+
+    documents = []
+    for outline in outlines:
+        contents = "\n".join(
+            f"{'  ' * (section['level'] - 1)}- {section['title']} "
+            f"(págs. {section['page_start'] + 1}–{section['page_end'] + 1})"
+            for section in outline.get("sections", [])
+        )
+        documents.append(
+            {
+                "content": f"Resumen general: {outline['overview']}\n\nContenido:\n{contents}",
+                "metadata": {"source": outline["file_name"], "outline": True},
+                "similarity": 1.0,
+            }
+        )
+    return documents
@@ -0,0 +1,136 @@
+"""
+Reindexación de chats con la configuración de chunking actual.
+
+Vuelve a dividir los archivos de un chat desde la caché de páginas (o
+descargando y parseando el archivo si no está en caché) y reemplaza sus
+documentos. Solo se generan embeddings para los chunks cuyo texto cambió.
+
+Uso:
+    python -m rag.reindex <chat_id> [<chat_id> ...]
+    python -m rag.reindex --all
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from postgrest.types import ReturnMethod
+
+from db.chat_store import chat_store
+from db.supabase_utils import supabase
+from rag import file_store
+from rag.optimized_rag import OptimizedRAG
+from rag.page_cache import page_cache
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 500  # Filas leídas por consulta
+
+
+def _existing_documents(chat_id: int, content_hash: str) -> Tuple[List[int], Dict[str, np.ndarray]]:
+    """Ids de los documentos actuales de un archivo y sus embeddings por texto."""
+    ids = []
+    embeddings = {}
+    start = 0
+    while True:
+        page = (
+            supabase.table("documents")
+            .select("id, content, embedding")
+            .eq("chat_id", chat_id)
+            .eq("metadata->>content_hash", content_hash)
+            .order("id")
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+        )
+        for row in page.data:
+            ids.append(row["id"])
+            value = row["embedding"]
+            embeddings[row["content"]] = np.asarray(
+                json.loads(value) if isinstance(value, str) else value, dtype=np.float32
+            )
+        if len(page.data) < PAGE_SIZE:
+            return ids, embeddings
+        start += PAGE_SIZE
+
+
+def _load_pages(rag: OptimizedRAG, chat_file: Dict):
+    """Páginas del archivo desde la caché o, si no están, desde el bucket."""
+    if page_cache.load(chat_file["content_hash"]) is not None:
+        return rag.load_documents(chat_file["file_name"], chat_file["content_hash"])
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_path = Path(temp_dir) / chat_file["file_name"]
+        file_store.download_blob(chat_file["file_path"], local_path)
+        return rag.load_documents(str(local_path), chat_file["content_hash"])
+
+
+def reindex_chat(chat_id: int, rag: OptimizedRAG = None) -> Dict:
+    """Vuelve a dividir y almacenar todos los archivos de un chat."""
+    rag = rag or OptimizedRAG()
+    start_time = time.time()
+    report = {"chat_id": chat_id, "files": 0, "chunks": 0, "reused_embeddings": 0}
+
+    for chat_file in chat_store.list_chat_files(chat_id):
+        content_hash = chat_file.get("content_hash")
+        if not content_hash:
+            logger.warning(f"{chat_file['file_name']} no tiene hash de contenido, se omite")
+            continue
+
+        documents = _load_pages(rag, chat_file)
+        for doc in documents:
+            doc.metadata["file_url"] = chat_file["file_url"]
+            doc.metadata["chat_id"] = chat_id
+            doc.metadata["content_hash"] = content_hash
+            doc.metadata.pop("id", None)
+        chunks = rag.split_documents(documents)
+
+        old_ids, known = _existing_documents(chat_id, content_hash)
+        # Insertar primero y eliminar después: si algo falla antes del
+        # reemplazo, el archivo conserva sus documentos anteriores
+        stored = rag.store_in_supabase(
+            chunks, chat_id, known_embeddings=known, replaces_ids=set(old_ids)
+        )
+        for i in range(0, len(old_ids), PAGE_SIZE):
+            supabase.table("documents").delete(returning=ReturnMethod.minimal).in_(
+                "id", old_ids[i : i + PAGE_SIZE]
+            ).execute()
+
+        report["files"] += 1
+        report["chunks"] += len(stored)
+        report["reused_embeddings"] += sum(stored.text(i) in known for i in range(len(stored)))
+
+    duration = time.time() - start_time
+    logger.info(f"Chat {chat_id} reindexado en {duration:.2f}s: {report}")
+    return report
+
+
+def reindex_all() -> List[Dict]:
+    rag = OptimizedRAG()
+    reports = []
+    for chat_id in list(chat_store.chat_ids()):
+        try:
+            reports.append(reindex_chat(chat_id, rag))
+        except Exception as e:
+            logger.error(f"Error reindexando el chat {chat_id}: {e}")
+            reports.append({"chat_id": chat_id, "error": str(e)})
+    return reports
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Reindexa chats desde la caché de páginas")
+    parser.add_argument("chat_ids", type=int, nargs="*")
+    parser.add_argument("--all", action="store_true", help="Reindexar todos los chats")
+    args = parser.parse_args()
+
+    if args.all:
+        print(reindex_all())
+    elif args.chat_ids:
+        rag = OptimizedRAG()
+        print([reindex_chat(chat_id, rag) for chat_id in args.chat_ids])
+    else:
+        parser.error("Indica uno o más chat_id o --all")
@@ -0,0 +1,295 @@
+"""
+Clasificador local que decide si un mensaje necesita recuperación.
+
+Saludos, agradecimientos, confirmaciones y pedidos de formato sobre la
+respuesta anterior ("hazlo más corto", "en una tabla") no necesitan buscar en
+los documentos. Saltar la recuperación en esos mensajes evita la consulta de
+documentos del chat, el embedding de la pregunta y la búsqueda vectorial.
+
+La decisión se toma en dos etapas, sin llamadas a la API:
+
+1. Reglas: patrones de charla y de referencias explícitas a los documentos.
+2. Modelo: Naive Bayes multinomial sobre palabras y trigramas de caracteres
+   (con hashing), entrenado al iniciar con los ejemplos de este módulo.
+
+Por defecto solo las reglas saltan la recuperación; el modelo registra sus
+decisiones y solo salta si RETRIEVAL_GATE_MODEL_SKIPS está activo y la
+confianza de "no recuperar" supera el umbral. Ante la duda se recupera. Los
+pedidos sobre la respuesta anterior se responden con el último intercambio
+del chat en el prompt. Con RETRIEVAL_GATE_MODE=shadow las
+decisiones se registran pero siempre se recupera, para evaluarlas con tráfico
+real antes de activarlas.
+
+Evaluación offline sobre ejemplos etiquetados (JSON Lines con "message" y
+"retrieve": true/false):
+
+    python -m rag.retrieval_gate ejemplos.jsonl --thresholds 0.6,0.7,0.8,0.9
+"""
+import argparse
+import hashlib
+import json
+import logging
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+GATE_OFF = "off"
+GATE_SHADOW = "shadow"
+GATE_ON = "on"
+
+FEATURE_BUCKETS = 1 << 14
+RULE_CONFIDENCE = 0.97
+MAX_CHITCHAT_WORDS = 12  # Mensajes más largos no se consideran charla por reglas
+
+_CHITCHAT = re.compile(
+    r"^(?:(?:hola|buenas|buenos dias|buenas tardes|buenas noches|hey|hi|hello|"
+    r"gracias|muchas gracias|mil gracias|thanks|thank you|thx|"
+    r"ok|okay|vale|listo|perfecto|genial|excelente|entendido|de acuerdo|"
+    r"great|cool|nice|got it|perfect|"
+    r"adios|chao|hasta luego|nos vemos|bye)[\s!.,:)]*)+$"
+)
+_FOLLOW_UP = re.compile(
+    r"^(?:por favor\s+)?(?:hazlo|hazla|ponlo|ponla|escribelo|escribela|reescribelo|reformulalo|"
+    r"resumelo|resumela|traducelo|traducela|explicalo de nuevo|repitelo|acortalo|"
+    r"make it|rewrite it|rephrase it|translate it|shorten it|say it again)\b"
+    r"|^(?:mas|menos) (?:corto|largo|breve|detallado|formal|simple)\b"
+    r"|^(?:en|como) (?:una tabla|tabla|vinetas|lista|puntos|ingles|espanol|json|markdown)\b"
+    r"|^(?:shorter|longer|simpler|in bullet points|as a table|in english|in spanish)\b"
+)
+_DOCUMENT_REFERENCE = re.compile(
+    r"\b(?:documentos?|archivos?|pdfs?|manual|paginas?|seccion|capitulo|segun|"
+    r"document|file|page|section|chapter|according to)\b"
+)
+
+# Ejemplos de entrenamiento: (mensaje, necesita recuperación)
+SEED_EXAMPLES: List[Tuple[str, bool]] = [
+    ("gracias", False), ("muchas gracias por la ayuda", False), ("ok perfecto", False),
+    ("vale, entendido", False), ("hola, ¿cómo estás?", False), ("buenos días", False),
+    ("genial, eso era todo", False), ("perfecto, muchas gracias", False), ("adiós", False),
+    ("hazlo más corto", False), ("ponlo en una tabla", False), ("resúmelo en tres viñetas", False),
+    ("tradúcelo al inglés", False), ("explícalo de nuevo con palabras más simples", False),
+    ("puedes reformular la respuesta anterior", False), ("más breve por favor", False),
+    ("escríbelo en formato markdown", False), ("dame la respuesta anterior en una lista", False),
+    ("no entendí, ¿puedes repetirlo?", False), ("¿quién eres?", False), ("¿cómo te llamas?", False),
+    ("qué puedes hacer", False), ("jaja buenísimo", False), ("excelente trabajo", False),
+    ("thanks a lot", False), ("ok got it", False), ("make it shorter", False),
+    ("rewrite that as bullet points", False), ("translate your last answer to spanish", False),
+    ("can you format that as a table", False), ("hi there", False), ("that's great, thank you", False),
+    ("¿qué dice el documento sobre la garantía?", True), ("¿cuál es el voltaje de entrada?", True),
+    ("¿cómo se instala el controlador?", True), ("explica los requisitos del sistema", True),
+    ("¿qué pasos hay que seguir para configurar la red?", True), ("¿cuánto cuesta el plan básico?", True),
+    ("¿cuál es la fecha de vencimiento del contrato?", True), ("dame los datos de contacto del proveedor", True),
+    ("¿qué significa el error E04?", True), ("¿cuáles son las obligaciones del arrendatario?", True),
+    ("¿en qué página se habla de la batería?", True), ("lista los componentes del kit", True),
+    ("¿qué tecnologías usa el proyecto?", True), ("¿cuáles fueron los resultados del estudio?", True),
+    ("¿quién firmó el acuerdo?", True), ("¿cómo se calcula la comisión?", True),
+    ("describe la arquitectura del backend", True), ("¿qué recomienda el informe?", True),
+    ("¿hay alguna advertencia de seguridad?", True), ("¿cuál es la política de devoluciones?", True),
+    ("what does the manual say about cleaning?", True), ("how do I reset the device?", True),
+    ("what are the payment terms?", True), ("list the main risks mentioned", True),
+    ("which model supports wifi?", True), ("what is the maximum load?", True),
+    ("¿y la garantía cuánto dura?", True), ("¿y para windows?", True),
+    ("resume todo", True), ("dime más", True), ("dame un ejemplo", True), ("explícame eso", True),
+    ("cuéntame más sobre eso", True), ("¿y qué significa eso?", True), ("sí, ¿y después?", True),
+    ("tell me more", True), ("give me an example", True),
+    # "Sí" y "no" suelen responder a una pregunta del asistente sobre los documentos
+    ("sí", True), ("no", True), ("sí, por favor", True), ("yes", True),
+]
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", re.sub(r"[¿¡]", "", text)).strip()
+
+
+def _features(text: str) -> Counter:
+    """Palabras y trigramas de caracteres, proyectados con hashing."""
+    words = re.findall(r"\w+", text)
+    tokens = [f"w:{w}" for w in words]
+    tokens += [f"c:{w[i:i + 3]}" for w in (f" {w} " for w in words) for i in range(len(w) - 2)]
+    if text.endswith("?"):
+        tokens.append("q:?")
+    tokens.append(f"n:{min(len(words), 15)}")
+    return Counter(
+        int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=4).digest(), "little")
+        % FEATURE_BUCKETS
+        for t in tokens
+    )
+
+
+class NaiveBayes:
+    """Naive Bayes multinomial binario con suavizado de Laplace."""
+
+    def __init__(self, alpha: float = 0.5):
+        self.alpha = alpha
+        self.log_prior = np.zeros(2)
+        self.log_likelihood = np.zeros((2, FEATURE_BUCKETS))
+
+    def fit(self, examples: Iterable[Tuple[str, bool]]) -> "NaiveBayes":
+        counts = np.zeros((2, FEATURE_BUCKETS))
+        labels = np.zeros(2)
+        for message, retrieve in examples:
+            label = int(retrieve)
+            labels[label] += 1
+            for bucket, n in _features(_normalize(message)).items():
+                counts[label, bucket] += n
+        self.log_prior = np.log(labels / labels.sum())
+        smoothed = counts + self.alpha
+        self.log_likelihood = np.log(smoothed / smoothed.sum(axis=1, keepdims=True))
+        return self
+
+    def predict_proba(self, text: str) -> float:
+        """Probabilidad de que el mensaje necesite recuperación."""
+        features = _features(text)
+        buckets = np.fromiter(features.keys(), dtype=np.int64)
+        counts = np.fromiter(features.values(), dtype=np.float64)
+        scores = self.log_prior + self.log_likelihood[:, buckets] @ counts
+        scores -= scores.max()
+        probabilities = np.exp(scores)
+        return float(probabilities[1] / probabilities.sum())
+
+
+class RetrievalGate:
+    def __init__(
+        self,
+        threshold: float,
+        examples: Sequence[Tuple[str, bool]] = None,
+        model_skips: bool = False,
+    ):
+        self.threshold = threshold
+        # Sin esto el modelo solo registra los saltos que haría
+        self.model_skips = model_skips
+        self._examples = examples or SEED_EXAMPLES
+        self._model: Optional[NaiveBayes] = None
+        self._lock = threading.Lock()
+        self._decisions = Counter()
+
+    def _get_model(self) -> NaiveBayes:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = NaiveBayes().fit(self._examples)
+        return self._model
+
+    def warm(self):
+        """Entrena el modelo antes de atender peticiones."""
+        self._get_model()
+
+    def classify(self, message: str) -> Dict:
+        """Decide si el mensaje necesita recuperación.
+
+        Retorna {"retrieve", "confidence", "reason"}; la confianza es la de la
+        decisión tomada.
+        """
+        text = _normalize(message)
+        if not text:
+            return {"retrieve": False, "confidence": RULE_CONFIDENCE, "reason": "empty"}
+        if _DOCUMENT_REFERENCE.search(text):
+            return {"retrieve": True, "confidence": RULE_CONFIDENCE, "reason": "document_reference"}
+        if len(text.split()) <= MAX_CHITCHAT_WORDS:
+            if _CHITCHAT.match(text):
+                return {"retrieve": False, "confidence": RULE_CONFIDENCE, "reason": "chitchat"}
+            if _FOLLOW_UP.match(text):
+                return {"retrieve": False, "confidence": RULE_CONFIDENCE, "reason": "follow_up"}
+
+        p_retrieve = self._get_model().predict_proba(text)
+        if 1 - p_retrieve >= self.threshold:
+            if not self.model_skips:
+                return {
+                    "retrieve": True,
+                    "confidence": round(p_retrieve, 4),
+                    "reason": "model_skip_disabled",
+                }
+            return {"retrieve": False, "confidence": round(1 - p_retrieve, 4), "reason": "model"}
+        return {"retrieve": True, "confidence": round(p_retrieve, 4), "reason": "model"}
+
+    def should_retrieve(self, message: str, mode: str = None) -> bool:
+        """Decisión final según el modo; registra cada decisión."""
+        mode = mode or Config.RETRIEVAL_GATE_MODE
+        if mode == GATE_OFF:
+            return True
+        decision = self.classify(message)
+        with self._lock:
+            self._decisions[(decision["retrieve"], decision["reason"])] += 1
+        logger.info(
+            f"Recuperación {'necesaria' if decision['retrieve'] else 'innecesaria'} "
+            f"({decision['reason']}, confianza {decision['confidence']:.2f}, modo {mode}): "
+            f"{message[:80]!r}"
+        )
+        return decision["retrieve"] or mode == GATE_SHADOW
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            decisions = dict(self._decisions)
+        return {
+            "threshold": self.threshold,
+            "retrieve": sum(n for (retrieve, _), n in decisions.items() if retrieve),
+            "skip": sum(n for (retrieve, _), n in decisions.items() if not retrieve),
+            "by_reason": {
+                f"{'retrieve' if retrieve else 'skip'}:{reason}": n
+                for (retrieve, reason), n in sorted(decisions.items())
+            },
+        }
+
+
+def evaluate(gate: RetrievalGate, examples: Sequence[Tuple[str, bool]]) -> Dict:
+    """Exactitud y errores del clasificador sobre ejemplos etiquetados.
+
+    Los saltos incorrectos (mensajes que necesitaban recuperación) son el error
+    costoso: la respuesta se genera sin contexto.
+    """
+    matrix = Counter()
+    wrong_skips = []
+    for message, expected in examples:
+        predicted = gate.classify(message)["retrieve"]
+        matrix[(expected, predicted)] += 1
+        if expected and not predicted:
+            wrong_skips.append(message)
+
+    total = sum(matrix.values())
+    skipped = matrix[(False, False)] + matrix[(True, False)]
+    return {
+        "threshold": gate.threshold,
+        "examples": total,
+        "accuracy": round((matrix[(True, True)] + matrix[(False, False)]) / total, 4) if total else 0.0,
+        "skip_rate": round(skipped / total, 4) if total else 0.0,
+        "skip_precision": round(matrix[(False, False)] / skipped, 4) if skipped else 1.0,
+        "wrong_skips": wrong_skips,
+    }
+
+
+def load_examples(path: str) -> List[Tuple[str, bool]]:
+    examples = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            item = json.loads(line)
+            examples.append((item["message"], bool(item["retrieve"])))
+    return examples
+
+
+# Clasificador compartido por todo el proceso
+retrieval_gate = RetrievalGate(
+    Config.RETRIEVAL_GATE_THRESHOLD, model_skips=Config.RETRIEVAL_GATE_MODEL_SKIPS
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evalúa el clasificador de recuperación")
+    parser.add_argument("examples", help="JSON Lines con 'message' y 'retrieve'")
+    parser.add_argument("--thresholds", default=str(Config.RETRIEVAL_GATE_THRESHOLD))
+    args = parser.parse_args()
+
+    examples = load_examples(args.examples)
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        gate = RetrievalGate(threshold, model_skips=True)
+        print(json.dumps(evaluate(gate, examples), ensure_ascii=False))
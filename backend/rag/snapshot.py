@@ -0,0 +1,221 @@
+"""
+Exportación e importación binaria de la base de conocimiento de un chat.
+
+Un snapshot es un directorio con:
+    manifest.json        Información del chat, dimensión y tipo de los vectores,
+                         cantidad de chunks e id del último (para detectar cambios)
+    embeddings.npy       Matriz (n, dim) float16 o float32, se puede mapear en memoria
+    content.bin          Texto de los chunks en UTF-8, concatenado
+    content_offsets.npy  Offsets (n + 1) de cada chunk dentro de content.bin
+    metadata.json        Metadata en formato columnar {columna: [valores]}
+
+Uso:
+    python -m rag.snapshot export <chat_id> <directorio> [--dtype float32]
+    python -m rag.snapshot import <directorio> <chat_id>
+"""
+import argparse
+import json
+import logging
+import mmap
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from db.chat_store import chat_store
+from db.supabase_utils import supabase
+from db.session_cache import session_registry
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "karen-chat-snapshot"
+SNAPSHOT_VERSION = 1
+PAGE_SIZE = 500  # Filas por consulta al exportar e importar
+
+
+def _parse_embedding(value) -> List[float]:
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def document_state(chat_id: int) -> Dict:
+    """Cantidad de chunks del chat en la base y el id del último.
+
+    Es la referencia para saber si un snapshot sigue al día, sin depender del
+    estado de cada proceso: otro worker puede haber agregado o borrado documentos.
+    """
+    result = (
+        supabase.table("documents")
+        .select("id", count="exact")
+        .eq("chat_id", chat_id)
+        .order("id", desc=True)
+        .limit(1)
+        .execute()
+    )
+    return {
+        "count": result.count or 0,
+        "max_id": result.data[0]["id"] if result.data else None,
+    }
+
+
+def export_chat(chat_id: int, directory: str, dtype: str = "float16") -> Dict:
+    """Exporta los chunks, embeddings y metadata de un chat a un snapshot."""
+    start_time = time.time()
+    target = Path(directory)
+    target.mkdir(parents=True, exist_ok=True)
+
+    contents: List[bytes] = []
+    metadata_rows: List[Dict] = []
+    embeddings: List[np.ndarray] = []
+    max_id = None
+
+    start = 0
+    while True:
+        page = (
+            supabase.table("documents")
+            .select("id, content, metadata, embedding")
+            .eq("chat_id", chat_id)
+            .order("id")
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+        )
+        for row in page.data:
+            max_id = row["id"]
+            contents.append(row["content"].encode("utf-8"))
+            metadata_rows.append(row["metadata"] or {})
+            embeddings.append(np.asarray(_parse_embedding(row["embedding"]), dtype=dtype))
+        if len(page.data) < PAGE_SIZE:
+            break
+        start += PAGE_SIZE
+
+    if not contents:
+        raise ValueError(f"El chat {chat_id} no tiene documentos para exportar")
+
+    matrix = np.vstack(embeddings)
+    np.save(target / "embeddings.npy", matrix)
+
+    offsets = np.zeros(len(contents) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in contents], out=offsets[1:])
+    np.save(target / "content_offsets.npy", offsets)
+    (target / "content.bin").write_bytes(b"".join(contents))
+
+    columns = sorted({key for row in metadata_rows for key in row})
+    columnar = {key: [row.get(key) for row in metadata_rows] for key in columns}
+    (target / "metadata.json").write_text(json.dumps(columnar, ensure_ascii=False))
+
+    files = [
+        {key: row[key] for key in ("file_name", "file_url", "file_path", "content_hash")}
+        for row in chat_store.list_chat_files(chat_id)
+    ]
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "chat_id": chat_id,
+        "count": len(contents),
+        "max_id": max_id,
+        "dimensions": int(matrix.shape[1]),
+        "dtype": dtype,
+        "files": files,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    (target / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+    duration = time.time() - start_time
+    logger.info(f"Chat {chat_id} exportado ({len(contents)} chunks) en {duration:.2f}s")
+    return manifest
+
+
+class ChatSnapshot:
+    """Snapshot abierto con los embeddings y el texto mapeados en memoria."""
+
+    def __init__(self, directory: str, mmap_mode: str = "r"):
+        self.directory = Path(directory)
+        self.manifest = json.loads((self.directory / "manifest.json").read_text())
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{directory} no es un snapshot de chat válido")
+
+        self.embeddings = np.load(self.directory / "embeddings.npy", mmap_mode=mmap_mode)
+        self.offsets = np.load(self.directory / "content_offsets.npy", mmap_mode=mmap_mode)
+        self._metadata = json.loads((self.directory / "metadata.json").read_text())
+
+        with open(self.directory / "content.bin", "rb") as f:
+            size = self.directory.joinpath("content.bin").stat().st_size
+            self._content = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            )
+
+    @property
+    def chat_id(self) -> int:
+        return self.manifest["chat_id"]
+
+    def __len__(self) -> int:
+        return self.manifest["count"]
+
+    def is_current(self, state: Dict) -> bool:
+        """Si el snapshot tiene los mismos documentos que `document_state` en la base.
+
+        Los snapshots sin `max_id` (anteriores a este campo) nunca están al día.
+        """
+        max_id = self.manifest.get("max_id")
+        return max_id is not None and state == {"count": len(self), "max_id": max_id}
+
+    def content(self, i: int) -> str:
+        return self._content[self.offsets[i] : self.offsets[i + 1]].decode("utf-8")
+
+    def metadata(self, i: int) -> Dict:
+        return {
+            key: values[i] for key, values in self._metadata.items() if values[i] is not None
+        }
+
+
+def import_snapshot(directory: str, chat_id: int) -> int:
+    """Carga un snapshot en la tabla documents para el chat indicado.
+
+    No llama a la API de embeddings: los vectores se insertan tal cual.
+    """
+    start_time = time.time()
+    snapshot = ChatSnapshot(directory)
+
+    for start in range(0, len(snapshot), PAGE_SIZE):
+        stop = min(start + PAGE_SIZE, len(snapshot))
+        rows = [
+            {
+                "content": snapshot.content(i),
+                "metadata": {**snapshot.metadata(i), "chat_id": chat_id},
+                "embedding": snapshot.embeddings[i].astype(np.float32).tolist(),
+                "chat_id": chat_id,
+            }
+            for i in range(start, stop)
+        ]
+        supabase.table("documents").insert(rows).execute()
+
+    files = [
+        {**file_row, "chat_id": chat_id} for file_row in snapshot.manifest.get("files", [])
+    ]
+    chat_store.add_chat_files(files)
+    session_registry.bump_document_version(chat_id)
+
+    duration = time.time() - start_time
+    logger.info(f"Snapshot importado en el chat {chat_id} ({len(snapshot)} chunks) en {duration:.2f}s")
+    return len(snapshot)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Snapshots binarios de chats")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("chat_id", type=int)
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("chat_id", type=int)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        print(export_chat(args.chat_id, args.directory, args.dtype))
+    else:
+        print(import_snapshot(args.directory, args.chat_id))
@@ -0,0 +1,179 @@
+"""
+División de páginas en chunks, compartida por la ingesta y las herramientas
+offline (reindexación y benchmark).
+
+Los chunks se miden en tokens del tokenizer del modelo de embeddings, así que
+ninguno supera el presupuesto y la API no los trunca. Cada página se procesa
+en una sola pasada lineal:
+
+1. Se tokeniza la página una vez y se obtiene el offset de cada token.
+2. Una única expresión regular marca los posibles cortes con su fuerza
+   (párrafo > línea > oración > cláusula > palabra).
+3. Cada chunk avanza hasta el presupuesto y corta en el límite más fuerte
+   (y más tardío) de la segunda mitad de la ventana; el siguiente empieza
+   `overlap` tokens antes, alineado a un límite.
+
+Las páginas son independientes y se dividen en paralelo (tiktoken libera el
+GIL al tokenizar).
+"""
+import bisect
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+from config import Config
+from rag.chunk_store import ChunkStore
+
+SPLIT_WORKERS = 4  # Hilos para dividir páginas en paralelo
+MIN_CHUNK_FRACTION = 0.5  # No cortar antes de esta fracción del presupuesto
+
+LEVEL_WORD, LEVEL_CLAUSE, LEVEL_SENTENCE, LEVEL_LINE, LEVEL_PARAGRAPH = range(5)
+
+# El corte queda al final de cada coincidencia; el orden define la fuerza
+_BOUNDARY = re.compile(
+    r"(?P<paragraph>\n[ \t]*\n\s*)"
+    r"|(?P<line>\n)"
+    r"|(?P<sentence>[.!?…]+[\"'»”)\]]*(?=\s))"
+    r"|(?P<clause>[,;:](?=\s))"
+    r"|(?P<word>(?<=\S)(?=\s))"
+)
+_LEVELS = {
+    "paragraph": LEVEL_PARAGRAPH,
+    "line": LEVEL_LINE,
+    "sentence": LEVEL_SENTENCE,
+    "clause": LEVEL_CLAUSE,
+    "word": LEVEL_WORD,
+}
+
+_encoding = None
+
+
+def embedding_encoding():
+    """Tokenizer del modelo de embeddings configurado."""
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+
+        try:
+            _encoding = tiktoken.encoding_for_model(Config.EMBEDDING_MODEL)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+class TokenSplitter:
+    def __init__(self, max_tokens: int, overlap_tokens: int, encoding=None):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("La superposición debe ser menor que el tamaño del chunk")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = max(1, int(max_tokens * MIN_CHUNK_FRACTION))
+        self.encoding = encoding or embedding_encoding()
+
+    def _count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def _boundaries(self, text: str, offsets: List[int]) -> Tuple[List[int], List[int]]:
+        """Tokens donde se puede cortar y la fuerza de cada corte, en orden."""
+        tokens, levels = [], []
+        token = 0
+        for match in _BOUNDARY.finditer(text):
+            position = match.end()
+            # Primer token que empieza en el corte o después
+            while token < len(offsets) and offsets[token] < position:
+                token += 1
+            if token == 0 or token >= len(offsets):
+                continue
+            level = _LEVELS[match.lastgroup]
+            if tokens and tokens[-1] == token:
+                levels[-1] = max(levels[-1], level)
+            else:
+                tokens.append(token)
+                levels.append(level)
+        return tokens, levels
+
+    def _trimmed(self, text: str, start: int, end: int) -> Tuple[int, int]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return start, end
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int, int]]:
+        """Chunks de la página como (inicio, fin, tokens) en caracteres."""
+        token_ids = self.encoding.encode(text, disallowed_special=())
+        if not token_ids:
+            return []
+        _, offsets = self.encoding.decode_with_offsets(token_ids)
+        total = len(offsets)
+        offsets = list(offsets) + [len(text)]
+        cuts, levels = self._boundaries(text, offsets[:total])
+
+        chunks = []
+        start = 0
+        while start < total:
+            limit = start + self.max_tokens
+            if limit >= total:
+                end = total
+            else:
+                # Límite más fuerte y más tardío en (start + min_tokens, limit]
+                lo = bisect.bisect_right(cuts, start + self.min_tokens)
+                hi = bisect.bisect_right(cuts, limit)
+                end = limit
+                if lo < hi:
+                    best = max(range(lo, hi), key=lambda i: (levels[i], i))
+                    end = cuts[best]
+
+            char_start, char_end = self._trimmed(text, offsets[start], offsets[end])
+            tokens = self._count(text[char_start:char_end])
+            # Retokenizar un fragmento puede sumar algún token en los bordes
+            while tokens > self.max_tokens:
+                end -= 1
+                char_start, char_end = self._trimmed(text, offsets[start], offsets[end])
+                tokens = self._count(text[char_start:char_end])
+            if char_start < char_end:
+                chunks.append((char_start, char_end, tokens))
+
+            if end >= total:
+                break
+            # El siguiente chunk repite los últimos tokens, empezando en un límite
+            next_start = end - self.overlap_tokens
+            i = bisect.bisect_left(cuts, next_start)
+            next_start = cuts[i] if i < len(cuts) and cuts[i] < end else end
+            start = max(next_start, start + 1)
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end, _ in self.split_offsets(text)]
+
+
+@lru_cache(maxsize=8)
+def create_splitter(chunk_size: int, chunk_overlap: int) -> TokenSplitter:
+    """Splitter compartido por configuración (tamaño y superposición en tokens)."""
+    return TokenSplitter(chunk_size, chunk_overlap)
+
+
+_split_executor = ThreadPoolExecutor(max_workers=SPLIT_WORKERS, thread_name_prefix="split")
+
+
+def split_pages(
+    pages: Iterable[Tuple[str, Dict]], chunk_size: int, chunk_overlap: int
+) -> ChunkStore:
+    """Divide páginas (texto, metadata) y guarda los chunks como offsets.
+
+    `chunk_size` y `chunk_overlap` se miden en tokens.
+    """
+    splitter = create_splitter(chunk_size, chunk_overlap)
+    chunks = ChunkStore()
+    pages = list(pages)
+    texts = [text for text, _ in pages]
+    if len(texts) > 1:
+        page_offsets = _split_executor.map(splitter.split_offsets, texts)
+    else:
+        page_offsets = map(splitter.split_offsets, texts)
+    for (text, metadata), offsets in zip(pages, page_offsets):
+        page = chunks.add_page(text, metadata)
+        for start, end, tokens in offsets:
+            chunks.add_chunk(page, start, end, tokens)
+    return chunks
@@ -0,0 +1,60 @@
+import tiktoken
+
+from rag import benchmark, context_builder, splitting
+from rag.benchmark import HashingEmbedder, is_match, run_benchmark
+
+# Tokenizer byte a byte: no necesita descargar los archivos BPE
+BYTE_ENCODING = tiktoken.Encoding(
+    "bytes",
+    pat_str=r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+PAGES = [
+    (
+        "El backend de Karen está escrito en Flask. "
+        "Los documentos se guardan en Supabase con pgvector. "
+        "El frontend usa Next.js y Tailwind.",
+        {"source": "arquitectura.txt", "page": 0},
+    ),
+    (
+        "Para instalar el proyecto se ejecuta pip install -r requirements.txt "
+        "y luego bun install en el frontend.",
+        {"source": "instalacion.txt", "page": 0},
+    ),
+]
+QUESTIONS = [
+    {"question": "¿Dónde se guardan los documentos?", "passages": ["Supabase con pgvector"]},
+    {"question": "¿Cómo se instala el proyecto?", "passages": ["pip install -r requirements.txt"]},
+]
+
+
+def test_embedder_determinista():
+    embedder = HashingEmbedder(dimensions=64)
+    first = embedder.embed_query("documentos en Supabase")
+    assert (first == embedder.embed_query("documentos en Supabase")).all()
+    assert abs(float((first**2).sum()) - 1.0) < 1e-5
+
+
+def test_is_match_por_cobertura_de_palabras():
+    assert is_match("Supabase con pgvector", "Los documentos se guardan en Supabase con pgvector.")
+    assert not is_match("Supabase con pgvector", "El frontend usa Next.js")
+
+
+def test_run_benchmark_reporta_metricas_por_configuracion(monkeypatch):
+    fake_count = lambda text: len(text.split())
+    monkeypatch.setattr(benchmark, "count_tokens", fake_count)
+    monkeypatch.setattr(context_builder, "count_tokens", fake_count)
+    monkeypatch.setattr(splitting, "_encoding", BYTE_ENCODING)
+    splitting.create_splitter.cache_clear()
+
+    rows = run_benchmark(PAGES, QUESTIONS, [60, 200], [10], [1, 3], [0.0])
+
+    assert len(rows) == 4
+    for row in rows:
+        assert 0.0 <= row["recall_at_k"] <= 1.0
+        assert 0.0 <= row["mrr"] <= 1.0
+        assert row["index_bytes"] > 0
+    best = max(rows, key=lambda row: row["recall_at_k"])
+    assert best["recall_at_k"] == 1.0
@@ -0,0 +1,62 @@
+import numpy as np
+
+from rag import context_builder
+from rag.context_builder import build_context, merge_adjacent_chunks, mmr_select
+
+
+def _doc(content, chunk_index, similarity, page=1, source="manual.pdf"):
+    return {
+        "content": content,
+        "metadata": {"source": source, "page": page, "chunk_index": chunk_index},
+        "similarity": similarity,
+    }
+
+
+def test_mmr_prefiere_candidatos_diversos():
+    query = [0.8, 0.6, 0.0]
+    embeddings = np.array(
+        [
+            [1.0, 0.0, 0.0],
+            [0.99, 0.14, 0.0],  # casi idéntico al primero
+            [0.0, 1.0, 0.0],
+        ]
+    )
+    assert mmr_select(query, embeddings, 2) == [1, 2]
+
+
+def test_merge_adjacent_chunks_elimina_superposicion():
+    docs = [
+        _doc("El sistema usa Flask. La base de datos", 0, 0.8),
+        _doc("La base de datos es Supabase.", 1, 0.9),
+        _doc("Otra página.", 0, 0.75, page=2),
+    ]
+    merged = merge_adjacent_chunks(docs, max_overlap=50)
+
+    assert len(merged) == 2
+    assert merged[0]["content"] == "El sistema usa Flask. La base de datos es Supabase."
+    assert merged[0]["metadata"]["chunk_span"] == [0, 1]
+    assert merged[0]["similarity"] == 0.9
+
+
+def test_build_context_respeta_presupuesto(monkeypatch):
+    monkeypatch.setattr(context_builder, "count_tokens", lambda text: len(text.split()))
+    candidates = [
+        {**_doc("uno dos tres", 0, 0.9, page=1), "embedding": [1.0, 0.0]},
+        {**_doc("cuatro cinco seis", 0, 0.8, page=2), "embedding": [0.0, 1.0]},
+    ]
+    docs = build_context([1.0, 0.2], candidates, top_k=2, max_tokens=4)
+
+    assert [d["content"] for d in docs] == ["uno dos tres"]
+    assert "embedding" not in docs[0]
+
+
+def test_mmr_con_varias_consultas_cubre_cada_tema():
+    queries = [[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]]
+    embeddings = np.array(
+        [
+            [1.0, 0.0, 0.0],
+            [0.98, 0.2, 0.0],  # mismo tema que el primero
+            [0.0, 0.1, 0.9],
+        ]
+    )
+    assert sorted(mmr_select(queries, embeddings, 2)) == [0, 2]
@@ -0,0 +1,51 @@
+from rag.chunk_store import ChunkStore
+from rag.dedupe import NearDuplicateIndex, hamming_distance, numbers, simhash
+
+FOOTER = "Documento confidencial. Prohibida su reproducción total o parcial sin autorización. Página 3 de 10"
+
+
+def test_simhash_tolera_cambios_menores():
+    other_case = FOOTER.replace("Documento", "DOCUMENTO")
+    different = "El backend usa Flask y Supabase para almacenar los embeddings de cada chat"
+
+    assert simhash(FOOTER) == simhash(other_case)
+    assert hamming_distance(simhash(FOOTER), simhash(different)) > 3
+
+
+def test_chunks_que_solo_difieren_en_numeros_no_son_duplicados():
+    prices_2023 = "Tabla de precios del plan básico: mensual 10 USD, anual 100 USD, año 2023"
+    prices_2024 = "Tabla de precios del plan básico: mensual 12 USD, anual 120 USD, año 2024"
+    index = NearDuplicateIndex(max_distance=64)  # Cualquier firma está "cerca"
+    index.add(simhash(prices_2023), "2023")
+
+    same_numbers = lambda ref: numbers(prices_2023) == numbers(prices_2024)
+    assert index.find(simhash(prices_2024), same_numbers) is None
+    assert index.find(simhash(prices_2023), lambda ref: True) == "2023"
+
+
+def test_indice_encuentra_casi_duplicados():
+    index = NearDuplicateIndex()
+    signature = simhash(FOOTER)
+    index.add(signature, "original")
+
+    assert index.find(signature ^ 0b101) == "original"
+    assert index.find(signature ^ 0xFFFF) is None
+
+
+def test_subset_conserva_indices_y_metadata():
+    chunks = ChunkStore()
+    page = chunks.add_page("uno dos tres", {"page": 1})
+    chunks.add_chunk(page, 0, 3)
+    chunks.add_chunk(page, 4, 7)
+    chunks.add_chunk(page, 8, 12)
+    chunks.chunk_metadata[2] = {"simhash": "00ff"}
+
+    kept = chunks.subset([0, 2])
+
+    assert kept[:] == ["uno", "tres"]
+    assert kept.metadata(1) == {
+        "page": 1,
+        "chunk_index": 2,
+        "total_chunks": 3,
+        "simhash": "00ff",
+    }
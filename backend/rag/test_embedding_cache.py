@@ -0,0 +1,33 @@
+from rag.embedding_cache import QueryEmbeddingCache
+
+
+def test_solo_pide_los_textos_que_faltan():
+    cache = QueryEmbeddingCache(max_entries=10)
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    assert cache.embed(["hola", "adiós"], embed) == [[4.0, 1.0], [5.0, 1.0]]
+    assert cache.embed(["adiós", "nuevo", "nuevo"], embed) == [[5.0, 1.0], [5.0, 1.0], [5.0, 1.0]]
+    assert calls == [["hola", "adiós"], ["nuevo"]]
+    assert cache.metrics()["hits"] == 1
+
+
+def test_lru_acotado():
+    cache = QueryEmbeddingCache(max_entries=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") == [1.0]  # "a" pasa a ser el más reciente
+    cache.put("c", [3.0])
+
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.metrics()["entries"] == 2
+
+
+def test_tamano_cero_desactiva_la_cache():
+    cache = QueryEmbeddingCache(max_entries=0)
+    cache.put("a", [1.0])
+    assert cache.get("a") is None
@@ -0,0 +1,99 @@
+import io
+
+import pytest
+
+import rag.file_store as file_store
+
+
+def _value(row, column):
+    """Valor de una columna o de una clave de metadata (`metadata->>clave`)."""
+    if column.startswith("metadata->>"):
+        value = row["metadata"].get(column[len("metadata->>") :])
+    else:
+        value = row[column]
+    return None if value is None else str(value)
+
+
+class _Query:
+    def __init__(self, rows):
+        self.rows = rows
+        self.bounds = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.rows = [row for row in self.rows if _value(row, column) == str(value)]
+        return self
+
+    def is_(self, column, value):
+        assert value == "null"
+        self.rows = [row for row in self.rows if _value(row, column) is None]
+        return self
+
+    def order(self, column):
+        self.rows = sorted(self.rows, key=lambda row: row[column])
+        return self
+
+    def limit(self, n):
+        self.bounds = (0, n - 1)
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def execute(self):
+        rows = self.rows[self.bounds[0] : self.bounds[1] + 1] if self.bounds else self.rows
+        return type("Result", (), {"data": rows})
+
+
+@pytest.fixture
+def documents(monkeypatch):
+    rows = []
+    fake = type("Supabase", (), {"table": lambda self, name: _Query(list(rows))})()
+    monkeypatch.setattr(file_store, "supabase", fake)
+    return rows
+
+
+def _document(id, chat_id, content, **metadata):
+    return {
+        "id": id,
+        "chat_id": chat_id,
+        "content": content,
+        "embedding": [0.0],
+        "metadata": {"content_hash": "abc", **metadata},
+    }
+
+
+def test_no_copia_de_un_chat_donde_el_archivo_quedo_incompleto(documents):
+    # En el chat 1 parte del archivo ya estaba en otro archivo y se descartó
+    documents.append(_document(1, 1, "solo lo nuevo", partial=True))
+    documents.extend(_document(i, 2, f"chunk {i}") for i in (2, 3))
+
+    rows = file_store.find_ingested_chunks("abc")
+
+    assert [row["content"] for row in rows] == ["chunk 2", "chunk 3"]
+
+
+def test_sin_copias_completas_se_procesa_de_nuevo(documents):
+    documents.append(_document(1, 1, "solo lo nuevo", partial=True))
+
+    assert file_store.find_ingested_chunks("abc") == []
+    assert len(file_store.find_ingested_chunks("abc", chat_id=1)) == 1
+
+
+def test_archivos_del_lote_con_el_mismo_nombre_no_se_sobrescriben(tmp_path):
+    paths = [file_store.batch_file_path(tmp_path, i, "informe.pdf") for i in range(2)]
+    for path, content in zip(paths, (b"primero", b"segundo")):
+        file_store.save_stream(io.BytesIO(content), path)
+
+    assert [path.name for path in paths] == ["informe.pdf", "informe.pdf"]
+    assert [path.read_bytes() for path in paths] == [b"primero", b"segundo"]
+
+
+def test_nombre_vacio_no_apunta_al_directorio(tmp_path):
+    path = file_store.batch_file_path(tmp_path, 0, "")
+
+    assert path.parent == tmp_path / "0"
+    assert path.name == "upload.pdf"
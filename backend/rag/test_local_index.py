@@ -0,0 +1,191 @@
+import json
+
+import numpy as np
+import pytest
+
+import rag.local_index
+import rag.snapshot
+from rag.local_index import LocalVectorIndex
+from rag.snapshot import SNAPSHOT_FORMAT, ChatSnapshot, export_chat
+
+
+class _Query:
+    """Consulta mínima de PostgREST sobre filas en memoria."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.descending = False
+        self.bounds = None
+        self.count = None
+
+    def select(self, columns, count=None):
+        self.count = count
+        return self
+
+    def eq(self, column, value):
+        self.rows = [row for row in self.rows if row[column] == value]
+        return self
+
+    def order(self, column, desc=False):
+        self.descending = desc
+        return self
+
+    def limit(self, n):
+        self.bounds = (0, n - 1)
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def execute(self):
+        rows = sorted(self.rows, key=lambda row: row["id"], reverse=self.descending)
+        total = len(rows)
+        if self.bounds:
+            rows = rows[self.bounds[0] : self.bounds[1] + 1]
+        return type("Result", (), {"data": rows, "count": total if self.count else None})
+
+
+class _Supabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return _Query(list(self.rows))
+
+
+def _document(id, chat_id=7):
+    return {
+        "id": id,
+        "chat_id": chat_id,
+        "content": f"chunk {id}",
+        "metadata": {"page": id},
+        "embedding": [float(id), 1.0, 0.0],
+    }
+
+
+@pytest.fixture
+def documents_db(monkeypatch):
+    """Base en memoria compartida por la exportación y el índice local."""
+    fake = _Supabase([])
+    monkeypatch.setattr(rag.snapshot, "supabase", fake)
+    monkeypatch.setattr(
+        rag.snapshot, "chat_store", type("Store", (), {"list_chat_files": lambda self, c: []})()
+    )
+    monkeypatch.setattr(rag.local_index, "document_state", rag.snapshot.document_state)
+    return fake
+
+
+# Estado de la base para los snapshots escritos a mano: coincide con el último
+_written_state = {"count": 0, "max_id": 99}
+
+
+@pytest.fixture(autouse=True)
+def written_state(monkeypatch):
+    monkeypatch.setattr(rag.local_index, "document_state", lambda chat_id: dict(_written_state))
+
+
+def _write_snapshot(directory, embeddings):
+    contents = [f"chunk {i}".encode("utf-8") for i in range(len(embeddings))]
+    offsets = np.zeros(len(contents) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in contents], out=offsets[1:])
+
+    np.save(directory / "embeddings.npy", embeddings.astype(np.float16))
+    np.save(directory / "content_offsets.npy", offsets)
+    (directory / "content.bin").write_bytes(b"".join(contents))
+    (directory / "metadata.json").write_text(json.dumps({"page": list(range(len(contents)))}))
+    manifest = {"format": SNAPSHOT_FORMAT, "chat_id": 7, "count": len(contents), "max_id": 99}
+    (directory / "manifest.json").write_text(json.dumps(manifest))
+    _written_state["count"] = len(contents)
+    return ChatSnapshot(str(directory))
+
+
+def test_busqueda_cuantizada_devuelve_los_mismos_resultados(tmp_path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(300, 64)).astype(np.float32)
+    query = embeddings[42] + rng.normal(scale=0.1, size=64)
+    snapshot = _write_snapshot(tmp_path, embeddings)
+
+    results = {}
+    for mode in ("none", "float16", "int8"):
+        index = LocalVectorIndex(quantization=mode)
+        index.load(snapshot)
+        results[mode] = index.search(7, query, k=5, threshold=-1.0)
+
+    exact = [(r["content"], round(r["similarity"], 5)) for r in results["none"]]
+    assert exact[0][0] == "chunk 42"
+    for mode in ("float16", "int8"):
+        assert [(r["content"], round(r["similarity"], 5)) for r in results[mode]] == exact
+
+
+def test_int8_reduce_la_memoria_del_indice(tmp_path):
+    embeddings = np.random.default_rng(1).normal(size=(100, 64)).astype(np.float32)
+    snapshot = _write_snapshot(tmp_path, embeddings)
+    index = LocalVectorIndex(quantization="int8")
+    index.load(snapshot)
+
+    assert index.metrics()["index_bytes"] < snapshot.embeddings.nbytes * 0.6
+
+
+def test_snapshot_exportado_esta_al_dia_hasta_que_cambia_la_base(tmp_path, documents_db):
+    documents_db.rows = [_document(i) for i in (3, 5, 8)] + [_document(9, chat_id=2)]
+    manifest = export_chat(7, str(tmp_path), dtype="float32")
+    assert (manifest["count"], manifest["max_id"]) == (3, 8)
+
+    index = LocalVectorIndex(check_interval=0)
+    index.load(ChatSnapshot(str(tmp_path)))
+    assert index.has(7)
+
+    # Otro worker sube un archivo al chat
+    documents_db.rows.append(_document(12))
+    assert not index.has(7)
+    index.load(ChatSnapshot(str(tmp_path)))
+    assert not index.has(7)
+
+
+def test_descarta_la_copia_si_el_chat_se_borra_en_otro_worker(tmp_path, documents_db):
+    documents_db.rows = [_document(i) for i in (1, 2)]
+    export_chat(7, str(tmp_path))
+    index = LocalVectorIndex(check_interval=0)
+    index.load(ChatSnapshot(str(tmp_path)))
+
+    documents_db.rows = []
+    assert index.search(7, [1.0, 1.0, 0.0], k=2, threshold=-1.0) == []
+    assert index.metrics()["chats"] == 0
+
+
+def test_comprueba_la_base_solo_cada_intervalo(tmp_path, documents_db):
+    documents_db.rows = [_document(1)]
+    export_chat(7, str(tmp_path))
+    index = LocalVectorIndex(check_interval=3600)
+    index.load(ChatSnapshot(str(tmp_path)))
+    assert index.has(7)
+
+    documents_db.rows.append(_document(2))
+    assert index.has(7)
+
+
+def test_precarga_sin_red_y_descarta_los_desactualizados_al_buscar(
+    tmp_path, documents_db, monkeypatch
+):
+    documents_db.rows = [_document(1), _document(2, chat_id=8)]
+    export_chat(7, str(tmp_path / "7"))
+    export_chat(8, str(tmp_path / "8"))
+    documents_db.rows.append(_document(3, chat_id=8))
+
+    # La precarga corre antes del fork: no debe consultar la base
+    def offline(chat_id):
+        raise AssertionError("consulta a la base durante la precarga")
+
+    index = LocalVectorIndex()
+    monkeypatch.setattr(rag.local_index, "document_state", offline)
+    assert index.warm_from_directory(str(tmp_path)) == 2
+
+    monkeypatch.setattr(rag.local_index, "document_state", rag.snapshot.document_state)
+    assert index.has(7) and not index.has(8)
+
+
+def test_snapshot_sin_max_id_no_esta_al_dia(tmp_path):
+    snapshot = _write_snapshot(tmp_path, np.ones((2, 4), dtype=np.float32))
+    del snapshot.manifest["max_id"]
+    assert not snapshot.is_current({"count": 2, "max_id": 99})
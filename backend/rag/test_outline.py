@@ -0,0 +1,72 @@
+import json
+from types import SimpleNamespace
+
+from rag.outline import build_sections, detect_headings, summarize_sections
+
+PAGES = [
+    ("Manual de la impresora\nÍndice\n1 Introducción 2\n2 Instalación 3\n" + "Texto. " * 10, {"page": 0}),
+    ("Manual de la impresora\n1 Introducción\nEste manual describe la impresora.\n"
+     "1.1 Requisitos\nSe necesita un enchufe.\n", {"page": 1}),
+    ("Manual de la impresora\n2 Instalación\nPasos a seguir:\n1 Conecte el cable\n"
+     "2 Encienda el equipo\n", {"page": 2}),
+    ("Manual de la impresora\n2.1 Red inalámbrica\nConfigure la red.\n"
+     "3 Mantenimiento\nLimpie el cabezal cada mes.\n", {"page": 3}),
+]
+
+
+def test_detecta_encabezados_numerados():
+    headings = detect_headings(PAGES)
+    # Se omiten el índice, los encabezados de página y los pasos numerados
+    assert [h["title"] for h in headings] == [
+        "1 Introducción",
+        "1.1 Requisitos",
+        "2 Instalación",
+        "2.1 Red inalámbrica",
+        "3 Mantenimiento",
+    ]
+    assert [h["level"] for h in headings] == [1, 2, 1, 2, 1]
+
+
+def test_secciones_con_rango_de_paginas():
+    sections = build_sections(PAGES)
+    install = next(s for s in sections if s["title"] == "2 Instalación")
+    assert (install["page_start"], install["page_end"]) == (2, 3)
+    assert "Encienda el equipo" in install["text"]
+    assert "Red inalámbrica" not in install["text"]
+    assert sections[-1]["page_start"] == sections[-1]["page_end"] == 3
+
+
+def test_sin_encabezados_agrupa_paginas():
+    pages = [(f"texto de la página {i}", {"page": i}) for i in range(12)]
+    sections = build_sections(pages)
+    assert [(s["page_start"], s["page_end"]) for s in sections] == [(0, 4), (5, 9), (10, 11)]
+    assert sections[0]["title"] == "Páginas 1–5"
+
+
+class FakeClient:
+    def __init__(self):
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        if "Sección" in prompt:
+            ids = [int(line.split()[2].rstrip(":")) for line in prompt.splitlines() if "### Sección" in line]
+            content = {"sections": [{"id": i, "summary": f"Resumen {i}"} for i in ids]}
+        else:
+            content = {"overview": "Manual de uso de la impresora."}
+        message = SimpleNamespace(content=json.dumps(content))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_resume_secciones_en_lotes(monkeypatch):
+    monkeypatch.setattr("rag.outline.SECTIONS_PER_CALL", 2)
+    client = FakeClient()
+    outline = summarize_sections(build_sections(PAGES), "manual.pdf", client)
+
+    # 5 secciones en lotes de 2, más el resumen general
+    assert len(client.prompts) == 4
+    assert outline["overview"] == "Manual de uso de la impresora."
+    assert [s["summary"] for s in outline["sections"]] == [f"Resumen {i}" for i in range(5)]
+    assert "text" not in outline["sections"][0]
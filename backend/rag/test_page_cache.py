@@ -0,0 +1,27 @@
+from rag.page_cache import PageCache
+
+
+def test_guarda_y_lee_paginas(tmp_path):
+    cache = PageCache(str(tmp_path))
+    pages = [
+        ("Primera página con acentos: canción", {"source": "a.pdf", "page": 0}),
+        ("Segunda página", {"source": "a.pdf", "page": 1}),
+    ]
+
+    assert cache.load("ab12cd") is None
+    cache.save("ab12cd", pages)
+
+    assert cache.load("ab12cd") == pages
+    assert (tmp_path / "ab" / "ab12cd.pages").exists()
+
+
+def test_archivo_corrupto_o_cache_desactivada(tmp_path):
+    cache = PageCache(str(tmp_path))
+    (tmp_path / "ff").mkdir()
+    (tmp_path / "ff" / "ff00.pages").write_bytes(b"no es zlib")
+
+    assert cache.load("ff00") is None
+
+    disabled = PageCache("")
+    disabled.save("ab12cd", [("texto", {})])
+    assert disabled.load("ab12cd") is None
@@ -0,0 +1,30 @@
+from rag.query_decomposition import decompose_query, needs_llm, split_heuristic
+
+
+def test_separa_listas_con_vinetas():
+    message = """
+      Quiero que respondas las siguientes preguntas:
+    - Dame un descripción de mi persona.
+    - Dime las tecnologías que uso"""
+    assert split_heuristic(message) == [
+        "Dame un descripción de mi persona",
+        "Dime las tecnologías que uso",
+    ]
+
+
+def test_separa_varias_preguntas_y_conectores():
+    assert split_heuristic("¿Qué es Karen? ¿Cómo se instala el backend?") == [
+        "¿Qué es Karen?",
+        "¿Cómo se instala el backend?",
+    ]
+    assert split_heuristic("Resume el contrato y dime cuándo vence") == [
+        "Resume el contrato",
+        "dime cuándo vence",
+    ]
+
+
+def test_no_separa_preguntas_simples():
+    message = "¿Cuál es la diferencia entre Flask y Django?"
+    assert split_heuristic(message) == [message]
+    assert not needs_llm(message)
+    assert decompose_query(message) == [message]
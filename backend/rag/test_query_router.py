@@ -0,0 +1,48 @@
+from rag.query_router import (
+    ROUTE_OVERVIEW,
+    ROUTE_SECTION,
+    outline_documents,
+    route_query,
+)
+
+OUTLINES = [
+    {
+        "file_name": "manual.pdf",
+        "overview": "Manual de uso de la impresora.",
+        "sections": [
+            {"number": "1", "title": "1 Introducción", "level": 1, "page_start": 1, "page_end": 1,
+             "summary": "Presenta la impresora."},
+            {"number": "2", "title": "2 Instalación", "level": 1, "page_start": 2, "page_end": 3,
+             "summary": "Cómo conectar y encender el equipo."},
+            {"number": "2.1", "title": "2.1 Red inalámbrica", "level": 2, "page_start": 3,
+             "page_end": 3, "summary": "Configuración de la red."},
+        ],
+    }
+]
+
+
+def test_clasifica_preguntas():
+    assert route_query("¿De qué trata el documento?") == ROUTE_OVERVIEW
+    assert route_query("Hazme un resumen del manual") == ROUTE_OVERVIEW
+    assert route_query("What is this document about?") == ROUTE_OVERVIEW
+    assert route_query("Resume la sección 2") == ROUTE_SECTION
+    assert route_query("Summarise chapter 3") == ROUTE_SECTION
+    assert route_query("¿Cómo configuro la red inalámbrica?") is None
+    assert route_query("¿Qué dice la sección 2 sobre el voltaje?") is None
+
+
+def test_secciones_por_numero_o_titulo():
+    by_number = outline_documents("Resume la sección 2.1", ROUTE_SECTION, OUTLINES)
+    assert [d["metadata"]["section"] for d in by_number] == ["2.1 Red inalámbrica"]
+    assert by_number[0]["metadata"]["page"] == 3
+
+    by_title = outline_documents("¿De qué trata el capítulo de instalación?", ROUTE_SECTION, OUTLINES)
+    assert [d["metadata"]["section"] for d in by_title] == ["2 Instalación"]
+
+    assert outline_documents("Resume la sección 9", ROUTE_SECTION, OUTLINES) == []
+
+
+def test_vision_general():
+    [document] = outline_documents("¿De qué trata el documento?", ROUTE_OVERVIEW, OUTLINES)
+    assert document["content"].startswith("Resumen general: Manual de uso de la impresora.")
+    assert "  - 2.1 Red inalámbrica (págs. 4–4)" in document["content"]
@@ -0,0 +1,52 @@
+from rag.retrieval_gate import GATE_OFF, GATE_SHADOW, RetrievalGate, evaluate
+
+
+def test_reglas():
+    gate = RetrievalGate(threshold=0.8)
+    assert gate.classify("¡Muchas gracias!")["reason"] == "chitchat"
+    assert gate.classify("ok, perfecto")["retrieve"] is False
+    assert gate.classify("Hazlo más corto")["reason"] == "follow_up"
+    assert gate.classify("En una tabla, por favor")["retrieve"] is False
+    decision = gate.classify("¿Qué dice el documento sobre la garantía?")
+    assert (decision["retrieve"], decision["reason"]) == (True, "document_reference")
+
+
+def test_modelo_ante_la_duda_recupera():
+    gate = RetrievalGate(threshold=0.8, model_skips=True)
+    assert gate.classify("¿Cuál es la temperatura máxima de operación?")["retrieve"]
+    assert gate.classify("¿cómo se configura el servidor de correo?")["retrieve"]
+    assert not gate.classify("jaja genial, gracias crack")["retrieve"]
+    # Con un umbral imposible el modelo nunca salta la recuperación
+    assert RetrievalGate(threshold=1.01, model_skips=True).classify("jaja genial, gracias crack")["retrieve"]
+
+
+def test_preguntas_cortas_sobre_los_documentos_recuperan():
+    gate = RetrievalGate(threshold=0.8, model_skips=True)
+    for message in ("resume todo", "dime más", "dame un ejemplo", "explícame eso", "si", "no"):
+        assert gate.classify(message)["retrieve"], message
+
+
+def test_sin_model_skips_solo_saltan_las_reglas():
+    gate = RetrievalGate(threshold=0.8)
+    decision = gate.classify("jaja genial, gracias crack")
+    assert (decision["retrieve"], decision["reason"]) == (True, "model_skip_disabled")
+    assert not gate.classify("gracias")["retrieve"]
+
+
+def test_modos_y_metricas():
+    gate = RetrievalGate(threshold=0.8)
+    assert gate.should_retrieve("gracias", mode=GATE_OFF)
+    assert gate.should_retrieve("gracias", mode=GATE_SHADOW)
+    assert not gate.should_retrieve("gracias", mode="on")
+    assert gate.metrics()["skip"] == 2
+    assert gate.metrics()["by_reason"] == {"skip:chitchat": 2}
+
+
+def test_evaluacion():
+    report = evaluate(
+        RetrievalGate(threshold=0.8),
+        [("gracias", False), ("¿Cuál es el plazo de entrega?", True), ("vale", False)],
+    )
+    assert report["accuracy"] == 1.0
+    assert report["skip_rate"] == round(2 / 3, 4)
+    assert report["wrong_skips"] == []
@@ -0,0 +1,82 @@
+import tiktoken
+import pytest
+
+from rag import splitting
+from rag.splitting import TokenSplitter, split_pages
+
+# Tokenizer byte a byte: no necesita descargar los archivos BPE
+BYTE_ENCODING = tiktoken.Encoding(
+    "bytes",
+    pat_str=r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+TEXT = (
+    "Karen guarda los documentos en Supabase. Cada página se divide en chunks. "
+    "Los embeddings se calculan por lotes.\n\n"
+    "El índice local se carga desde snapshots, con vectores cuantizados; "
+    "la búsqueda reordena los mejores candidatos. Las respuestas citan la página.\n"
+    "Los títulos se generan en segundo plano."
+)
+
+
+def _count(text):
+    return len(BYTE_ENCODING.encode(text))
+
+
+def test_ningun_chunk_supera_el_presupuesto():
+    splitter = TokenSplitter(80, 10, encoding=BYTE_ENCODING)
+    chunks = splitter.split_offsets(TEXT)
+
+    assert len(chunks) > 1
+    for start, end, tokens in chunks:
+        assert tokens == _count(TEXT[start:end]) <= 80
+
+
+def test_corta_en_limites_de_oracion_o_parrafo():
+    splitter = TokenSplitter(120, 0, encoding=BYTE_ENCODING)
+    texts = splitter.split_text(TEXT)
+
+    # El fin de párrafo gana a una oración posterior dentro de la ventana
+    assert texts[0].endswith("por lotes.")
+    for text in texts[:-1]:
+        assert text.endswith(".")
+    # Sin superposición los chunks cubren todo el texto
+    assert " ".join(texts).split() == TEXT.split()
+
+
+def test_superposicion_repite_el_final_del_chunk_anterior():
+    splitter = TokenSplitter(80, 30, encoding=BYTE_ENCODING)
+    chunks = splitter.split_offsets(TEXT)
+
+    for (_, previous_end, _), (next_start, _, _) in zip(chunks, chunks[1:]):
+        assert next_start < previous_end
+
+
+def test_texto_sin_limites_se_corta_en_el_presupuesto():
+    splitter = TokenSplitter(16, 4, encoding=BYTE_ENCODING)
+    chunks = splitter.split_offsets("x" * 100)
+
+    assert all(tokens <= 16 for _, _, tokens in chunks)
+    assert chunks[-1][1] == 100
+
+
+def test_superposicion_mayor_que_el_chunk():
+    with pytest.raises(ValueError):
+        TokenSplitter(10, 10, encoding=BYTE_ENCODING)
+
+
+def test_split_pages_guarda_offsets_y_tokens(monkeypatch):
+    monkeypatch.setattr(splitting, "_encoding", BYTE_ENCODING)
+    splitting.create_splitter.cache_clear()
+    pages = [(TEXT, {"source": "a.txt", "page": i}) for i in range(3)] + [("", {"page": 3})]
+
+    chunks = split_pages(pages, 80, 10)
+
+    assert len(chunks) > 3
+    assert {chunks.metadata(i)["page"] for i in range(len(chunks))} == {0, 1, 2}
+    for i in range(len(chunks)):
+        assert chunks.text(i) in TEXT
+        assert chunks.token_count(i) == _count(chunks.text(i))
+    splitting.create_splitter.cache_clear()
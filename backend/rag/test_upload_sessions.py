@@ -0,0 +1,98 @@
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rag.upload_sessions import UploadError, UploadSessions
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return UploadSessions(str(tmp_path), part_size=10, max_size=1000, ttl=3600)
+
+
+def test_partes_en_paralelo_y_desordenadas(sessions):
+    content = os.urandom(95)
+    upload = sessions.create("manual de usuario.pdf", len(content), chat_id=7)
+    assert upload["num_parts"] == 10
+
+    def send(index):
+        part = content[index * 10 : (index + 1) * 10]
+        return sessions.write_part(upload["upload_id"], index, io.BytesIO(part))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(send, reversed(range(10))))
+
+    result = sessions.complete(upload["upload_id"])
+    assert result["content_hash"] == hashlib.sha256(content).hexdigest()
+    assert result["file_path"].endswith("manual_de_usuario.pdf")
+    with open(result["file_path"], "rb") as f:
+        assert f.read() == content
+
+
+def test_reanudar_subida_interrumpida(sessions):
+    content = os.urandom(25)
+    upload = sessions.create("a.pdf", len(content), chat_id=1)
+    sessions.write_part(upload["upload_id"], 0, io.BytesIO(content[:10]))
+
+    status = sessions.status(upload["upload_id"])
+    assert (status["received"], status["missing"]) == ([0], [1, 2])
+    with pytest.raises(UploadError):
+        sessions.complete(upload["upload_id"])
+
+    sessions.write_part(upload["upload_id"], 1, io.BytesIO(content[10:20]))
+    sessions.write_part(upload["upload_id"], 2, io.BytesIO(content[20:]))
+    assert sessions.complete(upload["upload_id"])["content_hash"] == hashlib.sha256(content).hexdigest()
+
+
+def test_reenvio_fallido_deja_la_parte_como_faltante(sessions):
+    content = os.urandom(20)
+    upload = sessions.create("a.pdf", len(content), chat_id=1)
+    upload_id = upload["upload_id"]
+    for index in (0, 1):
+        sessions.write_part(upload_id, index, io.BytesIO(content[index * 10 : index * 10 + 10]))
+
+    # El reenvío sobrescribe bytes buenos y falla el checksum
+    with pytest.raises(UploadError):
+        sessions.write_part(upload_id, 0, io.BytesIO(b"x" * 10), checksum="00" * 32)
+    assert sessions.status(upload_id)["missing"] == [0]
+    with pytest.raises(UploadError):
+        sessions.complete(upload_id)
+
+    sessions.write_part(upload_id, 0, io.BytesIO(content[:10]))
+    assert sessions.complete(upload_id)["content_hash"] == hashlib.sha256(content).hexdigest()
+
+
+def test_partes_invalidas(sessions):
+    upload = sessions.create("a.pdf", 25, chat_id=1)
+    upload_id = upload["upload_id"]
+
+    with pytest.raises(UploadError):
+        sessions.write_part(upload_id, 3, io.BytesIO(b"x" * 5))
+    with pytest.raises(UploadError):
+        sessions.write_part(upload_id, 0, io.BytesIO(b"x" * 4))
+    with pytest.raises(UploadError):
+        sessions.write_part(upload_id, 2, io.BytesIO(b"x" * 6))
+    with pytest.raises(UploadError):
+        sessions.write_part(upload_id, 2, io.BytesIO(b"x" * 5), checksum="00" * 32)
+    with pytest.raises(UploadError):
+        sessions.status("../../etc")
+    with pytest.raises(UploadError):
+        sessions.create("grande.pdf", 1001, chat_id=1)
+    assert sessions.status(upload_id)["received"] == []
+
+
+def test_elimina_sesiones_expiradas(sessions):
+    old = sessions.create("a.pdf", 10, chat_id=1)
+    recent = sessions.create("b.pdf", 10, chat_id=1)
+    past = time.time() - 7200
+    for path in (sessions.directory / old["upload_id"]).iterdir():
+        os.utime(path, (past, past))
+
+    assert sessions.remove_expired() == 1
+    with pytest.raises(UploadError):
+        sessions.status(old["upload_id"])
+    assert sessions.status(recent["upload_id"])["missing"] == [0]
@@ -0,0 +1,216 @@
+"""
+Subidas reanudables por partes.
+
+El cliente abre una sesión con el tamaño total del archivo y envía partes de
+tamaño fijo, en cualquier orden y en paralelo. Cada parte se escribe
+directamente en su offset dentro de un único archivo preasignado, así que al
+completar la subida el archivo ya está ensamblado y la ingesta lo lee sin otra
+copia.
+
+Cada sesión vive en `<directorio>/<upload_id>/`:
+
+    manifest.json  nombre, tamaño, tamaño de parte y chat (se escribe una vez)
+    <nombre>       contenido del archivo, con el nombre original saneado
+    parts          un byte por parte; 1 cuando la parte quedó escrita en disco
+
+Marcar una parte es una escritura de un byte en su posición, por lo que varios
+hilos o workers pueden recibir partes de la misma sesión sin bloqueos. Una
+subida interrumpida se reanuda consultando qué partes faltan.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import secrets
+import shutil
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict, List
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+_UNSAFE_CHARS = re.compile(r"[^\w.-]+")
+
+
+class UploadError(Exception):
+    """Error del cliente en una subida por partes (sesión, parte o tamaño inválidos)."""
+
+
+class UploadSessions:
+    def __init__(self, directory: str, part_size: int, max_size: int, ttl: float):
+        self.directory = Path(directory)
+        self.part_size = part_size
+        self.max_size = max_size
+        self.ttl = ttl
+
+    def _session_dir(self, upload_id: str) -> Path:
+        if not _UPLOAD_ID.match(upload_id or ""):
+            raise UploadError("Identificador de subida inválido")
+        path = self.directory / upload_id
+        if not (path / "manifest.json").exists():
+            raise UploadError("Sesión de subida no encontrada o expirada")
+        return path
+
+    def manifest(self, upload_id: str) -> Dict:
+        return json.loads((self._session_dir(upload_id) / "manifest.json").read_text())
+
+    def _data_path(self, manifest: Dict) -> Path:
+        return self.directory / manifest["upload_id"] / manifest["data_file"]
+
+    def create(self, file_name: str, size: int, chat_id: int) -> Dict:
+        """Abre una sesión y preasigna el archivo de destino."""
+        if size <= 0:
+            raise UploadError("El tamaño del archivo debe ser mayor que cero")
+        if size > self.max_size:
+            raise UploadError(f"El archivo supera el tamaño máximo de {self.max_size} bytes")
+        self.remove_expired()
+
+        upload_id = secrets.token_hex(16)
+        path = self.directory / upload_id
+        path.mkdir(parents=True)
+        num_parts = math.ceil(size / self.part_size)
+        # La ingesta toma el nombre del archivo de su ruta
+        data_file = _UNSAFE_CHARS.sub("_", Path(file_name).name).strip("._") or "upload.pdf"
+        if data_file in ("manifest.json", "parts"):
+            data_file = f"upload-{data_file}"
+        with open(path / data_file, "wb") as f:
+            f.truncate(size)
+        with open(path / "parts", "wb") as f:
+            f.write(bytes(num_parts))
+
+        manifest = {
+            "upload_id": upload_id,
+            "file_name": file_name,
+            "data_file": data_file,
+            "size": size,
+            "part_size": self.part_size,
+            "num_parts": num_parts,
+            "chat_id": chat_id,
+            "created_at": time.time(),
+        }
+        # El manifiesto se escribe al final: una sesión sin manifiesto no existe
+        tmp_path = path / "manifest.json.tmp"
+        tmp_path.write_text(json.dumps(manifest))
+        os.replace(tmp_path, path / "manifest.json")
+        return manifest
+
+    def write_part(
+        self, upload_id: str, index: int, stream: BinaryIO, checksum: str = None
+    ) -> Dict:
+        """Escribe una parte en su offset y la marca como recibida.
+
+        Reenviar una parte ya recibida la sobrescribe, así que los reintentos
+        del cliente son seguros. La marca se borra antes de escribir: si el
+        reenvío falla a mitad, la parte vuelve a figurar como faltante.
+        """
+        manifest = self.manifest(upload_id)
+        if not 0 <= index < manifest["num_parts"]:
+            raise UploadError(f"Parte {index} fuera de rango")
+        offset = index * manifest["part_size"]
+        expected = min(manifest["part_size"], manifest["size"] - offset)
+
+        path = self.directory / upload_id
+        self._mark_part(path, index, b"\x00")
+        hasher = hashlib.sha256()
+        written = 0
+        fd = os.open(self._data_path(manifest), os.O_WRONLY)
+        try:
+            while True:
+                block = stream.read(STREAM_CHUNK_SIZE)
+                if not block:
+                    break
+                if written + len(block) > expected:
+                    raise UploadError(f"La parte {index} debe tener {expected} bytes")
+                os.pwrite(fd, block, offset + written)
+                hasher.update(block)
+                written += len(block)
+            if written != expected:
+                raise UploadError(
+                    f"La parte {index} llegó incompleta ({written} de {expected} bytes)"
+                )
+            if checksum and checksum.lower() != hasher.hexdigest():
+                raise UploadError(f"El checksum de la parte {index} no coincide")
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        # Marcar la parte solo cuando sus datos ya están en disco
+        self._mark_part(path, index, b"\x01")
+        return {"part": index, "size": written}
+
+    @staticmethod
+    def _mark_part(path: Path, index: int, value: bytes):
+        fd = os.open(path / "parts", os.O_WRONLY)
+        try:
+            os.pwrite(fd, value, index)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def received_parts(self, upload_id: str) -> List[int]:
+        parts = (self._session_dir(upload_id) / "parts").read_bytes()
+        return [i for i, received in enumerate(parts) if received]
+
+    def status(self, upload_id: str) -> Dict:
+        manifest = self.manifest(upload_id)
+        received = set(self.received_parts(upload_id))
+        return {
+            **manifest,
+            "received": sorted(received),
+            "missing": [i for i in range(manifest["num_parts"]) if i not in received],
+        }
+
+    def complete(self, upload_id: str) -> Dict:
+        """Verifica que estén todas las partes y calcula el hash del archivo.
+
+        Retorna el manifiesto con `file_path` (el archivo ensamblado, listo para
+        la ingesta) y `content_hash`.
+        """
+        status = self.status(upload_id)
+        if status["missing"]:
+            raise UploadError(f"Faltan {len(status['missing'])} partes: {status['missing'][:20]}")
+
+        data_path = self._data_path(status)
+        hasher = hashlib.sha256()
+        with open(data_path, "rb") as f:
+            for block in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                hasher.update(block)
+        return {**status, "file_path": str(data_path), "content_hash": hasher.hexdigest()}
+
+    def remove(self, upload_id: str):
+        if _UPLOAD_ID.match(upload_id or ""):
+            shutil.rmtree(self.directory / upload_id, ignore_errors=True)
+
+    def remove_expired(self) -> int:
+        """Elimina las sesiones sin actividad por más de `ttl` segundos."""
+        if not self.directory.exists():
+            return 0
+        removed = 0
+        cutoff = time.time() - self.ttl
+        for path in self.directory.iterdir():
+            try:
+                # La marca de partes se actualiza con cada parte recibida
+                last_activity = max(p.stat().st_mtime for p in path.iterdir())
+            except (OSError, ValueError):
+                continue
+            if last_activity < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"Se eliminaron {removed} subidas expiradas")
+        return removed
+
+
+# Sesiones compartidas por todo el proceso
+upload_sessions = UploadSessions(
+    Config.UPLOAD_DIR,
+    part_size=Config.UPLOAD_PART_SIZE,
+    max_size=Config.MAX_UPLOAD_SIZE,
+    ttl=Config.UPLOAD_SESSION_TTL,
+)
@@ -1,16 +1,34 @@
 from flask import Blueprint, request, jsonify
 from agents.assistant import Assistant
-from db.supabase_utils import supabase
+from agents.prefetch import chat_prefetcher
+from db.chat_store import DEFAULT_CHAT_TITLE, chat_store
 from werkzeug.utils import secure_filename
 import os
+import shutil
+import tempfile
 from pathlib import Path
 import logging
 from rag.optimized_rag import OptimizedRAG
+from rag import file_store
+from rag.upload_sessions import UploadError, upload_sessions
+from db.session_cache import session_registry
+from config import Config
+from db.garbage_collector import delete_chat_artifacts
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
 assistant_bp = Blueprint("assistant", __name__)
 assistant = Assistant()
+# Hilo para limpiar los datos de chats eliminados sin bloquear la respuesta
+cleanup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-cleanup")
+
+
+def _cleanup_chat(chat_id: int):
+    try:
+        delete_chat_artifacts(chat_id)
+    except Exception as e:
+        logger.error(f"Error limpiando datos del chat {chat_id}: {e}")
 
 
 @assistant_bp.route("/chat/start", methods=["POST"])
@@ -18,18 +36,8 @@ def start_chat():
     """Inicia una nueva sesión de chat"""
     try:
         # Crear una nueva sesión de chat
-        response = (
-            supabase.table("chat_sessions")
-            .insert(
-                {"title": "Nueva conversación", "description": "Conversación iniciada"}
-            )
-            .execute()
-        )
-
-        if not response.data:
-            raise Exception("Error al crear la sesión de chat")
-
-        session_id = response.data[0]["id"]
+        session_id = chat_store.create_chat(DEFAULT_CHAT_TITLE, "Conversación iniciada")
+        session_registry.add(session_id)
         return jsonify({"message": "Sesión de chat creada", "session_id": session_id})
     except Exception as e:
         logger.error(f"Error al iniciar sesión: {e}")
@@ -59,14 +67,14 @@ def send_message():
 def get_chat_history(session_id):
     """Obtiene el historial de mensajes de un chat"""
     try:
-        response = (
-            supabase.table("messages")
-            .select("role,content,created_at")
-            .eq("chat_session_id", session_id)
-            .order("created_at")
-            .execute()
-        )
-        return jsonify(response.data)
+        messages = chat_store.get_messages(session_id)
+        # Abrir el chat prepara en segundo plano su estado de recuperación
+        if Config.PREFETCH_ENABLED:
+            try:
+                chat_prefetcher.schedule(session_id, messages)
+            except Exception as e:
+                logger.warning(f"No se pudo programar la preparación del chat {session_id}: {e}")
+        return jsonify(messages)
     except Exception as e:
         print(f"Error al obtener historial: {e}")
         return jsonify({"error": str(e)}), 500
@@ -76,13 +84,7 @@ def get_chat_history(session_id):
 def list_chats():
     """Lista todas las sesiones de chat"""
     try:
-        response = (
-            supabase.table("chat_sessions")
-            .select("id,title,description,created_at")
-            .order("created_at", desc=True)
-            .execute()
-        )
-        return jsonify(response.data)
+        return jsonify(chat_store.list_chats())
     except Exception as e:
         print(f"Error al listar chats: {e}")
         return jsonify({"error": str(e)}), 500
@@ -90,16 +92,43 @@ def list_chats():
 
 @assistant_bp.route("/chat/delete/<int:session_id>", methods=["DELETE"])
 def delete_chat(session_id):
-    """Elimina un chat y sus mensajes"""
+    """Elimina un chat, sus mensajes, documentos y archivos"""
     try:
-        # Los mensajes se eliminarán automáticamente por la restricción ON DELETE CASCADE
-        supabase.table("chat_sessions").delete().eq("id", session_id).execute()
+        # Los mensajes se eliminan junto con el chat
+        chat_store.delete_chat(session_id)
+        session_registry.invalidate(session_id)
+        # Eliminar documentos y archivos del chat en segundo plano
+        cleanup_executor.submit(_cleanup_chat, session_id)
         return jsonify({"success": True})
     except Exception as e:
         print(f"Error al eliminar chat: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+async def _process_uploaded_file(file_path: str, chat_id: int, content_hash: str):
+    """Ingresa un archivo ya guardado en disco y genera el mensaje de bienvenida."""
+    # Procesar archivo con RAG
+    rag = OptimizedRAG()
+    file_info = await rag.process_file(file_path, chat_id, content_hash)
+
+    # Usar el chat_id actualizado del file_info
+    updated_chat_id = file_info.get("chat_id", chat_id)
+
+    # Procesar el archivo con el asistente
+    welcome_message = await assistant.process_uploaded_files(file_info, updated_chat_id)
+
+    return {
+        "message": "Archivo procesado exitosamente",
+        "welcome_message": welcome_message,
+        "file_info": {
+            "file_name": file_info["file_name"],
+            "file_url": file_info["file_url"],
+            "num_chunks": file_info["num_chunks"],
+            "chat_id": updated_chat_id,
+        },
+    }
+
+
 @assistant_bp.route("/upload", methods=["POST"])
 async def upload_file():
     try:
@@ -114,39 +143,17 @@ async def upload_file():
         temp_dir = Path("backend/temp")
         temp_dir.mkdir(exist_ok=True)
 
-        # Guardar archivo temporalmente
+        # Guardar archivo temporalmente calculando su hash en la misma pasada
         file_path = temp_dir / file.filename
-        file.save(str(file_path))
+        content_hash, _ = file_store.save_stream(file.stream, file_path)
 
         try:
-            # Procesar archivo con RAG
-            rag = OptimizedRAG()
-            file_info = await rag.process_file(str(file_path), int(chat_id))
-
-            # Usar el chat_id actualizado del file_info
-            updated_chat_id = file_info.get("chat_id", int(chat_id))
-
-            # Procesar el archivo con el asistente
-            assistant = Assistant()
-            welcome_message = await assistant.process_uploaded_files(
-                file_info, updated_chat_id
-            )
+            result = await _process_uploaded_file(str(file_path), int(chat_id), content_hash)
 
             # Eliminar archivo temporal
             file_path.unlink()
 
-            return jsonify(
-                {
-                    "message": "Archivo procesado exitosamente",
-                    "welcome_message": welcome_message,
-                    "file_info": {
-                        "file_name": file_info["file_name"],
-                        "file_url": file_info["file_url"],
-                        "num_chunks": file_info["num_chunks"],
-                        "chat_id": updated_chat_id,
-                    },
-                }
-            )
+            return jsonify(result)
 
         except Exception as e:
             logger.error(f"Error en upload_file: {e}")
@@ -158,3 +165,147 @@ async def upload_file():
     except Exception as e:
         logger.error(f"Error en upload_file: {e}")
         return jsonify({"error": str(e)}), 500
+
+
+@assistant_bp.route("/upload/batch", methods=["POST"])
+async def upload_files_batch():
+    """Sube y procesa varios archivos en paralelo con un único resumen combinado"""
+    try:
+        files = request.files.getlist("files")
+        chat_id = request.form.get("chat_id")
+
+        if not files or not chat_id:
+            return jsonify({"error": "Se requieren archivos y chat_id"}), 400
+
+        # Directorio temporal propio para evitar colisiones entre subidas
+        base_temp_dir = Path("backend/temp")
+        base_temp_dir.mkdir(parents=True, exist_ok=True)
+        temp_dir = Path(tempfile.mkdtemp(dir=base_temp_dir))
+
+        try:
+            file_paths = []
+            content_hashes = []
+            for index, file in enumerate(files):
+                file_path = file_store.batch_file_path(
+                    temp_dir, index, secure_filename(file.filename or "")
+                )
+                content_hash, _ = file_store.save_stream(file.stream, file_path)
+                file_paths.append(str(file_path))
+                content_hashes.append(content_hash)
+
+            rag = OptimizedRAG()
+            result = await rag.process_files(
+                file_paths, int(chat_id), content_hashes=content_hashes
+            )
+            updated_chat_id = result["chat_id"]
+
+            welcome_message = None
+            if result["files"]:
+                welcome_message = await assistant.process_uploaded_batch(
+                    result["files"], updated_chat_id
+                )
+
+            return jsonify(
+                {
+                    "message": f"Se procesaron {len(result['files'])} de {len(files)} archivos",
+                    "welcome_message": welcome_message,
+                    "chat_id": updated_chat_id,
+                    "files_info": [
+                        {
+                            "file_name": info["file_name"],
+                            "file_url": info["file_url"],
+                            "num_chunks": info["num_chunks"],
+                        }
+                        for info in result["files"]
+                    ],
+                    "errors": result["errors"],
+                }
+            )
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    except Exception as e:
+        logger.error(f"Error en upload_files_batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@assistant_bp.route("/upload/init", methods=["POST"])
+def init_upload():
+    """Abre una subida por partes; retorna el tamaño de parte y la cantidad de partes"""
+    try:
+        data = request.json or {}
+        file_name = data.get("file_name")
+        size = data.get("size")
+        chat_id = data.get("chat_id")
+
+        if not file_name or not size or not chat_id:
+            return jsonify({"error": "Se requieren file_name, size y chat_id"}), 400
+
+        manifest = upload_sessions.create(file_name, int(size), int(chat_id))
+        return jsonify(
+            {
+                "upload_id": manifest["upload_id"],
+                "part_size": manifest["part_size"],
+                "num_parts": manifest["num_parts"],
+            }
+        )
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error en init_upload: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@assistant_bp.route("/upload/<upload_id>/part/<int:index>", methods=["PUT"])
+def upload_part(upload_id, index):
+    """Recibe una parte en el cuerpo de la petición; se puede reenviar sin riesgo"""
+    try:
+        result = upload_sessions.write_part(
+            upload_id, index, request.stream, request.headers.get("X-Part-SHA256")
+        )
+        return jsonify(result)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error en upload_part: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@assistant_bp.route("/upload/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Partes recibidas y faltantes, para reanudar una subida interrumpida"""
+    try:
+        status = upload_sessions.status(upload_id)
+        return jsonify(
+            {
+                "upload_id": upload_id,
+                "num_parts": status["num_parts"],
+                "received": status["received"],
+                "missing": status["missing"],
+            }
+        )
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error en upload_status: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@assistant_bp.route("/upload/<upload_id>/complete", methods=["POST"])
+async def complete_upload(upload_id):
+    """Verifica que estén todas las partes e ingresa el archivo ensamblado"""
+    try:
+        upload = upload_sessions.complete(upload_id)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        result = await _process_uploaded_file(
+            upload["file_path"], upload["chat_id"], upload["content_hash"]
+        )
+        upload_sessions.remove(upload_id)
+        return jsonify(result)
+    except Exception as e:
+        # La sesión se conserva para reintentar la ingesta sin volver a subir
+        logger.error(f"Error en complete_upload: {e}")
+        return jsonify({"error": str(e)}), 500
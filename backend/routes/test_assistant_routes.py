@@ -0,0 +1,72 @@
+import io
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("flask")
+
+from flask import Flask
+
+import routes.assistant_routes as assistant_routes
+
+
+class _RAG:
+    """Procesamiento falso que registra los archivos que recibe."""
+
+    received = []
+
+    async def process_files(self, file_paths, chat_id, content_hashes=None):
+        _RAG.received = [(Path(path).name, Path(path).read_bytes()) for path in file_paths]
+        files = [
+            {"file_name": name, "file_url": f"https://example.com/{name}", "num_chunks": 1}
+            for name, _ in _RAG.received
+        ]
+        return {"chat_id": chat_id, "files": files, "errors": []}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    async def welcome(files, chat_id):
+        return "Bienvenida"
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(assistant_routes, "OptimizedRAG", _RAG)
+    monkeypatch.setattr(assistant_routes.assistant, "process_uploaded_batch", welcome)
+    app = Flask(__name__)
+    app.register_blueprint(assistant_routes.assistant_bp, url_prefix="/api/assistant")
+    return app.test_client()
+
+
+def _upload(client, files):
+    return client.post(
+        "/api/assistant/upload/batch",
+        data={"chat_id": "7", "files": [(io.BytesIO(data), name) for name, data in files]},
+        content_type="multipart/form-data",
+    )
+
+
+def test_lote_con_nombres_repetidos_procesa_cada_archivo(client):
+    response = _upload(client, [("informe.pdf", b"primero"), ("informe.pdf", b"segundo")])
+
+    assert response.status_code == 200
+    assert _RAG.received == [("informe.pdf", b"primero"), ("informe.pdf", b"segundo")]
+    assert [f["file_name"] for f in response.get_json()["files_info"]] == ["informe.pdf"] * 2
+
+
+def test_lote_con_nombre_que_queda_vacio(client):
+    response = _upload(client, [("../..", b"contenido")])
+
+    assert response.status_code == 200
+    assert _RAG.received == [("upload.pdf", b"contenido")]
+
+
+def test_lote_sin_archivos(client):
+    response = client.post("/api/assistant/upload/batch", data={"chat_id": "7"})
+
+    assert response.status_code == 400
+
+
+def test_lote_borra_los_archivos_temporales(client, tmp_path):
+    _upload(client, [("informe.pdf", b"contenido")])
+
+    assert list((tmp_path / "backend" / "temp").iterdir()) == []
@@ -0,0 +1,3 @@
+"""
+Servicios compartidos entre agentes, RAG y rutas
+"""
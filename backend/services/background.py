@@ -0,0 +1,46 @@
+"""
+Tareas periódicas en hilos de fondo.
+
+Con varios workers en el mismo host, una tarea con `lock_name` solo se ejecuta
+en el worker que obtiene su lock de archivo; los demás lo vuelven a intentar
+en cada intervalo (por ejemplo, si el dueño se reinicia).
+"""
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _lock_path(lock_name: str) -> str:
+    return os.path.join(tempfile.gettempdir(), f"karen-{lock_name}.lock")
+
+
+def start_periodic(
+    name: str, interval: float, task: Callable[[], object], lock_name: Optional[str] = None
+) -> threading.Thread:
+    """Ejecuta `task` cada `interval` segundos en un hilo daemon."""
+    lock_file = open(_lock_path(lock_name), "a") if lock_name else None
+
+    def run():
+        owner = lock_file is None
+        while True:
+            time.sleep(interval)
+            if not owner:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    owner = True
+                except OSError:
+                    continue
+            try:
+                task()
+            except Exception as e:
+                logger.error(f"Error en la tarea periódica {name}: {e}")
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
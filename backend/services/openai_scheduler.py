@@ -0,0 +1,247 @@
+"""
+Planificador global de peticiones a OpenAI.
+
+Todas las llamadas (generaciones, embeddings, resúmenes y títulos) piden un
+turno antes de ejecutarse. El planificador respeta los presupuestos de
+peticiones y tokens por minuto, atiende primero a las prioridades más altas,
+reparte de forma justa entre chats y reserva margen para el tráfico
+interactivo, de modo que una ingesta grande no deje sin cupo a los chats.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from config import Config
+from services.resilience import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Prioridades (menor valor = mayor prioridad)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_INGEST = 1
+PRIORITY_HOUSEKEEPING = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_INGEST: "ingest",
+    PRIORITY_HOUSEKEEPING: "housekeeping",
+}
+
+RATE_LIMIT_BACKOFF = 5.0  # Pausa en segundos tras un 429 sin Retry-After
+WAIT_SAMPLES = 1000  # Esperas recientes guardadas por prioridad
+MAX_TRACKED_CHATS = 10000  # Chats con tiempo virtual antes de depurar
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata de tokens (~4 caracteres por token)."""
+    return len(text) // 4 + 1
+
+
+class _Bucket:
+    """Cubeta de tokens que se rellena de forma continua."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        missing = amount - self.level
+        return max(0.0, missing / self.rate) if self.rate > 0 else 1.0
+
+
+class _Ticket:
+    def __init__(self, priority: int, tokens: int, chat_id):
+        self.priority = priority
+        self.tokens = tokens
+        self.chat_id = chat_id
+        self.enqueued = time.monotonic()
+        self.admitted = False
+
+
+class OpenAIScheduler:
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        background_share: float = 0.8,
+    ):
+        self.background_share = background_share
+        self._requests = _Bucket(requests_per_minute)
+        self._tokens = _Bucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._chat_finish = {}  # Tiempo virtual por chat para el reparto justo
+        self._virtual_time = 0.0
+        self._paused_until = 0.0
+        self._waits = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_NAMES}
+        self._completed = {p: 0 for p in PRIORITY_NAMES}
+        self._rate_limited = 0
+        self._timed_out = 0
+
+    def _reserve(self, priority: int) -> float:
+        """Fracción de la capacidad que el tráfico no interactivo debe dejar libre."""
+        if priority == PRIORITY_INTERACTIVE:
+            return 0.0
+        return 1.0 - self.background_share
+
+    def _enqueue(self, ticket: _Ticket):
+        # Reparto justo: cada chat avanza su tiempo virtual según lo que consume
+        start = max(self._virtual_time, self._chat_finish.get(ticket.chat_id, 0.0))
+        finish = start + ticket.tokens
+        if ticket.chat_id is not None:
+            self._chat_finish[ticket.chat_id] = finish
+            if len(self._chat_finish) > MAX_TRACKED_CHATS:
+                # Olvidar los chats que ya no van por delante del reloj virtual
+                self._chat_finish = {
+                    chat: t
+                    for chat, t in self._chat_finish.items()
+                    if t > self._virtual_time
+                }
+        heapq.heappush(
+            self._queue, (ticket.priority, finish, next(self._sequence), ticket)
+        )
+
+    def _try_admit(self, now: float) -> Optional[float]:
+        """Admite la cabeza de la cola si hay presupuesto; si no, retorna cuánto esperar."""
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        self._requests.refill(now)
+        self._tokens.refill(now)
+        priority, finish, _, ticket = self._queue[0]
+
+        reserve = self._reserve(priority)
+        needed_requests = 1 + reserve * self._requests.capacity
+        needed_tokens = min(ticket.tokens, self._tokens.capacity * self.background_share)
+        needed_tokens += reserve * self._tokens.capacity
+
+        if self._requests.level >= needed_requests and self._tokens.level >= needed_tokens:
+            heapq.heappop(self._queue)
+            self._requests.level -= 1
+            self._tokens.level -= min(ticket.tokens, self._tokens.capacity)
+            self._virtual_time = max(self._virtual_time, finish - ticket.tokens)
+            ticket.admitted = True
+            return None
+
+        return max(
+            self._requests.time_until(needed_requests),
+            self._tokens.time_until(needed_tokens),
+            0.01,
+        )
+
+    def _acquire(self, ticket: _Ticket, timeout: Optional[float] = None):
+        expires_at = None if timeout is None else ticket.enqueued + timeout
+        with self._cond:
+            self._enqueue(ticket)
+            while not ticket.admitted:
+                if self._queue[0][3] is ticket:
+                    wait = self._try_admit(time.monotonic())
+                    if wait is None:
+                        break
+                else:
+                    wait = 1.0
+                if expires_at is not None:
+                    remaining = expires_at - time.monotonic()
+                    if remaining <= 0:
+                        # Salir de la cola sin consumir cupo y dejar pasar al siguiente
+                        self._queue = [entry for entry in self._queue if entry[3] is not ticket]
+                        heapq.heapify(self._queue)
+                        self._timed_out += 1
+                        self._cond.notify_all()
+                        raise DeadlineExceeded("Se agotó el plazo esperando cupo de OpenAI")
+                    wait = min(wait, remaining)
+                self._cond.wait(timeout=wait)
+            # Despertar al siguiente de la cola
+            self._cond.notify_all()
+
+        waited = time.monotonic() - ticket.enqueued
+        self._waits[ticket.priority].append(waited)
+        if waited > 1.0:
+            logger.info(
+                f"Petición {PRIORITY_NAMES[ticket.priority]} esperó {waited:.2f}s por cupo de OpenAI"
+            )
+
+    def _report_rate_limit(self, error: Exception):
+        retry_after = RATE_LIMIT_BACKOFF
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            retry_after = float(headers.get("retry-after", retry_after))
+        except (TypeError, ValueError):
+            pass
+        with self._cond:
+            self._rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        logger.warning(f"OpenAI devolvió 429, pausando peticiones {retry_after:.1f}s")
+
+    @contextmanager
+    def slot(self, priority: int, tokens: int = 1000, chat_id=None, timeout: float = None):
+        """Espera turno para una petición a OpenAI con el costo estimado en tokens.
+
+        Con `timeout`, lanza DeadlineExceeded si el turno no llega a tiempo.
+        """
+        ticket = _Ticket(priority, max(1, int(tokens)), chat_id)
+        self._acquire(ticket, timeout)
+        try:
+            yield
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError":
+                self._report_rate_limit(e)
+            raise
+        finally:
+            with self._cond:
+                self._completed[priority] += 1
+
+    def set_share(self, fraction: float):
+        """Limita el planificador a una fracción del presupuesto (un worker de varios)."""
+        with self._cond:
+            for bucket in (self._requests, self._tokens):
+                bucket.capacity *= fraction
+                bucket.rate *= fraction
+                bucket.level = min(bucket.level, bucket.capacity)
+
+    def metrics(self) -> Dict:
+        """Profundidad de cola y tiempos de espera por prioridad."""
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _, _, _ in self._queue:
+                depth[PRIORITY_NAMES[priority]] += 1
+
+            waits = {}
+            for priority, samples in self._waits.items():
+                ordered = sorted(samples)
+                waits[PRIORITY_NAMES[priority]] = {
+                    "completed": self._completed[priority],
+                    "avg_wait": sum(ordered) / len(ordered) if ordered else 0.0,
+                    "p95_wait": ordered[int(len(ordered) * 0.95)] if ordered else 0.0,
+                    "max_wait": ordered[-1] if ordered else 0.0,
+                }
+
+            return {
+                "queue_depth": depth,
+                "wait_time": waits,
+                "rate_limited": self._rate_limited,
+                "timed_out": self._timed_out,
+                "available_requests": round(self._requests.level, 1),
+                "available_tokens": round(self._tokens.level),
+            }
+
+
+# Planificador compartido por todo el proceso
+openai_scheduler = OpenAIScheduler(
+    requests_per_minute=Config.OPENAI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=Config.OPENAI_TOKENS_PER_MINUTE,
+    background_share=Config.OPENAI_BACKGROUND_SHARE,
+)
@@ -0,0 +1,191 @@
+"""
+Herramientas de resiliencia para llamadas remotas: plazos de extremo a extremo,
+reintentos acotados por el tiempo restante, peticiones duplicadas (hedging)
+cuando la primera tarda más de lo habitual y un circuit breaker.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Hilos para ejecutar las llamadas protegidas y sus duplicados
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="resilience")
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el plazo de la petición."""
+
+
+class Deadline:
+    """Plazo absoluto de una petición que se propaga a las etapas internas."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def child(self, seconds: float) -> "Deadline":
+        """Sub-plazo que nunca excede el plazo actual."""
+        return Deadline(min(seconds, self.remaining()))
+
+
+class LatencyTracker:
+    """Guarda latencias recientes para calcular percentiles."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < 20:  # Sin datos suficientes
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+class CircuitBreaker:
+    """Abre el circuito tras fallos consecutivos y prueba de nuevo pasado un tiempo.
+
+    En estado semiabierto deja pasar una sola llamada de prueba; su resultado
+    cierra el circuito o lo vuelve a abrir. Si la prueba no informa resultado
+    en `reset_timeout` segundos, se permite otra.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started = None  # Inicio de la llamada de prueba en curso
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                return False
+            self._probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_started = None
+            if self._failures >= self.failure_threshold or self._opened_at is not None:
+                if self._opened_at is None:
+                    logger.warning(f"Circuito {self.name} abierto tras {self._failures} fallos")
+                self._opened_at = time.monotonic()
+
+    def metrics(self) -> Dict:
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+def call_with_deadline(fn: Callable, deadline: Deadline):
+    """Ejecuta `fn` y deja de esperarla cuando se agota el plazo."""
+    future = _executor.submit(fn)
+    done, _ = wait([future], timeout=deadline.remaining())
+    if not done:
+        raise DeadlineExceeded("Se agotó el plazo esperando la respuesta")
+    return future.result()
+
+
+def hedged_call(
+    fn: Callable,
+    deadline: Deadline,
+    hedge_after: Optional[float],
+    latencies: Optional[LatencyTracker] = None,
+):
+    """Lanza una segunda petición si la primera tarda más de `hedge_after` segundos.
+
+    Retorna el primer resultado exitoso; si todas fallan, propaga el último error.
+    """
+    start = time.monotonic()
+    pending = {_executor.submit(fn)}
+    hedged = hedge_after is None
+
+    last_error = None
+    while pending:
+        timeout = deadline.remaining()
+        if not hedged:
+            timeout = min(timeout, max(0.0, start + hedge_after - time.monotonic()))
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if latencies is not None:
+                latencies.record(time.monotonic() - start)
+            return result
+
+        if deadline.expired():
+            raise DeadlineExceeded("Se agotó el plazo esperando la respuesta")
+        if not hedged and (pending or last_error is None):
+            logger.info(f"Petición lenta ({hedge_after:.2f}s), enviando duplicado")
+            pending.add(_executor.submit(fn))
+            hedged = True
+
+    raise last_error
+
+
+def retry_with_deadline(
+    fn: Callable,
+    deadline: Deadline,
+    attempts: int = 3,
+    base_delay: float = 0.2,
+):
+    """Reintenta `fn` con espera exponencial sin exceder el plazo restante."""
+    last_error = None
+    for attempt in range(attempts):
+        if deadline.expired():
+            break
+        try:
+            return fn()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            last_error = e
+            delay = base_delay * (2 ** attempt)
+            if attempt == attempts - 1 or delay >= deadline.remaining():
+                break
+            logger.warning(f"Intento {attempt + 1} fallido, reintentando en {delay:.2f}s: {e}")
+            time.sleep(delay)
+
+    if last_error is not None:
+        raise last_error
+    raise DeadlineExceeded("Se agotó el plazo antes de completar la llamada")
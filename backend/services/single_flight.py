@@ -0,0 +1,74 @@
+"""
+Coalescencia de peticiones idénticas en curso (single-flight).
+
+Si varias peticiones con la misma clave llegan mientras la primera se está
+calculando, todas esperan y comparten su resultado (o su excepción) en lugar
+de repetir el trabajo.
+"""
+import re
+import threading
+from typing import Callable, Dict, Hashable
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza un mensaje para usarlo como parte de una clave."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """Ejecuta `fn` una sola vez por clave entre las llamadas concurrentes."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.executed,
+                "shared": self.shared,
+            }
+
+
+# Instancia compartida por todo el proceso
+single_flight = SingleFlight()
@@ -0,0 +1,124 @@
+import heapq
+from types import SimpleNamespace
+
+import pytest
+
+from services import openai_scheduler as scheduler_module
+from services.openai_scheduler import (
+    PRIORITY_INGEST,
+    PRIORITY_INTERACTIVE,
+    OpenAIScheduler,
+    _Bucket,
+    _Ticket,
+)
+from services.resilience import DeadlineExceeded
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(scheduler_module, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def _admit_all(scheduler, tickets, now):
+    """Encola los tickets y admite todos los que el presupuesto permite en `now`."""
+    for ticket in tickets:
+        scheduler._enqueue(ticket)
+    while scheduler._queue and scheduler._try_admit(now) is None:
+        pass
+    return [ticket for ticket in tickets if ticket.admitted]
+
+
+def test_cubeta_se_rellena_hasta_su_capacidad(clock):
+    bucket = _Bucket(60)
+    bucket.level = 0
+    bucket.refill(clock.now + 10)
+    assert bucket.level == pytest.approx(10)
+    assert bucket.time_until(15) == pytest.approx(5)
+    bucket.refill(clock.now + 1000)
+    assert bucket.level == 60
+
+
+def test_el_trafico_de_fondo_deja_margen_al_interactivo(clock):
+    scheduler = OpenAIScheduler(requests_per_minute=10, tokens_per_minute=100000, background_share=0.5)
+    ingest = [_Ticket(PRIORITY_INGEST, 10, chat_id=1) for _ in range(10)]
+
+    # La ingesta se detiene al llegar a la reserva (la mitad de las peticiones)
+    assert len(_admit_all(scheduler, ingest, clock.now)) == 5
+    wait = scheduler._try_admit(clock.now)
+    assert wait is not None and wait > 0
+
+    # Una pregunta del chat pasa delante y usa la reserva
+    interactive = _Ticket(PRIORITY_INTERACTIVE, 10, chat_id=2)
+    scheduler._enqueue(interactive)
+    assert scheduler._try_admit(clock.now) is None
+    assert interactive.admitted
+
+
+def test_reparto_justo_entre_chats(clock):
+    scheduler = OpenAIScheduler(requests_per_minute=1000, tokens_per_minute=10**6)
+    big = [_Ticket(PRIORITY_INGEST, 1000, chat_id="grande") for _ in range(3)]
+    small = _Ticket(PRIORITY_INGEST, 1000, chat_id="chico")
+    for ticket in big + [small]:
+        scheduler._enqueue(ticket)
+
+    order = [heapq.heappop(scheduler._queue)[3].chat_id for _ in range(4)]
+    assert order == ["grande", "chico", "grande", "grande"]
+
+
+def test_429_pausa_todas_las_peticiones(clock):
+    scheduler = OpenAIScheduler(requests_per_minute=100, tokens_per_minute=10**6)
+    error = Exception("rate limit")
+    error.status_code = 429
+    error.response = SimpleNamespace(headers={"retry-after": "2"})
+
+    with pytest.raises(Exception, match="rate limit"):
+        with scheduler.slot(PRIORITY_INTERACTIVE, tokens=10):
+            raise error
+
+    scheduler._enqueue(_Ticket(PRIORITY_INTERACTIVE, 10, chat_id=1))
+    assert scheduler._try_admit(clock.now) == pytest.approx(2)
+    clock.now += 2
+    assert scheduler._try_admit(clock.now) is None
+    assert scheduler.metrics()["rate_limited"] == 1
+
+
+def test_slot_consume_presupuesto(clock):
+    scheduler = OpenAIScheduler(requests_per_minute=100, tokens_per_minute=10000)
+    with scheduler.slot(PRIORITY_INTERACTIVE, tokens=400, chat_id=1):
+        pass
+
+    metrics = scheduler.metrics()
+    assert metrics["available_requests"] == 99
+    assert metrics["available_tokens"] == 9600
+    assert metrics["wait_time"]["interactive"]["completed"] == 1
+
+
+def test_set_share_reduce_la_capacidad(clock):
+    scheduler = OpenAIScheduler(requests_per_minute=100, tokens_per_minute=10000)
+    scheduler.set_share(0.25)
+    assert scheduler.metrics()["available_requests"] == 25
+    assert scheduler.metrics()["available_tokens"] == 2500
+
+
+def test_la_espera_de_turno_respeta_el_plazo():
+    scheduler = OpenAIScheduler(requests_per_minute=1, tokens_per_minute=10**6)
+    with scheduler.slot(PRIORITY_INTERACTIVE, tokens=10):
+        pass
+
+    # Sin cupo hasta dentro de un minuto: se rinde al agotar el plazo
+    with pytest.raises(DeadlineExceeded):
+        with scheduler.slot(PRIORITY_INTERACTIVE, tokens=10, timeout=0.05):
+            pass
+    metrics = scheduler.metrics()
+    assert metrics["timed_out"] == 1
+    assert sum(metrics["queue_depth"].values()) == 0
@@ -0,0 +1,147 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services import resilience
+from services.resilience import (
+    CircuitBreaker,
+    Deadline,
+    DeadlineExceeded,
+    call_with_deadline,
+    hedged_call,
+    retry_with_deadline,
+)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=clock, sleep=time.sleep))
+    return clock
+
+
+def test_sub_plazo_no_excede_el_plazo(clock):
+    deadline = Deadline(2)
+    assert deadline.child(5).remaining() == 2
+    clock.now += 3
+    assert deadline.expired() and deadline.child(5).expired()
+
+
+def test_circuito_se_abre_tras_fallos_consecutivos(clock):
+    breaker = CircuitBreaker("prueba", failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_semiabierto_deja_pasar_una_sola_prueba(clock):
+    breaker = CircuitBreaker("prueba", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # La prueba falla: vuelve a abrirse por otro intervalo completo
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert all(breaker.allow() for _ in range(3))
+
+
+def test_prueba_sin_resultado_permite_otra_pasado_el_intervalo(clock):
+    breaker = CircuitBreaker("prueba", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_call_with_deadline_deja_de_esperar():
+    release = threading.Event()
+    with pytest.raises(DeadlineExceeded):
+        call_with_deadline(lambda: release.wait(5), Deadline(0.05))
+    release.set()
+
+
+def test_hedging_usa_el_duplicado_si_la_primera_tarda():
+    release = threading.Event()
+    calls = []
+
+    def search():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            release.wait(5)
+            return "lenta"
+        return "rápida"
+
+    try:
+        assert hedged_call(search, Deadline(2), hedge_after=0.05) == "rápida"
+    finally:
+        release.set()
+    assert len(calls) == 2
+
+
+def test_hedging_propaga_el_error_si_todas_fallan():
+    def search():
+        raise ValueError("sin conexión")
+
+    with pytest.raises(ValueError, match="sin conexión"):
+        hedged_call(search, Deadline(2), hedge_after=0.01)
+
+
+def test_reintentos_acotados():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reintentar")
+        return "ok"
+
+    assert retry_with_deadline(flaky, Deadline(5), attempts=3, base_delay=0.001) == "ok"
+
+    attempts.clear()
+    with pytest.raises(ConnectionError):
+        retry_with_deadline(flaky, Deadline(5), attempts=2, base_delay=0.001)
+    assert len(attempts) == 2
+
+
+def test_reintentos_no_esperan_mas_alla_del_plazo():
+    attempts = []
+
+    def failing():
+        attempts.append(1)
+        raise ConnectionError("caída")
+
+    start = time.monotonic()
+    with pytest.raises(ConnectionError):
+        retry_with_deadline(failing, Deadline(0.1), attempts=5, base_delay=1)
+    assert len(attempts) == 1
+    assert time.monotonic() - start < 0.5
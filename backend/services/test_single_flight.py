@@ -0,0 +1,67 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.single_flight import SingleFlight, normalize_text
+
+
+def _wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "la condición no se cumplió a tiempo"
+        time.sleep(0.001)
+
+
+def test_llamadas_concurrentes_comparten_el_resultado():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"respuesta": 42}
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(flight.do, "clave", compute) for _ in range(5)]
+        _wait_for(lambda: flight.metrics()["shared"] == 4)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.metrics() == {"in_flight": 0, "executed": 1, "shared": 4}
+
+
+def test_el_error_se_propaga_a_todos_y_no_queda_guardado():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError("falló la API")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(flight.do, "clave", failing) for _ in range(3)]
+        _wait_for(lambda: flight.metrics()["shared"] == 2)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="falló la API"):
+                future.result()
+
+    # La clave se libera: la siguiente llamada vuelve a ejecutar
+    assert flight.do("clave", lambda: "ok") == "ok"
+    assert flight.metrics()["executed"] == 2
+
+
+def test_claves_distintas_no_se_comparten():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.metrics()["shared"] == 0
+
+
+def test_normaliza_espacios_y_mayusculas():
+    assert normalize_text("  ¿Qué   dice\nEL manual? ") == "¿qué dice el manual?"